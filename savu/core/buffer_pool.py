@@ -0,0 +1,120 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: buffer_pool
+   :platform: Unix
+   :synopsis: A pool of arrays, on each process, that are reused for the \
+   transfer and result data of all plugins.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import threading
+import contextlib
+import collections
+import numpy as np
+
+_pool = None
+
+
+def get_buffer_pool():
+    """ The buffer pool of this process. """
+    global _pool
+    if _pool is None:
+        _pool = BufferPool()
+    return _pool
+
+
+class BufferPool(object):
+    """
+    Holds arrays keyed by shape and dtype.  An array drawn while a transfer is
+    read or processed is held for that transfer, and all arrays held for a
+    transfer are returned to the pool together, once its results have been
+    written.  Arrays drawn outside a transfer are not held, and are not
+    returned to the pool.
+
+    :keyword int max_bytes: The most bytes kept in the pool when arrays are
+        returned.  Arrays beyond this are freed.
+    """
+
+    def __init__(self, max_bytes=2*1024**3):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._free = collections.defaultdict(list)
+        self._held = collections.defaultdict(list)
+        self._free_bytes = 0
+        self.reset_counters()
+
+    def reset_counters(self):
+        """ Reset the counts of bytes allocated and reused. """
+        self.allocated = 0
+        self.reused = 0
+
+    @contextlib.contextmanager
+    def transfer(self, tag):
+        """ Hold the arrays drawn by this thread, in the context, for the
+        transfer tag. """
+        previous = getattr(self._local, 'tag', None)
+        self._local.tag = tag
+        try:
+            yield
+        finally:
+            self._local.tag = previous
+
+    def get(self, shape, dtype=np.float32, tag=None):
+        """ Get an (uninitialised) array from the pool, or allocate one.
+
+        :param tuple shape: The shape of the array.
+        :keyword dtype dtype: The dtype of the array.
+        :keyword tag: The transfer to hold the array for (defaults to the
+            transfer of the current context).
+        :rtype: np.ndarray
+        """
+        tag = getattr(self._local, 'tag', None) if tag is None else tag
+        key = (tuple(int(s) for s in shape), np.dtype(dtype))
+        with self._lock:
+            free = self._free[key]
+            array = free.pop() if free else None
+            if array is None:
+                array = np.empty(key[0], dtype=key[1])
+                self.allocated += array.nbytes
+            else:
+                self._free_bytes -= array.nbytes
+                self.reused += array.nbytes
+            if tag is not None:
+                self._held[tag].append(array)
+        return array
+
+    def release(self, tag):
+        """ Return all arrays held for a transfer to the pool. """
+        with self._lock:
+            for array in self._held.pop(tag, []):
+                if self._free_bytes + array.nbytes > self.max_bytes:
+                    continue
+                self._free[(array.shape, array.dtype)].append(array)
+                self._free_bytes += array.nbytes
+
+    def release_all(self):
+        """ Return the arrays held for all transfers to the pool. """
+        for tag in list(self._held.keys()):
+            self.release(tag)
+
+    def clear(self):
+        """ Free all arrays in the pool. """
+        with self._lock:
+            self._free.clear()
+            self._free_bytes = 0
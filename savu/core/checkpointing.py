@@ -19,6 +19,7 @@
 """
 
 import os
+import glob
 import time
 import copy
 import logging
@@ -46,6 +47,9 @@ class Checkpointing(object):
         self._proc_idx = 0
         self._trans_idx = 0
         self._comm = None
+        self._frames = None
+        self._frame_dims = None
+        self._restored = None
         self._timer = None
         self._set_timer()
         self.meta_data = MetaData()
@@ -80,7 +84,13 @@ class Checkpointing(object):
     def _set_checkpoint_info_from_file(self, level):
         self._level = level
         self.__set_checkpoint_info()
-        self.__does_file_exist(self._file, level)
+        files = glob.glob(os.path.join(self._folder, 'process*' +
+                                       self._filename))
+        completed = self.__read_completed_frames(files) \
+            if level == 'subplugin' else None
+        # a process without a checkpoint file (when restarting with more
+        # processes) starts from the completed frames of the others
+        self.__does_file_exist(self._file, 'plugin' if completed else level)
 
         with self._h5._open_backing_h5(self._file, 'r', mpi=False) as f:
             self._completed_plugins = \
@@ -95,6 +105,13 @@ class Checkpointing(object):
             self.__set_dataset_metadata(f, 'in_data')
             self.__set_dataset_metadata(f, 'out_data')
 
+        if completed:
+            # resume from the frames completed by all processes
+            self._completed_plugins, self._restored = completed
+            self._trans_idx = 0
+            self._proc_idx = 0
+            self.__set_start_values(self._completed_plugins, 0, 0)
+
         self.__load_data()
         msg = "%s _set_checkpoint_info_from_file" % self.__class__.__name__
         self._exp._barrier(msg=msg)
@@ -118,6 +135,82 @@ class Checkpointing(object):
             for key, value in data_entry.items():
                 self.meta_data.set([dtype, name, key], value[key][...])
 
+    def __read_completed_frames(self, files):
+        """ The plugin that was running when the checkpoint was made, and the
+        frames completed in it by the processes of all previous runs, from
+        the checkpoint files of every process (any number of processes).
+        Files are written at the end of each plugin by every process, so the
+        plugin is the one furthest through the list.
+
+        :returns: The plugin index and a boolean array of completed frames,
+            or None if no frames were recorded.
+        """
+        found = {}
+        for fname in files:
+            with self._h5._open_backing_h5(fname, 'r', mpi=False) as f:
+                plugin = int(f['completed_plugins'][...]) if \
+                    'completed_plugins' in f else 0
+                found.setdefault(plugin, [])
+                if 'completed_frames' in f:
+                    entry = f['completed_frames']
+                    frames = np.unpackbits(
+                        entry[...], count=int(entry.attrs['nframes']))
+                    if int(entry.attrs['plugin']) == plugin:
+                        found[plugin].append(frames.astype(bool))
+        if not found:
+            return None
+        plugin = max(found.keys())
+        sizes = set(frames.size for frames in found[plugin])
+        if len(sizes) != 1:
+            return None
+        return plugin, np.logical_or.reduce(found[plugin])
+
+    def _set_frame_data(self, data):
+        """ Record the frames completed by each transfer of the plugin in the
+        global frame order of a dataset it writes to (or turn off the frame
+        record if data is None).  Frames restored from a checkpoint are
+        included for the first plugin after a restart.
+
+        :param Data data: The output dataset of the plugin.
+        """
+        restored, self._restored = self._restored, None
+        if data is None:
+            self._frames = None
+            return
+        sdirs = data.get_slice_dimensions()
+        shape = tuple(data.get_shape()[d] for d in sdirs)
+        self._frame_dims = (sdirs, shape)
+        nframes = int(np.prod(shape))
+        if restored is not None and restored.size == nframes:
+            self._frames = restored
+        else:
+            self._frames = np.zeros(nframes, dtype=bool)
+
+    def __get_frames(self, slice_list):
+        """ The global indices of the frames in a transfer slice list, with
+        the first slice dimension changing fastest. """
+        sdirs, shape = self._frame_dims
+        ranges = [np.arange(*slice_list[d].indices(n))
+                  for d, n in zip(sdirs, shape)]
+        grids = np.meshgrid(*ranges, indexing='ij')
+        return np.ravel_multi_index([g.ravel() for g in grids], shape,
+                                    order='F')
+
+    def has_completed_frames(self):
+        """ True if any frames of the current plugin are already complete. """
+        return self._frames is not None and bool(self._frames.any())
+
+    def is_transfer_complete(self, slice_list):
+        """ True if all frames in the transfer slice list are complete. """
+        return self._frames is not None and \
+            bool(self._frames[self.__get_frames(slice_list)].all())
+
+    def set_transfer_complete(self, slice_list):
+        """ Mark the frames in a transfer slice list as complete, once their
+        results have been written. """
+        if self._frames is not None:
+            self._frames[self.__get_frames(slice_list)] = True
+
     def _get_dataset_metadata(self, dtype, name):
         return self._data_meta_data(dtype)
 
@@ -153,6 +246,9 @@ class Checkpointing(object):
                 ['system_params', 'checkpoint_interval'])
         end = time.time()
         if (end - self._get_timer()) > interval:
+            # results of earlier transfers must be on disk before they are
+            # marked as complete
+            transport._wait_for_pending_writes()
             self.__write_subplugin_checkpoint(ti, pi)
             self._set_timer()
             transport._transport_checkpoint()
@@ -166,12 +262,22 @@ class Checkpointing(object):
         with self._h5._open_backing_h5(self._file, 'a', mpi=False) as f:
             f['transfer_idx'][...] = ti
             f['process_idx'][...] = pi
+            if 'completed_frames' in f:
+                del f['completed_frames']
+            if self._frames is not None:
+                entry = f.create_dataset('completed_frames',
+                                         data=np.packbits(self._frames))
+                entry.attrs['nframes'] = self._frames.size
+                entry.attrs['plugin'] = self._completed_plugins
 
     def __write_plugin_checkpoint(self):
         with self._h5._open_backing_h5(self._file, 'a', mpi=False) as f:
             f['completed_plugins'][...] = self._completed_plugins
             f['transfer_idx'][...] = 0
             f['process_idx'][...] = 0
+            if 'completed_frames' in f:
+                del f['completed_frames']
+        self._frames = None
 
     def _reset_indices(self):
         self._trans_idx = 0
@@ -0,0 +1,94 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: collective_writer
+   :platform: Unix
+   :synopsis: Writes the results of each transfer to the backing files with \
+   collective MPI-IO, with all processes in step.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import h5py
+import numpy as np
+from mpi4py import MPI
+
+
+def is_collective_writes(exp):
+    """ True if output datasets are written collectively.  This requires the
+    'write_mode' system parameter to be 'collective', the hdf5 transport and
+    MPI, with each process given a fixed block of transfers so the number of
+    writes is known up front. """
+    mData = exp.meta_data.get_dictionary()
+    if exp.meta_data.get('system_params').get(
+            'write_mode', 'independent') != 'collective':
+        return False
+    return mData.get('transport') == 'hdf5' and mData.get('mpi', False) and \
+        not mData.get('dynamic_frames', False)
+
+
+class CollectiveWriter(object):
+    """
+    Writes one transfer of results to each output dataset per step, with a
+    collective write that every process takes part in.  A process with no
+    data for a dataset, or that has run out of transfers, makes an empty
+    write, so the same number of writes is made by all processes.  MPI-IO
+    then aggregates the writes of all processes into large contiguous
+    requests (collective buffering).
+
+    :param Intracomm comm: The plugin communicator.
+    :param list(h5py.Dataset) datasets: The output datasets.
+    :param int nWrites: The number of transfers this process writes.
+    """
+
+    def __init__(self, comm, datasets, nWrites):
+        self.datasets = datasets
+        self.steps = comm.allreduce(nWrites, op=MPI.MAX)
+        self.done = 0
+        self._dxpl = h5py.h5p.create(h5py.h5p.DATASET_XFER)
+        self._dxpl.set_dxpl_mpio(h5py.h5fd.MPIO_COLLECTIVE)
+
+    def write(self, slice_lists, results):
+        """ Write a transfer of results to each dataset.
+
+        :param list(tuple(slice)) slice_lists: The transfer slice list of each
+            dataset, or None if there is nothing to write.
+        :param list(np.ndarray) results: The result for each dataset, or None.
+        """
+        for dataset, sl, result in zip(self.datasets, slice_lists, results):
+            if sl is None or result is None or not result.size:
+                self.__write_nothing(dataset)
+            else:
+                with dataset.collective:
+                    dataset[sl] = result
+        self.done += 1
+
+    def finish(self):
+        """ Make empty writes until this process has made as many as the
+        process with the most transfers.  No other collective operation can
+        be made on the communicator between the last write and this call. """
+        nothing = [None]*len(self.datasets)
+        while self.done < self.steps:
+            self.write(nothing, nothing)
+
+    def __write_nothing(self, dataset):
+        # h5py skips empty selections, so the low level write is used
+        fspace = dataset.id.get_space()
+        fspace.select_none()
+        mspace = h5py.h5s.create_simple((1,))
+        mspace.select_none()
+        dataset.id.write(mspace, fspace, np.empty(1, dtype=dataset.dtype),
+                         dxpl=self._dxpl)
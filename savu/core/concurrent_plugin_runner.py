@@ -0,0 +1,302 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: concurrent_plugin_runner
+   :platform: Unix
+   :synopsis: Runs plugins on independent branches of the dataset flow at \
+   the same time, each on its own share of the MPI processes.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import bisect
+import logging
+import numpy as np
+from mpi4py import MPI
+
+import savu.core.utils as cu
+import savu.plugins.utils as pu
+from savu.data.stats.statistics import Statistics
+from savu.core.iterate_plugin_group_utils import shift_plugin_index
+
+
+def find_concurrent_steps(exp, first=0, exclude=()):
+    """ Find sets of plugins, on independent branches of the dataset flow,
+    that can be run at the same time, each on a share of the processes.
+
+    :param Experiment exp: The experiment, after the plugin list check.
+    :keyword int first: The index of the first plugin to be run.
+    :keyword set exclude: Indices of plugins that must be run alone.
+    :returns: A dictionary mapping the index of each plugin in a step to
+        the step
+    :rtype: dict(int: ConcurrentStep)
+    """
+    if not exp.meta_data.get('system_params').get(
+            'concurrent_branches', False):
+        return {}
+    mData = exp.meta_data.get_dictionary()
+    # compressed datasets are only written collectively over all processes
+    if not mData.get('mpi') or mData.get('transport') != 'hdf5' or \
+            mData.get('collective_writes') or MPI.COMM_WORLD.size < 2:
+        return {}
+
+    plugin_list = exp.meta_data.plugin_list
+    datasets_list = plugin_list._get_datasets_list()
+    n_loaders = plugin_list._get_n_loaders()
+    plugin_dicts = plugin_list.plugin_list[n_loaders:]
+    excluded = set(exclude)
+    for group in mData.get('iterate_groups', []):
+        excluded.update(range(shift_plugin_index(exp, group.start_index),
+                              shift_plugin_index(exp, group.end_index) + 1))
+
+    names = [_get_dataset_names(dlist) for dlist in datasets_list]
+    plugin_names = [plugin_dicts[i]['name'] for i in range(len(names))]
+    candidates = [i not in excluded and bool(datasets_list[i]['out_datasets'])
+                  and _is_concurrent_plugin(plugin_dicts[i])
+                  for i in range(len(names))]
+
+    steps = {}
+    for indices in plan_steps(names, plugin_names, candidates, first=first,
+                              max_width=MPI.COMM_WORLD.size):
+        step = ConcurrentStep(indices)
+        steps.update({i: step for i in indices})
+    return steps
+
+
+def _get_dataset_names(dlist):
+    return {d['name'] for d in dlist['in_datasets'] + dlist['out_datasets']}
+
+
+def _is_concurrent_plugin(plugin_dict):
+    """ CPU plugins that use the standard driver, so that they can be run
+    on a communicator other than COMM_WORLD. """
+    from savu.plugins.savers.base_saver import BaseSaver
+    from savu.plugins.driver.cpu_plugin import CpuPlugin
+    from savu.plugins.driver.plugin_driver import PluginDriver
+    from savu.plugins.driver.threaded_cpu_plugin import ThreadedCpuPlugin
+    cls = pu.load_class(plugin_dict['id'])
+    return issubclass(cls, CpuPlugin) and issubclass(cls, PluginDriver) and \
+        not issubclass(cls, BaseSaver) and cls._run_plugin in \
+        (CpuPlugin._run_plugin, ThreadedCpuPlugin._run_plugin)
+
+
+def plan_steps(names, plugin_names, candidates, first=0, max_width=None):
+    """ Group the plugins into steps of plugins that can be run at the same
+    time.  Each step starts at the first plugin not yet run, and adds later
+    candidate plugins whose datasets are not used by any plugin before them
+    that has not yet run (including the plugins already in the step).  A
+    plugin may therefore be run ahead of earlier plugins on other branches.
+    Plugins with the same name are kept in order, as the statistics of the
+    second are named after the first.
+
+    :param list names: The set of dataset names (in and out) of each plugin.
+    :param list plugin_names: The name of each plugin.
+    :param list candidates: True for each plugin that can be run in a step.
+    :keyword int first: The index of the first plugin to be run.
+    :keyword int max_width: The most plugins in a step.
+    :returns: The indices of the plugins in each step of two or more.
+    :rtype: list(list(int))
+    """
+    done = set()
+    steps = []
+    for i in range(first, len(names)):
+        if i in done:
+            continue
+        step = [i]
+        if candidates[i]:
+            for j in range(i + 1, len(names)):
+                if max_width and len(step) == max_width:
+                    break
+                if j in done or not candidates[j]:
+                    continue
+                pending = [k for k in range(i, j) if k not in done]
+                if all(not names[k] & names[j] and
+                       plugin_names[k] != plugin_names[j] for k in pending):
+                    step.append(j)
+        done.update(step)
+        if len(step) > 1:
+            steps.append(step)
+    return steps
+
+
+def split_processes(costs, nProcs):
+    """ Share the processes between the branches of a step in proportion to
+    their cost, with at least one process each (largest remainders first).
+
+    :param list costs: The estimated cost of each branch.
+    :param int nProcs: The number of processes.
+    :returns: The number of processes for each branch.
+    :rtype: list(int)
+    """
+    costs = np.maximum(np.array(costs, dtype=float), 1)
+    spare = nProcs - len(costs)
+    share = costs/costs.sum()*spare
+    counts = np.floor(share).astype(int)
+    order = np.argsort(-(share - counts), kind='stable')
+    counts[order[:spare - counts.sum()]] += 1
+    return [int(c) + 1 for c in counts]
+
+
+class ConcurrentStep(object):
+    """
+    Plugins on independent branches of the dataset flow that are run at the
+    same time.  The plugins are loaded, and their files created, by all
+    processes in plugin list order, then COMM_WORLD is split into a
+    communicator for each plugin, sized by the amount of data it reads.  Once
+    all the plugins have run, the dataset metadata and statistics of each are
+    shared from its processes, and the plugins are finalised in plugin list
+    order, so the output files, NeXus links and statistics are the same as
+    when they are run in turn.  The plugins are run without pattern
+    transposes, collective writes or checkpoints within the plugin; a
+    restart begins at the first plugin in the step that had not been
+    completed in order.
+
+    :param list indices: nPlugin index of each plugin in the step.
+    """
+
+    def __init__(self, indices):
+        self.indices = indices
+        self.names = {}
+
+    def _execute(self, plugin_runner, nPlugin):
+        """ Run the whole step when its first plugin is reached.  Later
+        plugins in the step have already been run.
+
+        :returns: The name of the plugin at index nPlugin
+        """
+        if nPlugin == self.indices[0]:
+            plugins = self.__load_plugins(plugin_runner)
+            starts, counts = self.__share_processes(plugins)
+            branch = bisect.bisect_right(starts, MPI.COMM_WORLD.rank) - 1
+            comm = MPI.COMM_WORLD.Split(branch, MPI.COMM_WORLD.rank)
+            written = self.__run_branch(
+                plugin_runner, self.indices[branch], plugins[branch], comm,
+                starts[branch], counts[branch])
+            plugin_runner.exp._barrier(msg="Concurrent plugins completed.")
+            self.__join(plugins, branch, starts, written)
+            comm.Free()
+            self.__finalise_plugins(plugin_runner, plugins)
+        return self.names[nPlugin]
+
+    def __load_plugins(self, plugin_runner):
+        exp = plugin_runner.exp
+        exp_coll = exp._get_collection()
+        count = Statistics.count
+        plugins = []
+        for i in self.indices:
+            exp._set_experiment_for_current_plugin(i)
+            # the statistics are numbered as if the plugins were run in turn
+            Statistics.count = count + i - self.indices[0]
+            plugin_runner._transport_pre_plugin()
+            plugin = plugin_runner._transport_load_plugin(
+                exp, exp_coll['plugin_dict'][i])
+            plugin.stats_obj.start_time()
+            self.names[i] = plugin.name
+            plugins.append(plugin)
+        Statistics.count = count
+        return plugins
+
+    def __share_processes(self, plugins):
+        """ The first rank, and number of processes, of each branch. """
+        costs = [sum(int(np.prod(d.get_shape())) for d in
+                     plugin.get_in_datasets()) for plugin in plugins]
+        counts = split_processes(costs, MPI.COMM_WORLD.size)
+        starts = [int(s) for s in np.cumsum([0] + counts[:-1])]
+        cu.user_message("*Running the %s plugins concurrently on %s "
+                        "processes*" % (', '.join(p.name for p in plugins),
+                                        ', '.join(map(str, counts))))
+        return starts, counts
+
+    def __run_branch(self, plugin_runner, idx, plugin, comm, start, count):
+        """ Run a plugin on the processes of its branch.
+
+        :returns: The plugin number and name of each set of statistics the
+            plugin wrote, which are written to file once all the branches
+            have joined.
+        """
+        exp = plugin_runner.exp
+        expInfo = exp.meta_data
+        processes = list(expInfo.get('processes'))
+        process = expInfo.get('process')
+        count_stats = Statistics.count
+
+        exp._set_experiment_for_current_plugin(idx)
+        plugin_runner._transport_pre_plugin()
+        Statistics.count = plugin.stats_obj.p_num
+        Statistics._deferred_writes = []
+        expInfo.set('processes', processes[start:start + count])
+        expInfo.set('process', comm.rank)
+        logging.info("Running %s on processes %s to %s", plugin.name,
+                     start, start + count - 1)
+        plugin._branch_comm = comm
+        try:
+            plugin._run_plugin(exp, plugin_runner)
+        finally:
+            plugin._branch_comm = None
+            expInfo.set('processes', processes)
+            expInfo.set('process', process)
+            written, Statistics._deferred_writes = \
+                Statistics._deferred_writes, None
+            Statistics.count = count_stats
+        return written
+
+    def __join(self, plugins, branch, starts, written):
+        """ Share the dataset metadata and statistics of each plugin from
+        the first process of its branch, and write the statistics to file
+        in plugin list order. """
+        rank = MPI.COMM_WORLD.rank
+        for n, plugin in enumerate(plugins):
+            state = None
+            if rank == starts[n]:
+                state = {'meta_data': self.__get_meta_data(plugin),
+                         'stats': plugin.stats_obj._get_branch_state(),
+                         'written': written}
+            state = MPI.COMM_WORLD.bcast(state, root=starts[n])
+            if n != branch:
+                plugin._revert_preview(plugin.parameters['in_datasets'])
+                for data in plugin.get_out_datasets():
+                    data.set_shape(data.data.shape)
+                self.__set_meta_data(plugin, state['meta_data'])
+                plugin.stats_obj._set_branch_state(state['stats'])
+            plugin._set_communicator(MPI.COMM_WORLD)
+            for p_num, plugin_name in state['written']:
+                plugin.stats_obj._write_stats_to_file(
+                    p_num, plugin_name, comm=MPI.COMM_WORLD)
+
+    def __get_meta_data(self, plugin):
+        in_data, out_data = plugin.get_datasets()
+        return {data.get_name(): data.meta_data.get_dictionary()
+                for data in in_data + out_data}
+
+    def __set_meta_data(self, plugin, meta_data):
+        in_data, out_data = plugin.get_datasets()
+        for data in in_data + out_data:
+            data.meta_data._set_dictionary(meta_data[data.get_name()])
+
+    def __finalise_plugins(self, plugin_runner, plugins):
+        """ Finalise each plugin in turn, as if it had been run alone. """
+        exp = plugin_runner.exp
+        for i, plugin in zip(self.indices, plugins):
+            exp._set_experiment_for_current_plugin(i)
+            plugin_runner._transport_pre_plugin()
+            cu._output_summary(exp.meta_data.get("mpi"), plugin)
+            plugin._clean_up()
+            finalise = exp._finalise_experiment_for_current_plugin()
+            plugin_runner._transport_post_plugin()
+            for data in finalise['remove'] + finalise['replace']:
+                plugin_runner._transport_terminate_dataset(data)
+            exp._reorganise_datasets(finalise)
+            plugin.stats_obj.stop_time()
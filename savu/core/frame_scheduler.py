@@ -0,0 +1,94 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: frame_scheduler
+   :platform: Unix
+   :synopsis: Hands out transfer chunk indices to processes on demand, so \
+   faster processes take on more of the work.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import logging
+import numpy as np
+from mpi4py import MPI
+
+
+def is_dynamic_frame_distribution(exp):
+    """ True if the transfer chunks should be handed out on demand rather
+    than split evenly between the processes up front.  This requires the
+    'frame_distribution' system parameter to be 'dynamic' and the hdf5
+    transport, as every process must be able to write to any part of the
+    output files. """
+    if exp.meta_data.get('system_params').get(
+            'frame_distribution', 'static') != 'dynamic':
+        return False
+    mData = exp.meta_data.get_dictionary()
+    return mData.get('transport') == 'hdf5' and mData.get('mpi', False)
+
+
+class FrameScheduler(object):
+    """
+    A counter, held in an MPI window on rank 0 of the communicator, that each
+    process atomically increments to claim the next transfer chunk.
+
+    :param Intracomm comm: The communicator shared by all processes running
+        the plugin.
+    :param int nTrans: The total number of transfer chunks.
+    """
+
+    def __init__(self, comm, nTrans):
+        self.comm = comm
+        self.nTrans = nTrans
+        self.claimed = []
+        itemsize = MPI.LONG.Get_size()
+        size = itemsize if comm.Get_rank() == 0 else 0
+        self._win = MPI.Win.Allocate(size, itemsize, comm=comm)
+        if comm.Get_rank() == 0:
+            self._win.Lock(0, MPI.LOCK_EXCLUSIVE)
+            self._win.Put(np.zeros(1, dtype='l'), 0)
+            self._win.Unlock(0)
+        comm.Barrier()
+
+    def claim(self):
+        """ Claim the next unprocessed transfer chunk.
+
+        :returns: The transfer index, or None if all chunks have been claimed.
+        :rtype: int
+        """
+        one = np.ones(1, dtype='l')
+        count = np.zeros(1, dtype='l')
+        self._win.Lock(0, MPI.LOCK_SHARED)
+        self._win.Fetch_and_op(one, count, 0, 0, MPI.SUM)
+        self._win.Unlock(0)
+        count = int(count[0])
+        if count >= self.nTrans:
+            return None
+        self.claimed.append(count)
+        return count
+
+    def __iter__(self):
+        count = self.claim()
+        while count is not None:
+            yield count
+            count = self.claim()
+
+    def close(self):
+        """ Free the window.  This is collective over the communicator. """
+        logging.debug("Process %s processed transfers %s",
+                      self.comm.Get_rank(), self.claimed)
+        self.comm.Barrier()
+        self._win.Free()
@@ -0,0 +1,288 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: fused_plugin_runner
+   :platform: Unix
+   :synopsis: Runs consecutive plugins that share a pattern as a single \
+   stage, passing data between them in memory.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import copy
+import logging
+import numpy as np
+from mpi4py import MPI
+
+import savu.core.utils as cu
+import savu.plugins.utils as pu
+from savu.core.iterate_plugin_group_utils import shift_plugin_index
+
+
+def find_fused_groups(exp, first=0):
+    """ Find runs of consecutive plugins that can be executed as one fused
+    stage.  Two plugins are fused when the only output of the first is the
+    only input of the second, both use the same pattern and transfer sizes,
+    and the intermediate dataset is not required by any other plugin.
+
+    :param Experiment exp: The experiment, after the plugin list check.
+    :keyword int first: The index of the first plugin to be run.
+    :returns: A dictionary mapping the index of each fused plugin to its group
+    :rtype: dict(int: FusedPluginGroup)
+    """
+    if not exp.meta_data.get('system_params').get('fuse_plugins', False):
+        return {}
+    mData = exp.meta_data.get_dictionary()
+    if mData.get('transport') != 'hdf5' or mData.get('dynamic_frames'):
+        return {}
+
+    plugin_list = exp.meta_data.plugin_list
+    datasets_list = plugin_list._get_datasets_list()
+    n_loaders = plugin_list._get_n_loaders()
+    plugin_dicts = plugin_list.plugin_list[n_loaders:]
+    iterating = set()
+    for group in mData.get('iterate_groups', []):
+        iterating.update(range(shift_plugin_index(exp, group.start_index),
+                               shift_plugin_index(exp, group.end_index) + 1))
+
+    fusable = [i not in iterating and _is_fusable_plugin(plugin_dicts[i])
+               for i in range(len(datasets_list))]
+
+    groups = {}
+    start = None
+    for i in range(first, len(datasets_list)):
+        pair = i + 1 < len(datasets_list) and fusable[i] and \
+            fusable[i+1] and _is_fusable_pair(datasets_list, i)
+        if pair and start is None:
+            start = i
+        elif not pair and start is not None:
+            group = FusedPluginGroup(start, i)
+            groups.update({j: group for j in range(start, i + 1)})
+            start = None
+    return groups
+
+
+def _is_fusable_plugin(plugin_dict):
+    from savu.plugins.savers.base_saver import BaseSaver
+    from savu.plugins.driver.cpu_plugin import CpuPlugin
+    cls = pu.load_class(plugin_dict['id'])
+    return issubclass(cls, CpuPlugin) and not issubclass(cls, BaseSaver)
+
+
+def _is_fusable_pair(datasets_list, idx):
+    current, nnext = datasets_list[idx], datasets_list[idx + 1]
+    if len(current['in_datasets']) != 1 or len(current['out_datasets']) != 1 \
+            or len(nnext['in_datasets']) != 1 \
+            or len(nnext['out_datasets']) != 1:
+        return False
+    out_data = current['out_datasets'][0]
+    in_data = nnext['in_datasets'][0]
+    if out_data['name'] != in_data['name'] or \
+            not _equal_patterns(out_data['pattern'], in_data['pattern']):
+        return False
+    return not _is_required_later(datasets_list[idx + 1:], out_data['name'])
+
+
+def _equal_patterns(p1, p2):
+    if list(p1.keys()) != list(p2.keys()):
+        return False
+    v1, v2 = list(p1.values())[0], list(p2.values())[0]
+    if sorted(v1.keys()) != sorted(v2.keys()):
+        return False
+    return all(np.array_equal(v1[key], v2[key]) for key in v1.keys())
+
+
+def _is_required_later(datasets_list, name):
+    """ True if the dataset is read after the next plugin (or is a final
+    result) before being replaced by a dataset of the same name. """
+    for i, dlist in enumerate(datasets_list):
+        if i and name in [d['name'] for d in dlist['in_datasets']]:
+            return True
+        if name in [d['name'] for d in dlist['out_datasets']]:
+            return False
+    return True
+
+
+class FusedPluginGroup(object):
+    """
+    A group of consecutive plugins that are loaded together and process each
+    transfer chunk in turn, without writing the intermediate datasets.
+
+    :param int start_index: nPlugin index of the first plugin in the group.
+    :param int end_index: nPlugin index of the last plugin in the group.
+    """
+
+    def __init__(self, start_index, end_index):
+        self.start_index = start_index
+        self.end_index = end_index
+        self.names = {}
+        self.fallback = False
+        self.killed = False
+        self._in_data = None
+
+    def _execute(self, plugin_runner, nPlugin):
+        """ Run the whole group when the first plugin is reached.  Later
+        plugins in the group have already been run, unless the group could
+        not be fused, in which case they are run as normal.
+
+        :returns: The name of the plugin at index nPlugin
+        """
+        exp = plugin_runner.exp
+        run_plugin = plugin_runner._run_single_plugin
+        plugin_dict = exp._get_collection()['plugin_dict'][nPlugin]
+
+        if nPlugin == self.start_index:
+            plugins = self.__load_plugins(plugin_runner)
+            if not self.__is_compatible(plugins):
+                self.__unload_plugins(plugins)
+                exp._set_experiment_for_current_plugin(nPlugin)
+                self.fallback = True
+                self.names[nPlugin] = run_plugin(plugin_dict).name
+            elif self.__run_plugins(plugin_runner, plugins):
+                # stop before post-processing, keeping the files for a restart
+                self.__stop_plugins(plugin_runner, plugins)
+            else:
+                self.__finalise_plugins(plugin_runner, plugins)
+        elif self.fallback:
+            self.names[nPlugin] = run_plugin(plugin_dict).name
+        return self.names[nPlugin]
+
+    def __load_plugins(self, plugin_runner):
+        exp = plugin_runner.exp
+        exp_coll = exp._get_collection()
+        self._in_data = exp.index['in_data'].copy()
+        plugins = []
+        for i in range(self.start_index, self.end_index + 1):
+            exp._set_experiment_for_current_plugin(i)
+            plugin_runner._transport_pre_plugin()
+            plugin = plugin_runner._transport_load_plugin(
+                exp, exp_coll['plugin_dict'][i])
+            plugin.stats_obj.start_time()
+            self.names[i] = plugin.name
+            plugins.append(plugin)
+            if i < self.end_index:
+                # the output is passed to the next plugin in memory
+                for name, data in exp.index['out_data'].items():
+                    exp.index['in_data'][name] = copy.deepcopy(data)
+        return plugins
+
+    def __unload_plugins(self, plugins):
+        for plugin in plugins:
+            plugin._clean_up_plugin_data()
+        plugins[0].exp.index['in_data'] = self._in_data
+        self._in_data = None
+
+    def __is_compatible(self, plugins):
+        """ Check the plugin datasets, which are only fully known once the
+        plugins are loaded. """
+        for plugin in plugins:
+            if plugin.get_plugin_tools().extra_dims or not plugin.fixed_length:
+                return False
+
+        keys = ['max_frames_transfer', 'max_frames_process', 'transfer_shape']
+        for previous, plugin in zip(plugins[:-1], plugins[1:]):
+            out_pData = previous.get_plugin_out_datasets()[0]
+            in_pData = plugin.get_plugin_in_datasets()[0]
+            if in_pData.padding or in_pData.split or out_pData.split or \
+                    in_pData._get_rank_inc() or out_pData._get_rank_inc():
+                return False
+            if out_pData.get_pattern() != in_pData.get_pattern() or \
+                    tuple(out_pData.get_shape()) != tuple(in_pData.get_shape()):
+                return False
+            for key in keys:
+                if not np.array_equal(out_pData.meta_data.get(key),
+                                      in_pData.meta_data.get(key)):
+                    return False
+        return True
+
+    def __run_plugins(self, plugin_runner, plugins):
+        """ Run the group, returning True if a kill signal was received
+        before the processing was complete. """
+        exp = plugin_runner.exp
+        names = ' + '.join([plugin.name for plugin in plugins])
+        cu.user_message("*Running the fused %s plugins*" % names)
+
+        for plugin in plugins:
+            plugin._set_communicator(MPI.COMM_WORLD)
+            logging.info("%s.%s", plugin.__class__.__name__, 'pre_process')
+            plugin.base_pre_process()
+            plugin.pre_process()
+        exp._barrier(msg="Pre-process completed for %s" % names)
+
+        kill = plugin_runner._transport_fused_process(plugins)
+        exp._barrier(msg="Process_frames completed for %s" % names)
+        if kill:
+            return True
+
+        for plugin in plugins:
+            logging.info("%s.%s", plugin.__class__.__name__, 'post_process')
+            plugin.post_process()
+            plugin.base_post_process()
+            plugin._reset_process_frames_counter()
+            plugin._revert_preview(plugin.parameters['in_datasets'])
+            for data in plugin.get_out_datasets():
+                data.set_shape(data.data.shape)
+        return False
+
+    def __stop_plugins(self, plugin_runner, plugins):
+        """ The group was killed part way through processing, so the
+        partially written output is kept, without post-processing, for the
+        group to be restarted from the checkpoint. """
+        exp = plugin_runner.exp
+        exp.index['in_data'] = self._in_data
+        self._in_data = None
+        self.killed = True
+        for plugin in plugins:
+            for data in plugin.get_out_datasets():
+                plugin_runner._transport_terminate_dataset(data)
+            plugin.stats_obj.stop_time()
+
+    def __finalise_plugins(self, plugin_runner, plugins):
+        """ Finalise each plugin in turn, as if it had been run alone.  The
+        intermediate datasets were never written, so they are removed. """
+        exp = plugin_runner.exp
+        exp.index['in_data'] = self._in_data
+        self._in_data = None
+
+        for i, plugin in zip(range(self.start_index, self.end_index + 1),
+                             plugins):
+            exp._set_experiment_for_current_plugin(i)
+            plugin_runner._transport_pre_plugin()
+            exp._barrier(msg="Fused plugin finalise.")
+            cu._output_summary(exp.meta_data.get("mpi"), plugin)
+            plugin._clean_up()
+
+            intermediate = []
+            if i < self.end_index:
+                for name, data in exp.index['out_data'].items():
+                    data.remove = True
+                    intermediate.append(exp.meta_data.get(['filename', name]))
+
+            finalise = exp._finalise_experiment_for_current_plugin()
+            plugin_runner._transport_post_plugin()
+            for data in finalise['remove'] + finalise['replace']:
+                plugin_runner._transport_terminate_dataset(data)
+            exp._reorganise_datasets(finalise)
+            self.__remove_files(exp, intermediate)
+            plugin.stats_obj.stop_time()
+
+    def __remove_files(self, exp, filenames):
+        exp._barrier(msg="Removing unused fused plugin files.")
+        if exp.meta_data.get('process') == 0:
+            for filename in filenames:
+                if os.path.exists(filename):
+                    os.remove(filename)
@@ -0,0 +1,145 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: io_helpers
+   :platform: Unix
+   :synopsis: Pairs the processes left idle by a plugin driver with those \
+   running the plugin, to read their transfers and write their results.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import socket
+import logging
+import numpy as np
+from mpi4py import MPI
+
+# message tags
+PLAN = 5101
+DATA = 5102
+RESULT = 5103
+
+
+def is_io_helpers(exp):
+    """ True if processes left idle by a plugin driver (GpuPlugin,
+    MultiThreadedPlugin) serve the I/O of the processes running the plugin,
+    as set by the 'io_helpers' system parameter.  This requires the hdf5
+    transport and MPI. """
+    mData = exp.meta_data.get_dictionary()
+    return bool(exp.meta_data.get('system_params').get('io_helpers', False)) \
+        and mData.get('mpi', False) and mData.get('transport') == 'hdf5'
+
+
+def pair_ranks(ranks, idle, hosts):
+    """ Pair each rank with an idle rank, on the same host where possible.
+
+    :param list ranks: The ranks running the plugin.
+    :param list idle: The idle ranks.
+    :param list hosts: The host of each rank.
+    :returns: The idle rank paired with each rank, or an empty dictionary if
+        there are not enough idle ranks for every rank to have one.
+    :rtype: dict
+    """
+    if len(idle) < len(ranks):
+        return {}
+    free = list(idle)
+    pairs = {}
+    for rank in ranks:
+        local = [i for i in free if hosts[i] == hosts[rank]]
+        if local:
+            pairs[rank] = local[0]
+            free.remove(local[0])
+    for rank in [r for r in ranks if r not in pairs]:
+        pairs[rank] = free.pop(0)
+    return pairs
+
+
+def get_io_channel(plugin, ranks):
+    """ The channel between this process and its partner, if the processes
+    not in ranks serve the I/O of those that are, or None.  A process in
+    ranks only computes, while its partner reads its transfers ahead of it
+    and writes its results.  Plugins with extra dimensions (parameter
+    tuning) do their own I/O.  This is collective over all processes.
+
+    :param Plugin plugin: The plugin.
+    :param list ranks: The ranks (of COMM_WORLD) running the plugin.
+    :rtype: IoChannel
+    """
+    if not is_io_helpers(plugin.exp) or plugin.get_plugin_tools().extra_dims:
+        return None
+    comm = MPI.COMM_WORLD
+    hosts = comm.allgather(socket.gethostname())
+    idle = [r for r in range(comm.size) if r not in ranks]
+    pairs = pair_ranks(ranks, idle, hosts)
+    if not pairs:
+        logging.info("%s: too few idle processes to serve the I/O of %s "
+                     "processes", plugin.name, len(ranks))
+        return None
+    if comm.rank in pairs:
+        return IoChannel(comm, pairs[comm.rank], serving=False)
+    clients = {helper: rank for rank, helper in pairs.items()}
+    if comm.rank in clients:
+        return IoChannel(comm, clients[comm.rank], serving=True)
+    return None
+
+
+class IoChannel(object):
+    """
+    Point-to-point messages between a process running a plugin and the idle
+    process serving its I/O.  Each message is a header, pickled, followed by
+    its arrays, if any, sent as buffers.
+
+    :param Intracomm comm: The communicator.
+    :param int partner: The rank at the other end of the channel.
+    :keyword bool serving: True if this process serves the I/O of partner.
+    """
+
+    def __init__(self, comm, partner, serving=False):
+        self.comm = comm
+        self.partner = partner
+        self.serving = serving
+
+    def send(self, tag, header, arrays=()):
+        """ Send a header dictionary, with the transfer ('count') of any
+        arrays, and a list of arrays (entries may be None). """
+        header = dict(header)
+        header['arrays'] = [None if a is None else (a.shape, a.dtype.str)
+                            for a in arrays]
+        self.comm.send(header, dest=self.partner, tag=tag)
+        for a in arrays:
+            if a is not None:
+                self.comm.Send(np.ascontiguousarray(a), dest=self.partner,
+                               tag=tag)
+
+    def recv(self, tag, pool=None):
+        """ Receive a header dictionary and its arrays, into arrays from the
+        buffer pool, if given, held for the transfer in the header.
+
+        :rtype: tuple(dict, list)
+        """
+        header = self.comm.recv(source=self.partner, tag=tag)
+        count = header.get('count')
+        arrays = []
+        for entry in header.pop('arrays'):
+            if entry is None:
+                arrays.append(None)
+                continue
+            shape, dtype = entry
+            array = pool.get(shape, np.dtype(dtype), tag=count) if pool \
+                else np.empty(shape, dtype=np.dtype(dtype))
+            self.comm.Recv(array, source=self.partner, tag=tag)
+            arrays.append(array)
+        return header, arrays
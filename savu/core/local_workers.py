@@ -0,0 +1,197 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: local_workers
+   :platform: Unix
+   :synopsis: A pool of local worker processes that share the process frames \
+   of each transfer, with the transfer data in shared memory.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import logging
+import numpy as np
+import multiprocessing
+from multiprocessing import shared_memory
+
+# the transport, plugin and process dictionary of the plugin, inherited by
+# the workers when they are forked
+_context = None
+# the shared memory blocks attached by a worker, by name
+_attached = {}
+
+
+def get_n_workers(exp):
+    """ The number of local worker processes (the '--workers' option in local
+    mode), or 0 if the frames are processed by the framework process. """
+    return int(exp.meta_data.get_dictionary().get('workers', 0) or 0)
+
+
+def _initialise_worker():
+    transport, plugin, pDict = _context
+    # volume statistics are calculated by the framework process
+    plugin.stats_obj._4d = False
+
+
+def _attach(specs):
+    arrays = []
+    for name, shape, dtype in specs:
+        if name not in _attached:
+            # the block is owned, and unlinked, by the framework process,
+            # whose resource tracker the forked workers share
+            _attached[name] = shared_memory.SharedMemory(name=name)
+        arrays.append(np.ndarray(shape, dtype=dtype,
+                                 buffer=_attached[name].buf))
+    return arrays
+
+
+def _process_frames(args):
+    """ Process a block of the process frames of a transfer in a worker.
+
+    :returns: False if the plugin returned no result, the slice statistics
+        added and whether statistics are still calculated.
+    """
+    count, frames, in_specs, out_specs = args
+    transport, plugin, pDict = _context
+    tdata, result = _attach(in_specs), _attach(out_specs)
+    stats = plugin.stats_obj.stats or {}
+    mark = {k: len(v) for k, v in stats.items() if isinstance(v, list)}
+    done = True
+    with transport.pool.transfer(count):
+        for pcount, i in frames:
+            plugin.pcount = pcount
+            data = transport._get_input_data(plugin, tdata, i, count)
+            res = transport._get_output_data(
+                plugin.plugin_process_frames(data), i)
+            if res is None:
+                done = False
+                continue
+            for j in pDict['nOut']:
+                result[j][pDict['out_sl']['process'][i][j]] = res[j]
+    new = {k: v[mark[k]:] if k in mark else v for k, v in stats.items()}
+    return done, new, plugin.stats_obj.calc_stats
+
+
+class LocalWorkers(object):
+    """
+    A pool of worker processes, forked from the framework process once the
+    plugin is set up, that share the process frames of each transfer of the
+    plugin.  The transfer data and the results are copied through shared
+    memory, so all file access stays in the framework process and the output
+    is the same as when the frames are processed in order.  As each worker
+    has its own copy of the plugin, this is only used for plugins that
+    process each frame independently of the others (see PluginTools
+    .is_process_safe); any slice statistics are returned to the framework
+    process.
+
+    :param BaseTransport transport: The transport.
+    :param Plugin plugin: The plugin.
+    :param dict pDict: The process dictionary of the plugin.
+    :param int nWorkers: The number of worker processes.
+    """
+
+    def __init__(self, transport, plugin, pDict, nWorkers):
+        global _context
+        _context = (transport, plugin, pDict)
+        self._plugin = plugin
+        self._pDict = pDict
+        self._nWorkers = nWorkers
+        self._blocks = {}
+        self._pool = multiprocessing.get_context('fork').Pool(
+            nWorkers, initializer=_initialise_worker)
+        logging.info("%s: processing frames with %s local workers",
+                     plugin.name, nWorkers)
+
+    def process(self, count, prange, tdata, result):
+        """ Process the frames of a transfer, in prange, into the result
+        buffers.
+
+        :returns: False if the plugin returned no result for a frame.
+        :rtype: bool
+        """
+        plugin = self._plugin
+        start = plugin.pcount
+        in_specs = self.__share('in', tdata, copy=True)
+        out_specs = self.__share('out', result)
+        frames = list(enumerate(prange, start))
+        nBlocks = min(self._nWorkers, len(frames))
+        blocks = [frames[n*len(frames)//nBlocks:(n+1)*len(frames)//nBlocks]
+                  for n in range(nBlocks)]
+        returned = self._pool.map(
+            _process_frames,
+            [(count, block, in_specs, out_specs) for block in blocks])
+        plugin.pcount = start + len(prange)
+
+        shared = self.__views('out', result)
+        for i in prange:
+            for j in self._pDict['nOut']:
+                sl = self._pDict['out_sl']['process'][i][j]
+                result[j][sl] = shared[j][sl]
+        for _, stats, calc_stats in returned:
+            self.__merge_stats(stats, calc_stats)
+        return all(done for done, _, _ in returned)
+
+    def __share(self, kind, arrays, copy=False):
+        """ The name, shape and dtype of a shared memory block for each
+        array, optionally holding a copy of the array.  Blocks are kept
+        between transfers and only replaced if they are too small. """
+        specs = []
+        for n, array in enumerate(arrays):
+            block = self._blocks.get((kind, n))
+            if block is None or block.size < array.nbytes:
+                if block is not None:
+                    block.close()
+                    block.unlink()
+                block = shared_memory.SharedMemory(
+                    create=True, size=max(array.nbytes, 1))
+                self._blocks[(kind, n)] = block
+            if copy:
+                np.ndarray(array.shape, dtype=array.dtype,
+                           buffer=block.buf)[...] = array
+            specs.append((block.name, array.shape, array.dtype))
+        return specs
+
+    def __views(self, kind, arrays):
+        return [np.ndarray(a.shape, dtype=a.dtype,
+                           buffer=self._blocks[(kind, n)].buf)
+                for n, a in enumerate(arrays)]
+
+    def __merge_stats(self, stats, calc_stats):
+        stats_obj = self._plugin.stats_obj
+        if not calc_stats:
+            stats_obj.calc_stats = False
+        if stats_obj.stats is None:
+            return
+        for key, value in stats.items():
+            if isinstance(value, list) and key in stats_obj.stats:
+                stats_obj.stats[key].extend(value)
+            else:
+                stats_obj.stats[key] = value
+        if getattr(stats_obj, '_4d', False) and stats_obj.calc_stats and \
+                sum(stats_obj.stats['data_points']) >= \
+                stats_obj._volume_total_points:
+            stats_obj.set_volume_stats()
+
+    def close(self):
+        """ Stop the workers and free the shared memory. """
+        global _context
+        self._pool.close()
+        self._pool.join()
+        for block in self._blocks.values():
+            block.close()
+            block.unlink()
+        self._blocks = {}
+        _context = None
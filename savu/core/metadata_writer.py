@@ -0,0 +1,137 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: metadata_writer
+   :platform: Unix
+   :synopsis: Writes metadata dictionaries to hdf5 groups, only rewriting the \
+   entries that have changed since they were last written.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import json
+import hashlib
+import h5py
+import numpy as np
+
+import savu.core.utils as cu
+
+NX_CLASS = 'NX_class'
+
+
+def _classify(value):
+    """ The value as it is written to file: unchanged if hdf5 can store it,
+    as a numeric array if it is a list of numbers, otherwise as a json string
+    or, failing that, a savu encoded string. """
+    if isinstance(value, (str, bytes, bool, int, float, complex, np.generic)):
+        return value
+    if isinstance(value, (list, tuple, np.ndarray)):
+        try:
+            array = np.asarray(value)
+        except ValueError:
+            array = None
+        if array is not None and array.dtype.kind in 'biufcS':
+            return array
+    try:
+        return np.array([json.dumps(value).encode("ascii")])
+    except (TypeError, ValueError):
+        return cu._savu_encoder(value)
+
+
+def _digest(data):
+    """ A key that changes if the classified value changes. """
+    if isinstance(data, np.ndarray):
+        digest = hashlib.blake2b(data.tobytes(), digest_size=16)
+        digest.update(str((data.dtype.str, data.shape)).encode())
+        return digest.digest()
+    return type(data).__name__, data
+
+
+class MetadataWriter(object):
+    """
+    Writes metadata to hdf5 groups, with a dataset for each value and a
+    group for each dictionary.  Each value is classified once, before it is
+    written, and arrays are written in place if a dataset of the same shape
+    and dtype exists.  A digest of each value written is kept, so a value
+    that has not changed since it was last written to the same file is not
+    written again.
+    """
+
+    def __init__(self):
+        self._digests = {}
+
+    def write(self, group, name, value):
+        """ Write a value, or a dictionary of values, to the group.
+
+        :param h5py.Group group: The group.
+        :param str name: The dataset (or group, for a dictionary) name.
+        :param value: The value.
+        """
+        if isinstance(value, dict):
+            group = group.require_group(name)
+            group.attrs[NX_CLASS] = 'NXcollection'
+            self.__prune(group, value)
+            for key, item in value.items():
+                self.write(group, key, item)
+            return
+
+        data = _classify(value)
+        key = (group.file.filename, group.name + '/' + str(name))
+        digest = _digest(data)
+        if name in group and self._digests.get(key) == digest:
+            return
+        try:
+            self.__write_dataset(group, name, data)
+        except Exception:
+            raise Exception('Unable to output %s to file.' % name)
+        self._digests[key] = digest
+
+    def write_dict(self, group, mdict):
+        """ Write a metadata dictionary to the group, with each value in a
+        group of the same name, and remove entries no longer in the
+        dictionary.
+
+        :param h5py.Group group: The group.
+        :param dict mdict: The metadata dictionary.
+        """
+        group.attrs[NX_CLASS] = 'NXcollection'
+        self.__prune(group, mdict)
+        for key, value in mdict.items():
+            entry = group.require_group(key)
+            if isinstance(value, dict):
+                self.write_dict(entry, value)
+            else:
+                entry.attrs[NX_CLASS] = 'NXdata'
+                self.write(entry, key, value)
+
+    def __prune(self, group, mdict):
+        keys = set(str(k) for k in mdict.keys())
+        for name in [n for n in group.keys() if n not in keys]:
+            del group[name]
+
+    def __write_dataset(self, group, name, data):
+        if name in group:
+            dataset = group[name]
+            array = np.asarray(data)
+            if isinstance(dataset, h5py.Dataset) and \
+                    array.dtype.kind in 'biufc' and \
+                    dataset.shape == array.shape and \
+                    dataset.dtype == array.dtype:
+                if array.size:
+                    dataset.write_direct(np.ascontiguousarray(array))
+                return
+            del group[name]
+        group.create_dataset(name, data=data)
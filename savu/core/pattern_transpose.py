@@ -0,0 +1,331 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: pattern_transpose
+   :platform: Unix
+   :synopsis: Redistributes a dataset between processes in memory, with MPI \
+   Alltoallv, when it is written in one pattern and read in another.  Only \
+   the hdf5 transport is supported.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import logging
+import numpy as np
+from mpi4py import MPI
+
+import savu.plugins.utils as pu
+from savu.core.iterate_plugin_group_utils import check_if_in_iterative_loop
+
+# maximum bytes sent between each pair of processes in a single Alltoallv, so
+# the counts and displacements fit in a C int
+_MAX_ROUND_BYTES = 2**31 - 1
+
+
+def is_pattern_transpose(exp):
+    """ True if datasets may be redistributed in memory between plugins.  This
+    requires the 'pattern_transpose' system parameter to be 'auto' (it is
+    'off' by default), the hdf5 transport and more than one MPI process, with each process given a fixed
+    block of transfers.  The basic transport holds each dataset whole in
+    memory, so it is never redistributed. """
+    if exp.meta_data.get('system_params').get(
+            'pattern_transpose', 'off') != 'auto':
+        return False
+    mData = exp.meta_data.get_dictionary()
+    if mData.get('transport') != 'hdf5' or not mData.get('mpi', False) or \
+            len(mData.get('processes', [])) < 2 or \
+            mData.get('dynamic_frames', False):
+        return False
+    return check_if_in_iterative_loop(exp) is None
+
+
+def is_transpose_required(exp, data, comm):
+    """ True if an output dataset of the current plugin is read by the next
+    plugin with different slice dimensions, and a copy of the dataset fits in
+    the memory of the processes.  Both plugins must run on every process
+    (COMM_WORLD), as the blocks are exchanged by the writing processes when
+    the reading processes start.  This is collective over the communicator.
+
+    :param Experiment exp: The experiment.
+    :param Data data: An output dataset of the current plugin.
+    :param Intracomm comm: The plugin communicator.
+    """
+    name = data.get_name()
+    patterns = exp.meta_data.get_dictionary().get(
+        'current_and_next', {}).get(name)
+    if not patterns or not patterns['next']:
+        return False
+    current = list(patterns['current'].values())[0]['slice_dims']
+    nnext = list(patterns['next'].values())[0]['slice_dims']
+    if tuple(current) == tuple(nnext):
+        return False
+
+    nPlugin = exp.meta_data.get('nPlugin')
+    datasets_list = exp.meta_data.plugin_list._get_datasets_list()
+    if nPlugin + 1 >= len(datasets_list) or name not in \
+            [d['name'] for d in datasets_list[nPlugin + 1]['in_datasets']]:
+        return False
+    if not _is_world_plugin(exp, nPlugin + 1) or \
+            MPI.Comm.Compare(comm, MPI.COMM_WORLD) != MPI.IDENT:
+        return False
+
+    # the written blocks are kept and the next blocks are received
+    nbytes = 2 * np.prod(data.get_shape()) * np.dtype(data.dtype).itemsize
+    return nbytes / comm.Get_size() <= _get_memory_budget(exp, comm)
+
+
+def _is_world_plugin(exp, nPlugin):
+    """ True if the plugin at index nPlugin runs on all processes.  GPU and
+    multi-threaded plugins run on a subset of the processes, with their own
+    communicator. """
+    from savu.plugins.driver.cpu_plugin import CpuPlugin
+    plugin_list = exp.meta_data.plugin_list
+    plugin_dict = \
+        plugin_list.plugin_list[plugin_list._get_n_loaders() + nPlugin]
+    return issubclass(pu.load_class(plugin_dict['id']), CpuPlugin)
+
+
+def _get_memory_budget(exp, comm):
+    """ The number of bytes each process may use to hold redistributed data,
+    as a fraction of the memory available on the most loaded node. """
+    fraction = exp.meta_data.get('system_params').get(
+        'transpose_memory_fraction', 0.5)
+    node_comm = comm.Split_type(MPI.COMM_TYPE_SHARED)
+    available = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    budget = fraction * available / node_comm.Get_size()
+    node_comm.Free()
+    return comm.allreduce(budget, op=MPI.MIN)
+
+
+def _get_box(slice_list, shape):
+    """ Get the (start, stop) bounds of a tuple of unit step slices, clipped
+    to the data shape.
+
+    :returns: The bounds in each dimension, or None if the slice list cannot
+        be represented as a box.
+    :rtype: tuple(tuple(int, int))
+    """
+    if not isinstance(slice_list, (tuple, list)) or \
+            len(slice_list) != len(shape):
+        return None
+    box = []
+    for sl, length in zip(slice_list, shape):
+        if not isinstance(sl, slice) or sl.step not in [None, 1]:
+            return None
+        start = 0 if sl.start is None else max(sl.start, 0)
+        stop = length if sl.stop is None else min(sl.stop, length)
+        box.append((start, max(stop, start)))
+    return tuple(box)
+
+
+def _get_bounding_box(boxes):
+    """ The smallest box containing all the boxes. """
+    boxes = [b for b in boxes if b is not None]
+    if not boxes:
+        return None
+    return tuple((min(b[d][0] for b in boxes), max(b[d][1] for b in boxes))
+                 for d in range(len(boxes[0])))
+
+
+def _intersect(box1, box2):
+    """ The intersection of two boxes, or None if they do not overlap. """
+    if box1 is None or box2 is None:
+        return None
+    box = tuple((max(a[0], b[0]), min(a[1], b[1])) for a, b in zip(box1, box2))
+    return box if all(start < stop for start, stop in box) else None
+
+
+def _get_volume(box):
+    return int(np.prod([stop - start for start, stop in box])) if box else 0
+
+
+def _get_local_slices(box, outer):
+    """ The slices that select box from an array holding the outer box. """
+    return tuple(slice(b[0] - o[0], b[1] - o[0]) for b, o in zip(box, outer))
+
+
+class PatternTranspose(object):
+    """
+    Keeps the blocks of a dataset written by the current process and, when
+    the next plugin starts, exchanges them with the other processes so each
+    holds the block it reads in the next pattern.
+
+    :param Experiment exp: The experiment.
+    :param Data data: The output dataset.
+    :param Intracomm comm: The communicator of the writing plugin.
+    """
+
+    def __init__(self, exp, data, comm):
+        self.exp = exp
+        self.name = data.get_name()
+        self.shape = tuple(data.get_shape())
+        self.dtype = np.dtype(data.dtype)
+        self.comm = comm
+        self.nPlugin = exp.meta_data.get('nPlugin')
+        self.blocks = []
+        self.valid = True
+
+    def keep(self, slice_list, result):
+        """ Keep a copy of a block of results written to the backing file.
+
+        :param tuple(slice) slice_list: The transfer slice list of the block.
+        :param np.ndarray result: The block, as written to file.
+        """
+        box = _get_box(slice_list, self.shape)
+        if box is None or result is None or result.ndim != len(self.shape):
+            self.valid = False
+            return
+        box = tuple((b[0], b[0] + n) for b, n in zip(box, result.shape))
+        self.blocks.append((box, np.array(result, dtype=self.dtype)))
+
+    def redistribute(self, dataset, slice_lists):
+        """ Exchange the kept blocks so this process holds the region covered
+        by its transfers in the next pattern.  This is collective over the
+        communicator.
+
+        :param h5py.Dataset dataset: The dataset in the backing file.
+        :param list(tuple(slice)) slice_lists: The transfer slice lists of
+            this process in the next pattern.
+        :returns: The dataset wrapped to read from memory, or None if the
+            data could not be redistributed.
+        :rtype: TransposedDataset
+        """
+        comm = self.comm
+        needed = _get_bounding_box(
+            [_get_box(sl, self.shape) for sl in slice_lists])
+        boxes = comm.allgather([box for box, _ in self.blocks])
+        all_needed = comm.allgather(needed)
+
+        budget = _get_memory_budget(self.exp, comm)
+
+        sources = [[_intersect(box, needed) for box in src] for src in boxes]
+        received = sum(_get_volume(box) for src in sources for box in src)
+        nbytes = _get_volume(needed) * self.dtype.itemsize
+        ok = self.valid and received == _get_volume(needed) and \
+            nbytes <= budget
+        if not comm.allreduce(ok, op=MPI.LAND):
+            logging.warning("Unable to redistribute %s in memory, reading "
+                            "from file instead.", self.name)
+            self.blocks = []
+            return None
+
+        logging.info("Redistributing %s between processes in memory.",
+                     self.name)
+        send = [self.__pack(dest) for dest in all_needed]
+        self.blocks = []
+        recv_counts = [sum(_get_volume(box) for box in src) *
+                       self.dtype.itemsize for src in sources]
+        recv = _alltoallv(comm, send, recv_counts)
+
+        local = np.empty([stop - start for start, stop in needed],
+                         dtype=self.dtype) if needed else None
+        for src, buf in zip(sources, recv):
+            buf = buf.view(self.dtype)
+            offset = 0
+            for box in [b for b in src if b is not None]:
+                size = _get_volume(box)
+                shape = [stop - start for start, stop in box]
+                local[_get_local_slices(box, needed)] = \
+                    buf[offset:offset+size].reshape(shape)
+                offset += size
+        return TransposedDataset(dataset, needed, local) if needed else None
+
+    def __pack(self, dest_box):
+        """ Flatten the parts of the kept blocks inside dest_box, in the
+        order the destination expects them. """
+        pieces = []
+        for box, block in self.blocks:
+            inter = _intersect(box, dest_box)
+            if inter:
+                pieces.append(np.ascontiguousarray(
+                    block[_get_local_slices(inter, box)]).ravel())
+        if not pieces:
+            return np.empty(0, dtype=np.uint8)
+        return np.concatenate(pieces).view(np.uint8)
+
+
+def _alltoallv(comm, send, recv_counts):
+    """ Exchange a byte buffer with every process, in as many rounds of
+    Alltoallv as are needed to keep each count within a C int.
+
+    :param list(np.ndarray) send: The bytes for each destination process.
+    :param list(int) recv_counts: The bytes expected from each source.
+    :returns: The bytes received from each source process.
+    :rtype: list(np.ndarray)
+    """
+    send_counts = [len(s) for s in send]
+    step = _MAX_ROUND_BYTES // comm.Get_size()
+    longest = max(send_counts + recv_counts + [0])
+    nRounds = comm.allreduce(-(-longest // step), op=MPI.MAX)
+    recv = [np.empty(count, dtype=np.uint8) for count in recv_counts]
+
+    for n in range(nRounds):
+        sl = slice(n*step, (n+1)*step)
+        sbufs = [s[sl] for s in send]
+        scounts = [len(s) for s in sbufs]
+        rcounts = [len(r[sl]) for r in recv]
+        sbuf = np.concatenate(sbufs) if sum(scounts) else \
+            np.empty(0, dtype=np.uint8)
+        rbuf = np.empty(sum(rcounts), dtype=np.uint8)
+        comm.Alltoallv([sbuf, (scounts, _displacements(scounts)), MPI.BYTE],
+                       [rbuf, (rcounts, _displacements(rcounts)), MPI.BYTE])
+        offsets = _displacements(rcounts)
+        for r, offset, count in zip(recv, offsets, rcounts):
+            r[sl] = rbuf[offset:offset+count]
+    return recv
+
+
+def _displacements(counts):
+    return [int(c) for c in np.concatenate([[0], np.cumsum(counts)[:-1]])]
+
+
+class TransposedDataset(object):
+    """
+    A backing file dataset whose block read by this process is held in
+    memory.  Reads that fall inside the block are served from memory and all
+    other access is passed to the dataset.
+
+    :param h5py.Dataset dataset: The dataset in the backing file.
+    :param tuple(tuple(int, int)) box: The bounds of the block in memory.
+    :param np.ndarray block: The block.
+    """
+
+    def __init__(self, dataset, box, block):
+        self.dataset = dataset
+        self.box = box
+        self.block = block
+
+    def __getattr__(self, name):
+        if name == 'dataset':
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, slice_list):
+        box = _get_box(slice_list, self.dataset.shape)
+        inside = box is not None and all(
+            sl.start is None or sl.start >= 0 for sl in slice_list) and \
+            _intersect(box, self.box) == box
+        if not inside:
+            return self.dataset[slice_list]
+        # a copy, as plugins may modify their input in place
+        return np.array(self.block[_get_local_slices(box, self.box)])
+
+    def __setitem__(self, slice_list, value):
+        self.dataset[slice_list] = value
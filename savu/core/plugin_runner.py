@@ -19,6 +19,7 @@
 .. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
 """
 
+import copy
 import logging
 import time
 
@@ -27,6 +28,9 @@ import savu.plugins.utils as pu
 from savu.data.experiment_collection import Experiment
 from savu.data.stats.statistics import Statistics
 from savu.core.iterative_plugin_runner import IteratePluginGroup
+from savu.core.fused_plugin_runner import find_fused_groups
+from savu.core.concurrent_plugin_runner import find_concurrent_steps
+from savu.core.result_cache import get_result_cache, get_result_keys
 from savu.core.iterate_plugin_group_utils import check_if_in_iterative_loop, \
     check_if_end_plugin_in_iterate_group
 
@@ -47,6 +51,9 @@ class PluginRunner(object):
         # add all relevent locations to the path
         pu.get_plugins_paths()
         self.exp = Experiment(options)
+        self.cache = None
+        # a copy of the checked plugin list, for later scans of a batch run
+        self.checked_plugin_list = None
 
     def _run_plugin_list(self):
         """ Create an experiment and run the plugin list.
@@ -55,9 +62,10 @@ class PluginRunner(object):
         self.exp._setup(self)
         Statistics._setup_class(self.exp)
 
-        plugin_list = self.exp.meta_data.plugin_list
         logging.info('Running the plugin list check')
-        self._run_plugin_list_setup(plugin_list)
+        self._run_plugin_list_setup(self.exp.meta_data.plugin_list)
+        # the plugin list is read again if a checked list could not be used
+        plugin_list = self.exp.meta_data.plugin_list
 
         exp_coll = self.exp._get_collection()
         n_plugins = plugin_list._get_n_processing_plugins()
@@ -66,8 +74,15 @@ class PluginRunner(object):
         logging.info('Running transport_pre_plugin_list_run()')
         self._transport_pre_plugin_list_run()
 
+        self.cache = get_result_cache(self.exp)
+        keys = get_result_keys(self.exp) if self.cache else {}
+
         cp = self.exp.checkpoint
         checkpoint_plugin = cp.get_checkpoint_plugin()
+        fused_groups = find_fused_groups(self.exp, first=checkpoint_plugin)
+        concurrent_steps = find_concurrent_steps(
+            self.exp, first=checkpoint_plugin,
+            exclude=set(fused_groups) | set(keys))
         for i in range(checkpoint_plugin, n_plugins):
             self.exp._set_experiment_for_current_plugin(i)
             memory_before = cu.get_memory_usage_linux()
@@ -76,10 +91,26 @@ class PluginRunner(object):
             # plugin index that corresponds to a plugin inside the group to
             # iterate over or not
             current_iterate_plugin_group = check_if_in_iterative_loop(self.exp)
-
-            if current_iterate_plugin_group is None:
+            fused_group = fused_groups.get(i)
+            concurrent_step = concurrent_steps.get(i)
+            key = keys.get(i) if fused_group is None and \
+                self.exp.index['out_data'] else None
+            entry = self.cache.lookup(key) if key else None
+
+            if fused_group is not None:
+                # the whole group is run when its first plugin is reached
+                plugin_name = fused_group._execute(self, i)
+            elif concurrent_step is not None:
+                # as are all the plugins in a concurrent step
+                plugin_name = concurrent_step._execute(self, i)
+            elif entry:
+                plugin = self.__load_cached_plugin(
+                    exp_coll['plugin_dict'][i], entry)
+                plugin_name = plugin.name
+            elif current_iterate_plugin_group is None:
                 # not in an iterative loop, run as normal
-                plugin = self.__run_plugin(exp_coll['plugin_dict'][i])
+                plugin = self.__run_plugin(exp_coll['plugin_dict'][i],
+                                           cache_key=key)
                 plugin_name = plugin.name
             else:
                 # in an iterative loop, run differently
@@ -94,8 +125,11 @@ class PluginRunner(object):
                 plugin_name, memory_before, memory_after, memory_after - memory_before))
 
             #  ********* transport functions ***********
-            # end the plugin run if savu has been killed
-            if self._transport_kill_signal():
+            # end the plugin run if savu has been killed (intermediate
+            # datasets in a fused group are not saved, so only stop at the end
+            # or if the group itself was killed)
+            if (fused_group is None or i == fused_group.end_index or
+                    fused_group.killed) and self._transport_kill_signal():
                 self._transport_cleanup(i + 1)
                 break
             self.exp._barrier(msg='PluginRunner: No kill signal... continue.')
@@ -128,7 +162,60 @@ class PluginRunner(object):
         cu.user_message("* Processing " + msg + " in " + str(Statistics.total_time) + " seconds *")
         cu.user_message("*" * stars)
 
-    def __run_plugin(self, plugin_dict, clean_up_plugin=True, plugin=None):
+    def __load_cached_plugin(self, plugin_dict, entry):
+        """ Load a plugin, and link its cached output files and restore the
+        metadata of its datasets in place of running it. """
+        plugin = self._transport_load_plugin(self.exp, plugin_dict)
+        plugin.stats_obj.start_time()
+
+        #  ********* transport function ***********
+        self.exp.meta_data.set('cached_result', (self.cache, entry))
+        self._transport_pre_plugin()
+        self.exp.meta_data.delete('cached_result')
+        cu.user_message("*Loading the cached results of the %s plugin*"
+                        % plugin.name)
+
+        metadata = self.cache.get_metadata(entry)
+        for dtype, datasets in (('in_data', plugin.get_in_datasets()),
+                                ('out_data', plugin.get_out_datasets())):
+            for data in datasets:
+                if data.get_name() in metadata[dtype]:
+                    data.meta_data._set_dictionary(
+                        metadata[dtype][data.get_name()])
+        plugin._revert_preview(plugin.get_in_datasets())
+        for data in plugin.get_out_datasets():
+            data.set_shape(data.data.shape)
+
+        plugin._clean_up()
+        finalise = self.exp._finalise_experiment_for_current_plugin()
+
+        #  ********* transport function ***********
+        self._transport_post_plugin()
+
+        for data in finalise['remove'] + finalise['replace']:
+            #  ********* transport function ***********
+            self._transport_terminate_dataset(data)
+
+        self.exp._reorganise_datasets(finalise)
+        plugin.stats_obj.stop_time()
+        return plugin
+
+    def __get_cached_metadata(self, plugin):
+        """ The metadata of the plugin datasets, once it has run. """
+        return {'in_data': {d.get_name(): copy.deepcopy(
+                    d.meta_data.get_dictionary())
+                    for d in plugin.get_in_datasets()},
+                'out_data': {d.get_name(): copy.deepcopy(
+                    d.meta_data.get_dictionary())
+                    for d in plugin.get_out_datasets()}}
+
+    def _run_single_plugin(self, plugin_dict):
+        """ Load and run a single plugin, as it would be run outside of a
+        plugin group (see FusedPluginGroup). """
+        return self.__run_plugin(plugin_dict)
+
+    def __run_plugin(self, plugin_dict, clean_up_plugin=True, plugin=None,
+                     cache_key=None):
         # allow plugin objects to be reused for running iteratively
         if plugin is None:
             plugin = self._transport_load_plugin(self.exp, plugin_dict)
@@ -174,6 +261,8 @@ class PluginRunner(object):
 
         self.exp._barrier(msg="Plugin returned from driver in Plugin Runner")
         cu._output_summary(self.exp.meta_data.get("mpi"), plugin)
+        if cache_key:
+            metadata = self.__get_cached_metadata(plugin)
 
         # if NOT in an iterative loop, clean up the PluginData associated with
         # the Data objects in the plugin object as normal
@@ -197,6 +286,11 @@ class PluginRunner(object):
         #  ********* transport function ***********
         self._transport_post_plugin()
 
+        if cache_key:
+            self.cache.store(cache_key, {
+                name: self.exp.meta_data.get(['filename', name]) for name in
+                self.exp.index['out_data'].keys()}, metadata)
+
         for data in finalise['remove'] + finalise['replace']:
             #  ********* transport function ***********
             self._transport_terminate_dataset(data)
@@ -209,10 +303,15 @@ class PluginRunner(object):
 
     def _run_plugin_list_setup(self, plugin_list):
         """ Run the plugin list through the framework without executing the
-        main processing.
+        main processing.  A plugin list checked by an earlier scan of a batch
+        run (see PluginList._get_checked_copy) is not checked again, only set
+        up for the datasets of this scan, if its loaders create the same
+        datasets.
         """
-        plugin_list._check_loaders()
-        self.__check_gpu()
+        checked = plugin_list._checked_datasets is not None
+        if not checked:
+            plugin_list._check_loaders()
+            self.__check_gpu()
 
         n_loaders = self.exp.meta_data.plugin_list._get_n_loaders()
         n_plugins = plugin_list._get_n_processing_plugins()
@@ -223,6 +322,20 @@ class PluginRunner(object):
             pu.plugin_loader(self.exp, plist[i])
             self.exp._set_initial_datasets()
 
+        if checked:
+            if sorted(self.exp.index['in_data']) == \
+                    plugin_list._checked_datasets:
+                self.__set_up_checked_plugins(plugin_list)
+                return
+            logging.warning("The loaders created different datasets to the "
+                            "batch scan the plugin list was checked on: "
+                            "checking it again.")
+            self.exp._populate_plugin_list(
+                self.exp.meta_data.get('process_file'))
+            self.exp.index = {"in_data": {}, "out_data": {}}
+            self._run_plugin_list_setup(self.exp.meta_data.plugin_list)
+            return
+
         # run all plugin setup methods and store information in experiment
         # collection
         count = 0
@@ -243,8 +356,23 @@ class PluginRunner(object):
 
         self.exp._reset_datasets()
         self.exp._finalise_setup(plugin_list)
+        if self.exp.meta_data.get_dictionary().get('batch', False):
+            self.checked_plugin_list = plugin_list._get_checked_copy(
+                list(self.exp.index['in_data']))
         cu.user_message("Plugin list check complete!")
 
+    def __set_up_checked_plugins(self, plugin_list):
+        """ Set up each plugin, and saver, of a checked plugin list for the
+        datasets of this scan, to find their shapes and patterns. """
+        plugin_list._reset_datasets_list()
+        n_loaders = plugin_list._get_n_loaders()
+        for count, plugin_dict in \
+                enumerate(plugin_list.plugin_list[n_loaders:]):
+            self.__plugin_setup(plugin_dict, count)
+        self.exp._reset_datasets()
+        self.exp._finalise_setup(plugin_list)
+        cu.user_message("Plugin list set up for this scan.")
+
     def __plugin_setup(self, plugin_dict, count):
         self.exp.meta_data.set("nPlugin", count)
         plugin = pu.plugin_loader(self.exp, plugin_dict, check=True)
@@ -0,0 +1,237 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: result_cache
+   :platform: Unix
+   :synopsis: A cache of the output files of plugins, shared between runs and \
+   keyed by everything that determines the results.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import json
+import fcntl
+import shutil
+import pickle
+import hashlib
+import logging
+from mpi4py import MPI
+
+METADATA = 'metadata.pkl'
+# ioctl request to clone a file on a copy-on-write file system (linux/fs.h)
+FICLONE = 0x40049409
+
+
+def get_result_cache(exp):
+    """ The result cache in the folder given by the 'result_cache_path'
+    system parameter, or None if results are not cached.  Results are only
+    cached with the hdf5 transport, and not when restarting from a
+    checkpoint, in a pre-run or with iterative plugins. """
+    params = exp.meta_data.get('system_params')
+    path = params.get('result_cache_path')
+    if not path or str(path).lower() == 'none':
+        return None
+    mData = exp.meta_data.get_dictionary()
+    if mData.get('transport') != 'hdf5' or mData.get('checkpoint') or \
+            mData.get('pre_run') or \
+            exp.meta_data.plugin_list.iterate_plugin_groups:
+        logging.warning("Plugin results are not cached when restarting from "
+                        "a checkpoint, in a pre-run, with iterative plugins "
+                        "or with the %s transport.", mData.get('transport'))
+        return None
+    folder = os.path.abspath(os.path.expandvars(str(path)))
+    max_bytes = float(params.get('result_cache_gb', 100))*1024**3
+    comm = MPI.COMM_WORLD if mData.get('mpi', False) else None
+    root = len(mData['processes']) - 1
+    if mData['process'] == root:
+        os.makedirs(folder, exist_ok=True)
+    exp._barrier(msg='Creating the result cache folder.')
+    return ResultCache(folder, max_bytes, comm=comm, root=root)
+
+
+def _hash(value):
+    text = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def _file_identity(path):
+    """ The path, size and modification time of a file, or None if it is not
+    a file. """
+    if not isinstance(path, str) or not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def _files_in(params):
+    """ The identity of each file named by a parameter value. """
+    values = params.values() if isinstance(params, dict) else params
+    files = []
+    for value in values:
+        if isinstance(value, (dict, list, tuple)):
+            files.extend(_files_in(value))
+        else:
+            identity = _file_identity(value)
+            if identity:
+                files.append(identity)
+    return files
+
+
+def get_result_keys(exp):
+    """ The cache key of each processing plugin, by index.  The datasets
+    created by the loaders are keyed by the input file and the loader
+    parameters (including previewing), and the key of a plugin is made from
+    its index, id and parameters (and any files they name) and the keys of
+    its input datasets.  A plugin updates the key of every dataset it reads
+    or writes, as it may change the metadata of its input datasets.
+
+    :rtype: dict
+    """
+    plugin_list = exp.meta_data.plugin_list
+    loaders = plugin_list.plugin_list[:plugin_list._get_n_loaders()]
+    source = _hash([_file_identity(exp.meta_data.get('data_file')),
+                    [(p['id'], p['data'], _files_in(p['data']))
+                     for p in loaders]])
+
+    plugin_dicts = exp._get_collection()['plugin_dict']
+    data_keys = {}
+    keys = {}
+    for i, datasets in enumerate(plugin_list._get_datasets_list()):
+        plugin_dict = plugin_dicts[i]
+        in_names = [d['name'] for d in datasets['in_datasets']]
+        out_names = [d['name'] for d in datasets['out_datasets']]
+        keys[i] = _hash([i, plugin_dict['id'], plugin_dict['data'],
+                         _files_in(plugin_dict['data']),
+                         [data_keys.get(name, source) for name in in_names]])
+        for name in in_names + out_names:
+            data_keys[name] = _hash([keys[i], name])
+    return keys
+
+
+def copy_file(path, filename):
+    """ Copy a file to filename (replacing any file there), as a reflink if
+    the file system supports it.  The files are never hard linked, as output
+    files are reopened for writing and must not change the cached copy. """
+    temp = filename + '.part'
+    try:
+        with open(path, 'rb') as src, open(temp, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        shutil.copyfile(path, temp)
+    os.replace(temp, filename)
+
+
+class ResultCache(object):
+    """
+    A folder with an entry for each cached plugin result, named by its key,
+    holding a copy of the output file of each dataset and the metadata of
+    the plugin datasets once it completed.  Files are copied into and out of
+    the cache (as reflinks where possible), so writing to, or removing, an
+    output file never changes the cached result.  Entries are added, and removed, by the root
+    process only.  The least recently used entries are removed when the
+    cache grows beyond max_bytes.
+
+    :param str folder: The cache folder.
+    :param float max_bytes: The most bytes kept in the cache.
+    :keyword Intracomm comm: The communicator, if lookups are shared between
+        processes.
+    :keyword int root: The rank that manages the cache.
+    """
+
+    def __init__(self, folder, max_bytes, comm=None, root=0):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._comm = comm
+        self._root = root
+        self._used = set()
+
+    def _is_root(self):
+        return self._comm is None or self._comm.rank == self._root
+
+    def lookup(self, key):
+        """ The entry for the key, or None if it is not in the cache.  This is
+        collective over the communicator, so all processes agree.
+
+        :rtype: str
+        """
+        entry = None
+        if self._is_root():
+            path = os.path.join(self.folder, key)
+            if os.path.exists(os.path.join(path, METADATA)):
+                entry = path
+                # the modification time orders entries by their last use
+                os.utime(path)
+                self._used.add(key)
+        if self._comm is not None:
+            entry = self._comm.bcast(entry, root=self._root)
+        return entry
+
+    def get_file(self, entry, name):
+        """ The cached output file of a dataset. """
+        return os.path.join(entry, name + '.h5')
+
+    def get_metadata(self, entry):
+        """ The metadata of the datasets of the plugin, by dataset type
+        ('in_data' or 'out_data') and name. """
+        with open(os.path.join(entry, METADATA), 'rb') as f:
+            return pickle.load(f)
+
+    def store(self, key, files, metadata):
+        """ Add an entry (on the root process only).
+
+        :param str key: The key.
+        :param dict files: The output file of each dataset, by name.
+        :param dict metadata: The metadata of the plugin datasets.
+        """
+        if not self._is_root():
+            return
+        entry = os.path.join(self.folder, key)
+        temp = os.path.join(self.folder, '.%s.%d' % (key, os.getpid()))
+        try:
+            os.makedirs(temp)
+            for name, filename in files.items():
+                copy_file(filename, self.get_file(temp, name))
+            with open(os.path.join(temp, METADATA), 'wb') as f:
+                pickle.dump(metadata, f)
+            os.rename(temp, entry)
+        except Exception as e:
+            shutil.rmtree(temp, ignore_errors=True)
+            logging.warning("Unable to cache the plugin results: %s", e)
+            return
+        self._used.add(key)
+        self.evict()
+
+    def evict(self):
+        """ Remove the least recently used entries, other than those used by
+        this run, until the cache is within max_bytes. """
+        entries = []
+        for key in os.listdir(self.folder):
+            path = os.path.join(self.folder, key)
+            if key.startswith('.') or not os.path.isdir(path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, f))
+                       for f in os.listdir(path))
+            entries.append((os.path.getmtime(path), key, size))
+        total = sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key in self._used:
+                continue
+            logging.debug("Removing %s from the result cache", key)
+            shutil.rmtree(os.path.join(self.folder, key), ignore_errors=True)
+            total -= size
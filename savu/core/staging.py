@@ -0,0 +1,146 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: staging
+   :platform: Unix
+   :synopsis: Writes the backing files to node-local storage and copies \
+   them to the output (or intermediate) folder in the background.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import shutil
+import logging
+import h5py
+from mpi4py import MPI
+from concurrent.futures import ThreadPoolExecutor
+
+
+def get_staging_folder(exp):
+    """ The folder on node-local storage that the backing files are written
+    to, taken from the 'staging_path' system parameter, or None if the files
+    are written to the output (or intermediate) folder.  Every process opens
+    each backing file, so all processes must share a node.  This is
+    collective over all processes.
+    """
+    path = exp.meta_data.get('system_params').get('staging_path')
+    if not path or str(path).lower() == 'none':
+        return None
+    mData = exp.meta_data.get_dictionary()
+    if mData.get('transport') != 'hdf5' or mData.get('checkpoint') or \
+            mData.get('pre_run') or \
+            exp.meta_data.plugin_list.iterate_plugin_groups:
+        logging.warning("Staging is not available when restarting from a "
+                        "checkpoint, in a pre-run or with iterative plugins, "
+                        "writing to the output folder.")
+        return None
+    if mData.get('mpi', False):
+        comm = MPI.COMM_WORLD
+        node_comm = comm.Split_type(MPI.COMM_TYPE_SHARED)
+        single_node = node_comm.Get_size() == comm.Get_size()
+        node_comm.Free()
+        if not single_node:
+            logging.warning("Staging requires all processes on one node, "
+                            "writing to the output folder.")
+            return None
+    folder = os.path.join(os.path.abspath(os.path.expandvars(path)),
+                          mData['out_folder'])
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _copy(staged, final):
+    """ Copy the staged file to a temporary name, so a partial copy is never
+    seen at the final path. """
+    temp = final + '.part'
+    shutil.copyfile(staged, temp)
+    os.replace(temp, final)
+
+
+class FileMigrator(object):
+    """
+    Copies staged backing files that are linked from the NeXus file (final
+    results and intermediate datasets) to the folders they would otherwise
+    have been written to, one at a time in a background thread, and points
+    their external links in the NeXus file at the copies once they are
+    complete.  Only the process that writes the NeXus file should create a
+    FileMigrator.
+
+    :param str nxs_filename: The output NeXus file.
+    :param str out_path: The output folder.
+    """
+
+    def __init__(self, nxs_filename, out_path):
+        self.nxs_filename = nxs_filename
+        self.out_path = out_path
+        self._copier = ThreadPoolExecutor(max_workers=1)
+        self._pending = []
+        self._migrated = []
+
+    def add(self, staged, nxs_entry, folder=None):
+        """ Start copying a staged file, which must not be written again.
+
+        :param str staged: The staged file.
+        :param str nxs_entry: The NeXus file entry that links to the file.
+        :keyword str folder: The folder to copy the file to, if not the
+            output folder.
+        """
+        final = os.path.join(folder or self.out_path, os.path.basename(staged))
+        logging.debug("Migrating %s to %s", staged, final)
+        future = self._copier.submit(_copy, staged, final)
+        self._pending.append((future, staged, final, nxs_entry))
+
+    def update_links(self, wait=False):
+        """ Point the NeXus links of the completed copies at the output folder.
+
+        :keyword bool wait: Wait for all copies to complete.
+        """
+        pending = []
+        done = []
+        for item in self._pending:
+            if wait or item[0].done():
+                item[0].result()
+                done.append(item)
+            else:
+                pending.append(item)
+        self._pending = pending
+        if not done:
+            return
+
+        with h5py.File(self.nxs_filename, 'a') as nxs_file:
+            for _, staged, final, nxs_entry in done:
+                link = nxs_file.get(nxs_entry, getlink=True)
+                if isinstance(link, h5py.ExternalLink) and \
+                        link.filename == staged:
+                    # files outside the output folder are linked by their
+                    # full path, as they are when not staged
+                    inside = os.path.dirname(final) == self.out_path
+                    del nxs_file[nxs_entry]
+                    nxs_file[nxs_entry] = h5py.ExternalLink(
+                        os.path.relpath(final, self.out_path) if inside
+                        else final, link.path)
+                    # no other links are made to the file
+                    self._migrated.append(staged)
+
+    def finish(self):
+        """ Wait for all copies, update their links and remove the staged
+        files that are no longer linked to. """
+        self.update_links(wait=True)
+        self._copier.shutdown()
+        for staged in self._migrated:
+            os.remove(staged)
+        self._migrated = []
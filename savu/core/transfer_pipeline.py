@@ -0,0 +1,101 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: transfer_pipeline
+   :platform: Unix
+   :synopsis: Overlaps the reading and writing of transfer chunks with the \
+   processing of the current chunk.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import logging
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TransferPipeline(object):
+    """
+    Reads transfer chunks ahead of, and writes results behind, the chunk
+    currently being processed.  Reads and writes each have a single
+    background thread so the order of file access per process is unchanged.
+
+    :param BaseTransport transport: The transport instance that owns the
+        slice lists and performs the file access.
+    :param int depth: The number of chunks read ahead (and results written
+        behind) the current chunk.
+    """
+
+    def __init__(self, transport, depth):
+        self.transport = transport
+        self.depth = depth
+        self._reader = ThreadPoolExecutor(max_workers=1)
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._reads = collections.OrderedDict()
+        self._writes = collections.deque()
+        self._counts = iter([])
+
+    def start(self, counts):
+        """ Begin reading the first chunks in the list of transfer indices.
+
+        :param iterable counts: The transfer indices in processing order.
+        """
+        self._counts = iter(counts)
+        for _ in range(self.depth + 1):
+            self.__read_next()
+
+    def __read_next(self):
+        count = next(self._counts, None)
+        if count is not None:
+            self._reads[count] = self._reader.submit(
+                self.transport._transfer_all_data, count)
+
+    def __iter__(self):
+        """ Yield the transfer index and data of each chunk in the order they
+        were requested, requesting the next chunk as each one is taken. """
+        while self._reads:
+            count, future = self._reads.popitem(last=False)
+            transfer_data = future.result()
+            self.__read_next()
+            yield count, transfer_data
+
+    def put(self, count, result, end):
+        """ Write the results of chunk ``count`` in the background.  A result
+        buffer is only reused ``depth + 1`` chunks later, so at most ``depth``
+        writes are left pending. """
+        self.__wait_for_writes(self.depth - 1)
+        self._writes.append(self._writer.submit(
+            self.transport._return_all_data, count, result, end))
+
+    def wait_for_writes(self):
+        """ Block until all pending writes have reached the backing files. """
+        self.__wait_for_writes(0)
+
+    def __wait_for_writes(self, limit):
+        while len(self._writes) > max(limit, 0):
+            self._writes.popleft().result()
+
+    def close(self):
+        """ Flush all pending writes and stop the background threads. """
+        try:
+            self.wait_for_writes()
+        finally:
+            for future in self._reads.values():
+                future.cancel()
+            self._reads.clear()
+            self._reader.shutdown(wait=True)
+            self._writer.shutdown(wait=True)
+            logging.debug("Transfer pipeline closed.")
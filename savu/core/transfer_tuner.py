@@ -0,0 +1,215 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: transfer_tuner
+   :platform: Unix
+   :synopsis: Chooses, at run time, how many consecutive transfers are read \
+   from file at once, from the measured throughput.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import time
+import h5py
+import logging
+import numpy as np
+
+NX_CLASS = 'NX_class'
+
+
+def is_transfer_tuning(exp):
+    """ True if the 'transfer_tuning' system parameter is 'adaptive', or the
+    transfer sizes from a previous run are to be reused.  Transfers claimed
+    on demand are not consecutive, so dynamic frame distribution is
+    excluded. """
+    mData = exp.meta_data.get_dictionary()
+    if mData.get('dynamic_frames', False):
+        return False
+    return exp.meta_data.get('system_params').get(
+        'transfer_tuning', 'static') == 'adaptive' or \
+        bool(mData.get('tuning_file'))
+
+
+def _get_previous_tuning(exp):
+    """ The number of transfers per read recorded for each plugin in the
+    output NeXus file of a previous run (the 'tuning_file' option). """
+    mData = exp.meta_data.get_dictionary()
+    if 'previous_tuning' not in mData:
+        tuning = {}
+        filename = mData.get('tuning_file')
+        if filename:
+            with h5py.File(filename, 'r') as nxs_file:
+                group = nxs_file.get('entry/transfer_tuning', {})
+                for key in group:
+                    tuning[key] = int(group[key].attrs['transfers_per_read'])
+        exp.meta_data.set('previous_tuning', tuning)
+    return exp.meta_data.get('previous_tuning')
+
+
+def _get_merge_dim(slice_lists):
+    """ Find the single dimension in which consecutive transfer slice lists
+    advance, with unit steps and no gaps.
+
+    :param list(tuple(slice)) slice_lists: The slice lists, in order.
+    :returns: The number of slice lists, from the start, that can be read
+        as one, and the dimension they advance in.
+    :rtype: int, int
+    """
+    dim = None
+    for n in range(1, len(slice_lists)):
+        prev, sl = slice_lists[n-1], slice_lists[n]
+        diff = [d for d in range(len(sl)) if sl[d] != prev[d]]
+        if len(diff) != 1 or (dim is not None and diff[0] != dim):
+            return n, dim
+        a, b = prev[diff[0]], sl[diff[0]]
+        if not isinstance(a, slice) or a.step not in [None, 1] or \
+                b.step not in [None, 1] or \
+                None in [a.start, a.stop, b.start, b.stop] or \
+                not a.start <= b.start <= a.stop <= b.stop:
+            return n, dim
+        dim = diff[0]
+    return len(slice_lists), dim
+
+
+class TransferTuner(object):
+    """
+    Reads a process' consecutive transfers in batches that are read from file
+    as a single slice, and times each batch of transfers, from being read to
+    being written.  The number of transfers per batch is doubled while the
+    time per transfer falls, then fixed at the fastest value.
+
+    :param BaseTransport transport: The transport, after process_setup.
+    :param plugin plugin: The current plugin instance.
+    :param int max_batch: The largest batch that fits in memory.
+    """
+
+    def __init__(self, transport, plugin, max_batch):
+        exp = transport.exp
+        self.transport = transport
+        self.pDict = transport.pDict
+        self.plugin = plugin
+        self.key = "%s_%s" % (exp.meta_data.get('nPlugin'), plugin.name)
+        self.samples = exp.meta_data.get('system_params').get(
+            'transfer_tuning_samples', 2)
+        self.max_batch = max(max_batch, 1)
+
+        previous = _get_previous_tuning(exp).get(self.key)
+        self.tuning = previous is None and exp.meta_data.get(
+            'system_params').get('transfer_tuning', 'static') == 'adaptive'
+        self.nbatch = min(previous, self.max_batch) if previous else 1
+        self.best = self.nbatch
+        self.times = {}
+        self.batch = {}
+        self.started = None
+        self.warm = False
+
+    def get(self, count, nTrans):
+        """ Get the data for transfer ``count``, reading the batch that
+        starts with it if required. """
+        if count not in self.batch:
+            self.__measure()
+            self.batch = self.__read_batch(count, nTrans)
+            self.started = (time.time(), len(self.batch))
+        return self.batch.pop(count)
+
+    def __measure(self):
+        """ Time the previous batch, which has now been processed and
+        written, and choose the size of the next batch. """
+        if self.started is None:
+            return
+        start, ntransfers = self.started
+        if not self.warm:
+            # the first batch includes start up costs
+            self.warm = True
+            return
+        self.times.setdefault(self.nbatch, []).append(
+            (time.time() - start) / ntransfers)
+        if self.tuning and len(self.times[self.nbatch]) >= self.samples:
+            self.__choose()
+
+    def __choose(self):
+        sampled = [n for n, t in self.times.items() if len(t) >= self.samples]
+        self.best = min(sampled, key=self._get_time_per_transfer)
+        if self.best == self.nbatch and self.nbatch*2 <= self.max_batch:
+            self.nbatch *= 2
+        else:
+            self.nbatch = self.best
+            self.tuning = False
+            logging.info("%s: reading %s transfers at a time", self.key,
+                         self.nbatch)
+
+    def _get_time_per_transfer(self, nbatch):
+        return float(np.median(self.times[nbatch]))
+
+    def __read_batch(self, count, nTrans):
+        pDict = self.pDict
+        counts = list(range(count, min(count + self.nbatch, nTrans)))
+        dims = []
+        for i in pDict['nIn']:
+            sls = [pDict['in_sl']['transfer'][i][c] for c in counts]
+            n, dim = _get_merge_dim(sls)
+            counts = counts[:n]
+            dims.append(dim)
+        if len(counts) == 1:
+            return {count: self.transport._transfer_all_data(count)}
+
+        batch = {c: [] for c in counts}
+        for i, dim in zip(pDict['nIn'], dims):
+            sls = [pDict['in_sl']['transfer'][i][c] for c in counts]
+            first, last = sls[0][dim], sls[-1][dim]
+            merged = list(sls[0])
+            merged[dim] = slice(first.start, last.stop, first.step)
+            data = pDict['in_data'][i]._get_transport_data().\
+                _get_padded_data(tuple(merged))
+            # padded transfers overlap, and plugins may modify their input
+            overlap = any(b[dim].start < a[dim].stop
+                          for a, b in zip(sls[:-1], sls[1:]))
+            for c, sl in zip(counts, sls):
+                index = [slice(None)]*data.ndim
+                index[dim] = slice(sl[dim].start - first.start,
+                                   sl[dim].stop - first.start)
+                sub = data[tuple(index)]
+                batch[c].append(np.array(sub) if overlap else sub)
+        return batch
+
+    def record(self, comm):
+        """ Record the chosen number of transfers per read, and the measured
+        throughput, in the output NeXus file.  This is collective over the
+        communicator. """
+        exp = self.transport.exp
+        mft = self.pDict['in_data'][0]._get_plugin_data().meta_data.get(
+            'max_frames_transfer')
+        rate = mft / self._get_time_per_transfer(self.best) \
+            if self.times.get(self.best) else None
+        results = [r for r in comm.allgather((self.best, rate))
+                   if r[1] is not None]
+        if not results or exp.meta_data.get('process') != \
+                len(exp.meta_data.get('processes')) - 1:
+            return
+
+        nbatch = int(np.median([r[0] for r in results]))
+        filename = exp.meta_data.get('nxs_filename')
+        with h5py.File(filename, 'a') as nxs_file:
+            group = nxs_file['entry'].require_group('transfer_tuning')
+            group.attrs[NX_CLASS] = 'NXcollection'
+            if self.key in group:
+                del group[self.key]
+            entry = group.require_group(self.key)
+            entry.attrs[NX_CLASS] = 'NXcollection'
+            entry.attrs['transfers_per_read'] = nbatch
+            entry.attrs['max_frames_transfer'] = mft
+            entry.attrs['frames_per_read'] = mft*nbatch
+            entry.attrs['frames_per_second'] = sum(r[1] for r in results)
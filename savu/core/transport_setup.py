@@ -38,7 +38,11 @@ class MPI_setup(object):
         """
         processes = options["process_names"].split(',')
 
-        if len(processes) == 1:
+        if options.get("batch_scan"):
+            # a later scan of a batch run, with the processes, and logging,
+            # set up by the first
+            self.__move_log_files(options)
+        elif len(processes) == 1:
             options["mpi"] = False
             options["process"] = 0
             options["processes"] = processes
@@ -151,6 +155,22 @@ class MPI_setup(object):
                             " port %i", options['syslog_server'],
                             options['syslog_port'])
 
+    def __move_log_files(self, options):
+        """ Continue the log files in the run_log directory of the current
+        scan of a batch run. """
+        logger = logging.getLogger()
+        log_dir = self.__get_log_directory(options)
+        for handler in list(logger.handlers):
+            if not isinstance(handler, logging.FileHandler):
+                continue
+            fname = os.path.basename(handler.baseFilename)
+            new = logging.FileHandler(os.path.join(log_dir, fname), mode='w')
+            new.setFormatter(handler.formatter)
+            new.setLevel(handler.level)
+            logger.removeHandler(handler)
+            handler.close()
+            logger.addHandler(new)
+
     def __get_log_directory(self, options):
         """Create run_log directory to hold log files
 
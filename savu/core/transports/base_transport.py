@@ -32,6 +32,18 @@ import numpy as np
 
 import savu.core.utils as cu
 import savu.plugins.utils as pu
+from savu.core.buffer_pool import get_buffer_pool
+from savu.core.metadata_writer import MetadataWriter
+from savu.core.local_workers import LocalWorkers, get_n_workers
+from savu.core.io_helpers import PLAN, DATA, RESULT
+from savu.core.frame_scheduler import FrameScheduler
+from savu.core.transfer_pipeline import TransferPipeline
+from savu.core.transfer_tuner import TransferTuner, is_transfer_tuning
+from savu.core.collective_writer import CollectiveWriter, is_collective_writes
+from savu.core.pattern_transpose import PatternTranspose, \
+    is_pattern_transpose, is_transpose_required
+from savu.data.chunking import is_chunk_aligned
+from savu.data.chunk_store import ChunkStore
 from savu.data.data_structures.data_types.base_type import BaseType
 from savu.core.iterate_plugin_group_utils import \
     check_if_end_plugin_in_iterate_group
@@ -48,6 +60,12 @@ class BaseTransport(object):
     def __init__(self):
         self.pDict = None
         self.no_processing = False
+        self._pipeline = None
+        self._transposes = {}
+        self._writer = None
+        self._workers = None
+        self.pool = get_buffer_pool()
+        self.metadata_writer = MetadataWriter()
 
     def _transport_initialise(self, options):
         """
@@ -109,6 +127,8 @@ class BaseTransport(object):
             pDict['nTrans'] = 1
         pDict['squeeze'] = self._set_functions(pDict['in_data'], 'squeeze')
         pDict['expand'] = self._set_functions(pDict['out_data'], 'expand')
+        pDict['sweep'] = plugin._get_sweep_offsets() if \
+            hasattr(plugin, '_get_sweep_offsets') else None
 
         frames = [f for f in pDict['in_sl']['frames']]
         self._set_global_frame_index(plugin, frames, pDict['nProc'])
@@ -122,17 +142,81 @@ class BaseTransport(object):
         logging.info("transport_process initialise")
         pDict, result, nTrans = self._initialise(plugin)
         logging.info("transport_process get_checkpoint_params")
-        cp, sProc, sTrans = self.__get_checkpoint_params(plugin)
-
+        cp, sProc, sTrans = self.__get_checkpoint_params(plugin, pDict)
+        channel = getattr(plugin, '_io_channel', None)
+        # a plugin on a concurrent branch shares no collective I/O with the
+        # processes of other branches
+        branch = getattr(plugin, '_branch_comm', None) is not None
+        if channel or branch:
+            # the input is read from, and the output written to, file (by the
+            # I/O helper, if any)
+            transposed, self._transposes = [], {}
+        else:
+            transposed = self.__transpose_input_data(pDict)
+            self.__keep_output_data(plugin, pDict)
+
+        counts = self.__get_remaining_transfers(cp, pDict, sTrans, nTrans)
+        skipped = not isinstance(counts, range)
+        if not channel and not branch:
+            self.__set_collective_writer(plugin, pDict, counts)
+        scheduler = None
+        if self.exp.meta_data.get_dictionary().get('dynamic_frames', False):
+            # transfers are claimed on demand, so a process can only resume
+            # from the start of the plugin (a warning is given when the
+            # plugin list starts, see Hdf5Transport)
+            cp, sProc = None, 0
+            scheduler = FrameScheduler(plugin.get_communicator(), nTrans)
+            counts = self.__claimed_transfers(plugin, scheduler)
+
+        tuner = None
+        # merged reads assume consecutive transfers
+        if is_transfer_tuning(self.exp) and not skipped and not channel and \
+                not branch and 'transfer' in list(pDict['in_sl'].keys()):
+            transfer_bytes, max_bytes = self.__get_transfer_bytes(['in_data'])
+            tuner = TransferTuner(self, plugin, int(max_bytes//transfer_bytes)
+                                  if max_bytes else 1)
+
+        # workers are forked before any transfer threads are started
+        self._workers = self.__get_local_workers(plugin, pDict)
+        depth = self._get_pipeline_depth(nTrans - sTrans)
+        if channel:
+            kill = self.__served_transport_process(
+                plugin, pDict, result, nTrans, cp, sProc, counts, channel)
+        elif depth:
+            kill = self.__pipelined_transport_process(
+                plugin, pDict, result, nTrans, cp, sProc, counts, depth)
+        else:
+            kill = self.__transport_process_loop(
+                plugin, pDict, result, nTrans, cp, sProc, counts, tuner)
+        if self._workers:
+            self._workers.close()
+            self._workers = None
+        self.__finish_collective_writes()
+        self.__release_buffers(plugin.name)
+
+        self.__restore_input_data(transposed)
+        if scheduler:
+            scheduler.close()
+        if tuner:
+            tuner.record(plugin.get_communicator())
+        if kill:
+            return 1
+        cu.user_message("%s - 100%% complete" % (plugin.name))
+
+    def __transport_process_loop(self, plugin, pDict, result, nTrans, cp,
+                                 sProc, counts, tuner=None):
+        """ Transfer, process and return the data for each transfer index in
+        counts.  Returns True if a kill signal was received. """
         prange = list(range(sProc, pDict['nProc']))
         kill = False
-        for count in range(sTrans, nTrans):
+        for count in counts:
             end = True if count == nTrans-1 else False
             self._log_completion_status(count, nTrans, plugin.name)
 
             # get the transfer data
             logging.info("Transferring the data")
-            transfer_data = self._transfer_all_data(count)
+            transfer_data = tuner.get(count, nTrans) if tuner else \
+                self._transfer_all_data(count)
 
             if count == nTrans-1 and plugin.fixed_length == False:
                 shape = [data.shape for data in transfer_data]
@@ -140,17 +224,383 @@ class BaseTransport(object):
 
             # loop over the process data
             logging.info("process frames loop")
-            result, kill = self._process_loop(
+            with self.pool.transfer(count):
+                result, kill = self._process_loop(
                     plugin, prange, transfer_data, count, pDict, result, cp)
 
             logging.info("Returning the data")
             self._return_all_data(count, result, end)
 
             if kill:
+                return True
+        return False
+
+    def __pipelined_transport_process(self, plugin, pDict, result, nTrans,
+                                      cp, sProc, counts, depth):
+        """ As __transport_process_loop, but the next transfer chunks are
+        read, and the previous results written, while the current chunk is
+        processed.
+        """
+        logging.info("transport_process pipeline depth %s", depth)
+        results = [result] + [self._allocate_result(pDict)
+                              for _ in range(depth)]
+        prange = list(range(sProc, pDict['nProc']))
+        kill = False
+        self._pipeline = TransferPipeline(self, depth)
+        try:
+            self._pipeline.start(counts)
+            for n, (count, transfer_data) in enumerate(self._pipeline):
+                end = True if count == nTrans-1 else False
+                self._log_completion_status(count, nTrans, plugin.name)
+
+                if end and plugin.fixed_length == False:
+                    shape = [data.shape for data in transfer_data]
+                    prange = self.remove_extra_slices(prange, shape)
+
+                logging.info("process frames loop")
+                result = results[n % len(results)]
+                with self.pool.transfer(count):
+                    result, kill = self._process_loop(
+                        plugin, prange, transfer_data, count, pDict, result,
+                        cp)
+
+                logging.info("Returning the data")
+                self._pipeline.put(count, result, end)
+
+                if kill:
+                    return True
+        finally:
+            self._pipeline.close()
+            self._pipeline = None
+        return False
+
+    def __served_transport_process(self, plugin, pDict, result, nTrans, cp,
+                                   sProc, counts, channel):
+        """ As __transport_process_loop, but each transfer is read, and its
+        results written, by the I/O helper at the other end of the channel
+        (see _transport_serve_io), so this process only computes.  The helper
+        is told the next transfer with the results of each transfer, so it
+        reads one transfer ahead.  Transfers are only marked complete, for
+        checkpointing, once the helper has written them. """
+        counts = iter(counts)
+        ahead = [c for c in (next(counts, None), next(counts, None))
+                 if c is not None]
+        channel.send(PLAN, {'process': self.exp.meta_data.get('process'),
+                            'counts': ahead})
+        prange = list(range(sProc, pDict['nProc']))
+        kill = False
+        # transfers are only received into reused arrays with direct_io
+        pool = self.pool if self.exp.meta_data.get('system_params').get(
+            'direct_io', False) else None
+        while True:
+            header, transfer_data = channel.recv(DATA, pool)
+            for count in header['written']:
+                self.__set_transfer_complete(count, pDict)
+            if header.get('final'):
+                return kill
+            count = header['count']
+            self._log_completion_status(count, nTrans, plugin.name)
+
+            if count == nTrans-1 and plugin.fixed_length == False:
+                shape = [data.shape for data in transfer_data]
+                prange = self.remove_extra_slices(prange, shape)
+
+            logging.info("process frames loop")
+            with self.pool.transfer(count):
+                result, kill = self._process_loop(
+                    plugin, prange, transfer_data, count, pDict, result, cp)
+
+            logging.info("Returning the data to the I/O helper")
+            following = None if kill else next(counts, None)
+            channel.send(RESULT, {'count': count, 'next': following,
+                                  'last': kill}, result)
+            self.pool.release(count)
+
+    def _transport_serve_io(self, plugin, channel):
+        """ Serve the I/O of the process at the other end of the channel,
+        which is running the plugin (see get_io_channel): read each of its
+        transfers one ahead of it and write its results, overlapping both
+        with its processing.
+
+        :param plugin plugin: The current plugin instance.
+        :param IoChannel channel: The channel to the process.
+        """
+        plan, _ = channel.recv(PLAN)
+        # the slice lists of the process being served
+        process = self.exp.meta_data.get('process')
+        self.exp.meta_data.set('process', plan['process'])
+        try:
+            self.process_setup(plugin)
+        finally:
+            self.exp.meta_data.set('process', process)
+        pDict, nTrans = self.pDict, self.pDict['nTrans']
+        self.__set_buffers(pDict)
+        self._transposes = {}
+        # completed frames are recorded by the process being served
+        self.exp.checkpoint._set_frame_data(None)
+
+        queue = list(plan['counts'])
+        transfer_data = self._transfer_all_data(queue[0]) if queue else None
+        pending, written = None, []
+        while queue:
+            count = queue.pop(0)
+            channel.send(DATA, {'count': count, 'written': written},
+                         transfer_data)
+            written = []
+            if pending:
+                self._return_all_data(pending[0], pending[1],
+                                      pending[0] == nTrans-1)
+                written.append(pending[0])
+            transfer_data = self._transfer_all_data(queue[0]) if queue \
+                else None
+            header, result = channel.recv(RESULT, self.pool)
+            pending = (count, result)
+            if header['last']:
+                break
+            if header['next'] is not None:
+                queue.append(header['next'])
+        if pending:
+            self._return_all_data(pending[0], pending[1],
+                                  pending[0] == nTrans-1)
+            written.append(pending[0])
+        channel.send(DATA, {'written': written, 'final': True})
+        self.__release_buffers(plugin.name)
+
+    def _transport_fused_process(self, plugins):
+        """ Organise required data and execute the main processing of a group
+        of plugins.  Each process slice is passed through every plugin in
+        memory, so only the input to the first plugin is read from file and
+        only the output of the last plugin is written.
+
+        :param list(plugin) plugins: The plugin instances in processing order.
+        :returns: 1 if a kill signal was received
+        """
+        pDicts = []
+        for plugin in plugins:
+            self.process_setup(plugin)
+            pDicts.append(self.pDict)
+        head, tail = pDicts[0], pDicts[-1]
+        self.__set_buffers(head)
+        result = self._allocate_result(tail)
+        nTrans = head['nTrans']
+        self.no_processing = True if not nTrans else False
+        cp, sProc, sTrans = self.__get_checkpoint_params(plugins[0], tail)
+        transposed = self.__transpose_input_data(head)
+        self.__keep_output_data(plugins[-1], tail)
+        name = ' + '.join([plugin.name for plugin in plugins])
+        counts = self.__get_remaining_transfers(cp, tail, sTrans, nTrans)
+        self.__set_collective_writer(plugins[-1], tail, len(counts))
+
+        prange = list(range(sProc, head['nProc']))
+        for count in counts:
+            end = True if count == nTrans-1 else False
+            self._log_completion_status(count, nTrans, name)
+            transfer_data = self._transfer_all_data(count, pDict=head)
+            with self.pool.transfer(count):
+                kill = self.__fused_process_loop(
+                    plugins, pDicts, prange, transfer_data, count, result, cp)
+            if kill:
+                self.__finish_collective_writes()
+                self.__release_buffers(name)
                 return 1
+            self._return_all_data(count, result, end, pDict=tail)
+        self.__finish_collective_writes()
+        self.__release_buffers(name)
+
+        self.__restore_input_data(transposed)
+        cu.user_message("%s - 100%% complete" % name)
+
+    def __fused_process_loop(self, plugins, pDicts, prange, transfer_data,
+                             count, result, cp):
+        """ Pass each process slice of a transfer through every plugin in a
+        fused group.  Returns True if a kill signal was received. """
+        head, tail = pDicts[0], pDicts[-1]
+        for i in prange:
+            if cp and cp.is_time_to_checkpoint(self, count, i):
+                return True
+            res = self._get_input_data(
+                plugins[0], transfer_data, i, count, pDict=head)
+            for n, plugin in enumerate(plugins):
+                if n:
+                    res = self._get_chained_input_data(
+                        plugin, res, i, count, pDicts[n])
+                res = self._get_output_data(
+                    plugin.plugin_process_frames(res), i, pDict=pDicts[n])
+                if res is None:
+                    break
+
+            for j in tail['nOut']:
+                if res is not None:
+                    result[j][tail['out_sl']['process'][i][j]] = res[j]
+                else:
+                    result[j] = None
+        return False
 
-        if not kill:
-            cu.user_message("%s - 100%% complete" % (plugin.name))
+    def __claimed_transfers(self, plugin, scheduler):
+        """ Yield transfer indices as they are claimed from the scheduler,
+        extending the plugin global frame index in the same order. """
+        nProc = self.pDict['nProc']
+        nframes = plugin.get_plugin_in_datasets()[0].get_total_frames()
+        frames = []
+        for count in scheduler:
+            frames += list(range(count*nProc, (count+1)*nProc))
+            plugin.set_global_frame_index(
+                np.minimum(np.array(frames), nframes - 1))
+            yield count
+
+    def __transpose_input_data(self, pDict):
+        """ Replace input datasets written by the previous plugin in another
+        pattern with their redistributed, in memory, equivalent.
+
+        :returns: The datasets and their original backing file datasets.
+        :rtype: list(tuple(Data, h5py.Dataset))
+        """
+        previous, self._transposes = self._transposes, {}
+        if 'transfer' not in list(pDict['in_sl'].keys()):
+            return []
+        nPlugin = self.exp.meta_data.get('nPlugin')
+        transposed = []
+        for i, data in enumerate(pDict['in_data']):
+            transpose = previous.get(data.get_name())
+            if not transpose or transpose.nPlugin != nPlugin - 1 or \
+                    not isinstance(data.data, h5py.Dataset):
+                continue
+            local = transpose.redistribute(
+                data.data, pDict['in_sl']['transfer'][i])
+            if local is not None:
+                transposed.append((data, data.data))
+                data.data = local
+        return transposed
+
+    def __keep_output_data(self, plugin, pDict):
+        """ Keep the blocks of output datasets that the next plugin reads in
+        a different pattern, so they can be redistributed in memory. """
+        if not is_pattern_transpose(self.exp) or \
+                'transfer' not in list(pDict['out_sl'].keys()):
+            return
+        comm = plugin.get_communicator()
+        for data in pDict['out_data']:
+            if is_transpose_required(self.exp, data, comm):
+                self._transposes[data.get_name()] = \
+                    PatternTranspose(self.exp, data, comm)
+
+    def __restore_input_data(self, transposed):
+        for data, dataset in transposed:
+            data.data = dataset
+
+    def __set_collective_writer(self, plugin, pDict, counts):
+        """ Write the output datasets collectively, if requested and they are
+        all backing file datasets.  This is collective over the plugin
+        communicator.
+
+        :param list(int) counts: The transfers to be processed, which are
+            known up front whenever collective writes are used.
+        """
+        self._writer = None
+        if not is_collective_writes(self.exp) or \
+                'transfer' not in list(pDict['out_sl'].keys()):
+            return
+        datasets = [d.data for d in pDict['out_data']]
+        if all(isinstance(d, h5py.Dataset) for d in datasets):
+            nWrites = len(counts)*self.__get_n_instances(pDict)
+            self._writer = CollectiveWriter(
+                plugin.get_communicator(), datasets, nWrites)
+
+    def __set_buffers(self, pDict):
+        """ Start counting the buffer pool use of a plugin, and read the
+        transfers into arrays from the pool if the 'direct_io' system
+        parameter is set.  These arrays are reused by later transfers, so
+        it is off by default. """
+        params = self.exp.meta_data.get('system_params')
+        self.pool.max_bytes = params.get('buffer_pool_mb', 2048)*1e6
+        self.pool.reset_counters()
+        for data in pDict['in_data']:
+            data._get_transport_data()._set_direct_io(
+                params.get('direct_io', False))
+
+    def __release_buffers(self, name):
+        """ Return all arrays held by the plugin to the buffer pool. """
+        self.pool.release_all()
+        logging.info("%s: %.1f MB allocated and %.1f MB reused from the "
+                     "buffer pool", name, self.pool.allocated/1e6,
+                     self.pool.reused/1e6)
+
+    def __write_data(self, dataset, slice_list, result):
+        """ Write a transfer of results straight from the result buffer if it
+        fills whole chunks and needs no conversion, without the copy h5py
+        makes of non-contiguous arrays. """
+        if isinstance(dataset, h5py.Dataset) and \
+                isinstance(result, np.ndarray) and \
+                result.flags.c_contiguous and result.dtype == dataset.dtype \
+                and is_chunk_aligned(dataset, slice_list) and \
+                self.exp.meta_data.get('system_params').get('direct_io', False):
+            shape = [len(range(*sl.indices(n)))
+                     for sl, n in zip(slice_list, dataset.shape)]
+            if result.size == np.prod(shape):
+                dataset.write_direct(result, dest_sel=tuple(slice_list))
+                return
+        dataset[slice_list] = result
+
+    def __finish_collective_writes(self):
+        if self._writer:
+            self._writer.finish()
+            self._writer = None
+
+    def _get_pipeline_depth(self, nTrans):
+        """ The number of transfer chunks to read ahead of, and write behind,
+        the current chunk.  This is the 'transfer_pipeline_depth' system
+        parameter, reduced so that the extra buffers fit inside the
+        'max_bytes' data transfer setting.  Alongside the current chunk, the
+        pipeline holds depth + 1 chunks being read and depth - 1 results
+        waiting to be written.
+
+        :param int nTrans: The number of transfers still to process.
+        """
+        depth = self.exp.meta_data.get('system_params').get(
+            'transfer_pipeline_depth', 0)
+        # collective writes must be made from the main thread, in step
+        if not depth or nTrans < 2 or self._writer or \
+                'transfer' not in list(self.pDict['out_sl'].keys()):
+            return 0
+
+        _, max_bytes = self.__get_transfer_bytes(['in_data', 'out_data'])
+        in_bytes, _ = self.__get_transfer_bytes(['in_data'])
+        out_bytes, _ = self.__get_transfer_bytes(['out_data'])
+        # (depth + 2)*in_bytes + depth*out_bytes <= max_bytes
+        allowed = int((max_bytes - 2*in_bytes) // (in_bytes + out_bytes)) \
+            if max_bytes else depth
+        if allowed < depth:
+            logging.warning("Reducing the transfer pipeline depth from %s to "
+                            "%s to remain within max_bytes.", depth,
+                            max(allowed, 0))
+        return max(min(depth, allowed, nTrans - 1), 0)
+
+    def __get_transfer_bytes(self, keys):
+        """ The bytes in a single transfer of the current plugin datasets, and
+        the smallest 'max_bytes' data transfer setting of these datasets.
+
+        :param list(str) keys: The pDict dataset lists to include.
+        """
+        transfer_bytes = 0
+        max_bytes = None
+        for key in keys:
+            # result buffers hold a block for each parameter sweep instance
+            n = self.__get_n_instances(self.pDict) if key == 'out_data' else 1
+            for data in self.pDict[key]:
+                pData = data._get_plugin_data()
+                transfer_bytes += n*np.prod(pData.get_shape_transfer()) * \
+                    np.dtype(np.float32).itemsize
+                b_per_p = pData.meta_data.get('bytes_per_process')
+                nbytes = data._get_transport_data()._get_max_bytes(b_per_p)
+                max_bytes = nbytes if max_bytes is None else \
+                    min(max_bytes, nbytes)
+        return transfer_bytes, max_bytes
+
+    def _wait_for_pending_writes(self):
+        """ Block until all results queued for writing have reached the
+        backing files. """
+        if self._pipeline:
+            self._pipeline.wait_for_writes()
 
     def remove_extra_slices(self, prange, transfer_shape):
         # loop over datasets:
@@ -184,12 +634,21 @@ class BaseTransport(object):
         self.pDict[key]['process'][idx][-1] = sl        
 
     def _process_loop(self, plugin, prange, tdata, count, pDict, result, cp):
+        if self._workers:
+            return self.__local_process_loop(
+                plugin, prange, tdata, count, pDict, result, cp)
+        if getattr(plugin, '_frame_threads', None) and not pDict.get('sweep'):
+            return self.__threaded_process_loop(
+                plugin, prange, tdata, count, pDict, result, cp)
         kill_signal = False
         for i in prange:
             if cp and cp.is_time_to_checkpoint(self, count, i):
                 # kill signal sent so stop the processing
                 return result, True
             data = self._get_input_data(plugin, tdata, i, count)
+            if pDict.get('sweep'):
+                self.__sweep_process_frames(plugin, data, i, pDict, result)
+                continue
             res = self._get_output_data(
                     plugin.plugin_process_frames(data), i)
 
@@ -206,23 +665,165 @@ class BaseTransport(object):
                     result[j] = None
         return result, kill_signal
 
-    def __get_checkpoint_params(self, plugin):
+    def __threaded_process_loop(self, plugin, prange, tdata, count, pDict,
+                                result, cp):
+        """ As _process_loop, with the process frames of the transfer shared
+        between the threads of the plugin (see ThreadedCpuPlugin). """
+        if cp and prange and cp.is_time_to_checkpoint(self, count, prange[0]):
+            return result, True
+
+        def process(i):
+            # arrays drawn from the buffer pool are held for the transfer
+            with self.pool.transfer(count):
+                data = self._get_input_data(plugin, tdata, i, count)
+                res = self._get_output_data(
+                    plugin.plugin_process_frames(data), i)
+            if res is None:
+                return False
+            for j in pDict['nOut']:
+                result[j][pDict['out_sl']['process'][i][j]] = res[j]
+            return True
+
+        if not all(plugin._map_frames(process, prange)):
+            for j in pDict['nOut']:
+                result[j] = None
+        return result, False
+
+    def __get_local_workers(self, plugin, pDict):
+        """ A pool of local worker processes to share the process frames of
+        each transfer, in local mode, if the plugin supports it. """
+        nWorkers = get_n_workers(self.exp)
+        if nWorkers < 2 or not pDict['nTrans']:
+            return None
+        if pDict.get('sweep') or \
+                not plugin.get_plugin_tools().is_process_safe():
+            logging.warning("%s: processing frames serially, as the plugin "
+                            "%s", plugin.name, "has a parameter sweep" if
+                            pDict.get('sweep') else
+                            "is not marked process_safe")
+            return None
+        return LocalWorkers(self, plugin, pDict, nWorkers)
+
+    def __local_process_loop(self, plugin, prange, tdata, count, pDict,
+                             result, cp):
+        """ As _process_loop, with the process frames of the transfer shared
+        between the local worker processes (see LocalWorkers). """
+        if cp and prange and cp.is_time_to_checkpoint(self, count, prange[0]):
+            return result, True
+        if not self._workers.process(count, prange, tdata, result):
+            for j in pDict['nOut']:
+                result[j] = None
+        return result, False
+
+    def __sweep_process_frames(self, plugin, data, i, pDict, result):
+        """ Process the frames with each instance of a parameter sweep, into
+        its own block of the result buffers. """
+        last = len(pDict['sweep']) - 1
+        for n in range(last + 1):
+            plugin._set_sweep_instance(n)
+            # an instance may change its input in place
+            frames = data if n == last else [d.copy() for d in data]
+            res = self._get_output_data(
+                plugin.plugin_process_frames(frames), i)
+            for j in pDict['nOut']:
+                if res is None:
+                    result[j] = None
+                elif result[j] is not None:
+                    result[j][n][pDict['out_sl']['process'][i][j]] = res[j]
+
+    def __get_n_instances(self, pDict):
+        """ The number of sweep instances sharing each transfer. """
+        return len(pDict['sweep']) if pDict.get('sweep') else 1
+
+    def __get_sweep_blocks(self, pDict, j, slice_list, result):
+        """ The slice list and results of each sweep instance for output
+        dataset j, with the slice list moved to the parameter indices of the
+        instance. """
+        if not pDict.get('sweep'):
+            return [(slice_list, result)]
+        blocks = []
+        for n, offsets in enumerate(pDict['sweep']):
+            sl = list(slice_list)
+            for dim, index in offsets[j]:
+                sl[dim] = slice(index, index + 1, 1)
+            blocks.append((type(slice_list)(sl) if isinstance(
+                slice_list, (tuple, list)) else tuple(sl), result[n]))
+        return blocks
+
+    def __get_checkpoint_params(self, plugin, pDict):
         cp = self.exp.checkpoint
+        if cp and getattr(plugin, '_branch_comm', None) is not None:
+            # plugins on concurrent branches are only checkpointed once all
+            # the branches are complete
+            cp._set_frame_data(None)
+            return None, 0, 0
         if cp:
             cp._initialise(plugin.get_communicator())
+            # frames are recorded against the first dataset written
+            cp._set_frame_data(pDict['out_data'][0] if
+                               self.__is_output_transferred(pDict) else None)
             return cp, cp.get_proc_idx(), cp.get_trans_idx()
         return None, 0, 0
 
+    def __is_output_transferred(self, pDict):
+        return len(pDict['nOut']) > 0 and \
+            'transfer' in list(pDict['out_sl'].keys())
+
+    def __get_written_slice_list(self, pDict, count):
+        """ The slice list of the first output dataset for a transfer, or
+        None if this process writes nothing to it. """
+        transfer = pDict['out_sl']['transfer'][0]
+        return transfer[count] if len(transfer) > count else None
+
+    def __get_remaining_transfers(self, cp, pDict, sTrans, nTrans):
+        """ The transfers to process, without those whose frames were all
+        completed before a restart (with any number of processes). """
+        counts = range(sTrans, nTrans)
+        if not cp or not cp.has_completed_frames():
+            return counts
+        remaining = []
+        for count in counts:
+            sl = self.__get_written_slice_list(pDict, count)
+            if sl is None or not cp.is_transfer_complete(sl):
+                remaining.append(count)
+        logging.info("Skipping %d transfers completed before the restart",
+                     len(counts) - len(remaining))
+        return remaining
+
+    def __set_transfer_complete(self, count, pDict):
+        """ Record the frames of a transfer as complete for checkpointing,
+        once its results have been written. """
+        cp = self.exp.checkpoint
+        if cp and self.__is_output_transferred(pDict):
+            sl = self.__get_written_slice_list(pDict, count)
+            if sl is not None:
+                cp.set_transfer_complete(sl)
+
     def _initialise(self, plugin):
         self.process_setup(plugin)
         pDict = self.pDict
-        result = [np.empty(d._get_plugin_data().get_shape_transfer(),
-                           dtype=np.float32) for d in pDict['out_data']]
+        self.__set_buffers(pDict)
+        result = self._allocate_result(pDict)
         # loop over the transfer data
         nTrans = pDict['nTrans']
         self.no_processing = True if not nTrans else False
         return pDict, result, nTrans
 
+    def _allocate_result(self, pDict):
+        """ Allocate a buffer for each output dataset to hold the results of
+        a single transfer.  Buffers that are written to file are drawn from
+        the buffer pool and held until the end of the plugin. """
+        if 'transfer' not in list(pDict['out_sl'].keys()):
+            # the buffer becomes the dataset
+            return [np.empty(d._get_plugin_data().get_shape_transfer(),
+                             dtype=np.float32) for d in pDict['out_data']]
+        # with a block for each instance of a parameter sweep
+        sweep = (self.__get_n_instances(pDict),) if pDict.get('sweep') else ()
+        return [self.pool.get(
+                    sweep + tuple(d._get_plugin_data().get_shape_transfer()),
+                    np.float32, tag='results')
+                for d in pDict['out_data']]
+
     def _log_completion_status(self, count, nTrans, name):
         percent_complete: float = count / (nTrans * 0.01)
         cu.user_message("%s - %3i%% complete" % (name, percent_complete))
@@ -263,15 +864,17 @@ class BaseTransport(object):
             sl_dict[key] = [[sl_dict[key][i][j] for i in nData if j < len(sl_dict[key][i])] for j in range(len(sl_dict[key][0]))]
         return sl_dict
 
-    def _transfer_all_data(self, count):
+    def _transfer_all_data(self, count, pDict=None):
         """ 
         Transfer data from file and pad if required.
 
         :param int count: The current frame index.
+        :keyword dict pDict: The process dictionary of the plugin (defaults \
+            to the current plugin).
         :returns: All data for this frame and associated padded slice lists
         :rtype: list(np.ndarray), list(tuple(slice))
         """
-        pDict = self.pDict
+        pDict = pDict if pDict else self.pDict
         data_list = pDict['in_data']
 
         if 'transfer' in list(pDict['in_sl'].keys()):
@@ -281,48 +884,64 @@ class BaseTransport(object):
             slice_list = [slice(None)]*len(pDict['nIn'])
 
         section = []
-        for i, item in enumerate(data_list):
-            section.append(data_list[i]._get_transport_data().
-                           _get_padded_data(slice_list[i]))
+        with self.pool.transfer(count):
+            for i, item in enumerate(data_list):
+                section.append(data_list[i]._get_transport_data().
+                               _get_padded_data(slice_list[i]))
         return section
 
-    def _get_input_data(self, plugin, trans_data, nproc, ntrans):
+    def _get_input_data(self, plugin, trans_data, nproc, ntrans, pDict=None):
+        pDict = pDict if pDict else self.pDict
         data = []
+        for d in pDict['nIn']:
+            in_sl = pDict['in_sl']['process'][nproc][d]
+            data.append(pDict['squeeze'][d](trans_data[d][in_sl]))
+        self.__set_current_slice_list(plugin, nproc, ntrans, pDict)
+        return data
+
+    def _get_chained_input_data(self, plugin, result, nproc, ntrans, pDict):
+        """ Use the (expanded) output of the previous plugin in a fused group
+        as the input to the next plugin. """
+        data = [pDict['squeeze'][d](result[d]) for d in pDict['nIn']]
+        self.__set_current_slice_list(plugin, nproc, ntrans, pDict)
+        return data
+
+    def __set_current_slice_list(self, plugin, nproc, ntrans, pDict):
         current_sl = []
-        for d in self.pDict['nIn']:
-            in_sl = self.pDict['in_sl']['process'][nproc][d]
-            data.append(self.pDict['squeeze'][d](trans_data[d][in_sl]))
-            entry = ntrans*self.pDict['nProc'] + nproc
-            if entry < len(self.pDict['in_sl']['current'][d]):
-                current_sl.append(self.pDict['in_sl']['current'][d][entry])
+        for d in pDict['nIn']:
+            entry = ntrans*pDict['nProc'] + nproc
+            if entry < len(pDict['in_sl']['current'][d]):
+                current_sl.append(pDict['in_sl']['current'][d][entry])
             else:
-                current_sl.append(self.pDict['in_sl']['current'][d][-1])
+                current_sl.append(pDict['in_sl']['current'][d][-1])
         plugin.set_current_slice_list(current_sl)
-        return data
 
-    def _get_output_data(self, result, count):
+    def _get_output_data(self, result, count, pDict=None):
         if result is None:
             return
-        unpad_sl = self.pDict['out_sl']['unpad'][count]
+        pDict = pDict if pDict else self.pDict
+        unpad_sl = pDict['out_sl']['unpad'][count]
         result = result if isinstance(result, list) else [result]
-        for j in self.pDict['nOut']:
+        for j in pDict['nOut']:
             if any("res_norm" in s for s in self.data_flow):
                 # an exception when the metadata is created automatically by a parameters in the plugin
                 # this is to fix CGLS_CUDA with a res_norm metadata
-                result[0][j, ] = self.pDict['expand'][j](result[0][j, ])[unpad_sl[j]]
+                result[0][j, ] = pDict['expand'][j](result[0][j, ])[unpad_sl[j]]
             else:
-                result[j] = self.pDict['expand'][j](result[j])[unpad_sl[j]]
+                result[j] = pDict['expand'][j](result[j])[unpad_sl[j]]
         return result
 
-    def _return_all_data(self, count, result, end):
+    def _return_all_data(self, count, result, end, pDict=None):
         """ 
         Transfer plugin results for current frame to backing files.
 
         :param int count: The current frame index.
         :param list(np.ndarray) result: plugin results
         :param bool end: True if this is the last entry in the slice list.
+        :keyword dict pDict: The process dictionary of the plugin (defaults \
+            to the current plugin).
         """
-        pDict = self.pDict
+        pDict = pDict if pDict else self.pDict
         data_list = pDict['out_data']
 
         slice_list = None
@@ -332,15 +951,53 @@ class BaseTransport(object):
                      if len(pDict['out_sl']['transfer'][i]) > count]
 
         result = [result] if type(result) is not list else result
+        if self._writer:
+            self.__return_all_data_collective(count, result, pDict)
+            self.__set_transfer_complete(count, pDict)
+            self.pool.release(count)
+            return
 
         for i, item in enumerate(data_list):
             if result[i] is not None:
                 if slice_list:
-                    temp = self._remove_excess_data(
-                            data_list[i], result[i], slice_list[i])
-                    data_list[i].data[slice_list[i]] = temp
+                    for sl, block in self.__get_sweep_blocks(
+                            pDict, i, slice_list[i], result[i]):
+                        temp = self._remove_excess_data(data_list[i], block, sl)
+                        self.__write_data(data_list[i].data, sl, temp)
+                        transpose = self._transposes.get(item.get_name())
+                        if transpose:
+                            transpose.keep(sl, temp)
                 else:
                     data_list[i].data = result[i]
+        self.__set_transfer_complete(count, pDict)
+        # the transfer data, and any arrays drawn while processing it
+        self.pool.release(count)
+
+    def __return_all_data_collective(self, count, result, pDict):
+        """ As _return_all_data, but every process writes to every dataset
+        collectively, with an empty write if it has no data. """
+        nInstances = self.__get_n_instances(pDict)
+        slice_lists = [[] for n in range(nInstances)]
+        blocks = [[] for n in range(nInstances)]
+        for i, data in enumerate(pDict['out_data']):
+            transfer = pDict['out_sl']['transfer'][i]
+            sl = transfer[count] if len(transfer) > count else None
+            if sl is None or result[i] is None:
+                for n in range(nInstances):
+                    slice_lists[n].append(sl)
+                    blocks[n].append(None)
+                continue
+            for n, (isl, block) in enumerate(
+                    self.__get_sweep_blocks(pDict, i, sl, result[i])):
+                block = self._remove_excess_data(data, block, isl)
+                transpose = self._transposes.get(data.get_name())
+                if transpose:
+                    transpose.keep(isl, block)
+                slice_lists[n].append(isl)
+                blocks[n].append(block)
+        # one write per sweep instance, as counted by the writer
+        for n in range(nInstances):
+            self._writer.write(slice_lists[n], blocks[n])
 
     def _set_global_frame_index(self, plugin, frame_list, nProc):
         """ Convert the transfer global frame index to a process global frame
@@ -455,7 +1112,8 @@ class BaseTransport(object):
         for key in out_data_dict.keys():
             out_data = out_data_dict[key]
             filename = self.exp.meta_data.get(["filename", key])
-            out_data.backing_file = self.hdf5._open_backing_h5(filename, 'a')
+            out_data.backing_file = self.hdf5._open_backing_h5(
+                filename, 'a', barrier=False)
             c_and_n = 0 if not current_and_next else current_and_next[key]
             out_data.group_name, out_data.group = self.hdf5._create_entries(
                 out_data, key, c_and_n)
@@ -484,6 +1142,9 @@ class BaseTransport(object):
                 out_path = self.exp.meta_data.get('out_path')
             else:
                 out_path = self.exp.meta_data.get('inter_path')
+            # final results are copied to out_path after the plugin completes
+            staging = self.exp.meta_data.get_dictionary().get('staging_folder')
+            out_path = staging if staging else out_path
 
             filename = os.path.join(out_path, name)
             group_name = "%i-%s-%s" % (count, plugin_dict['name'], key)
@@ -579,7 +1240,7 @@ class BaseTransport(object):
 
     def __output_data_type(self, entry, data, name):
         data = data.data if 'data' in list(data.__dict__.keys()) else data
-        if isinstance(data, h5py.Dataset):
+        if isinstance(data, (h5py.Dataset, ChunkStore)):
             return
 
         entry = entry.require_group('data_type')
@@ -618,31 +1279,7 @@ class BaseTransport(object):
             self.__output_data_type(gp, data.data, 'data')
 
     def __output_data(self, entry, data, name):
-        if isinstance(data, dict):
-            entry = entry.require_group(name)
-            entry.attrs[NX_CLASS] = 'NXcollection'
-            for key, value in data.items():
-                self.__output_data(entry, value, key)
-        else:
-            try:
-                self.__create_dataset(entry, name, data)
-            except Exception:
-                try:
-                    import json
-                    data = np.array([json.dumps(data).encode("ascii")])
-                    self.__create_dataset(entry, name, data)
-                except Exception:
-                    try:
-                        data = cu._savu_encoder(data)
-                        self.__create_dataset(entry, name, data)
-                    except:
-                        raise Exception('Unable to output %s to file.' % name)
-
-    def __create_dataset(self, entry, name, data):
-        if name not in list(entry.keys()):
-            entry.create_dataset(name, data=data)
-        else:
-            entry[name][...] = data
+        self.metadata_writer.write(entry, name, data)
 
     def __output_axis_labels(self, data, entry):
         axis_labels = data.data_info.get("axis_labels")
@@ -681,11 +1318,4 @@ class BaseTransport(object):
             self.__output_data(nx_data, values['slice_dims'], 'slice_dims')
 
     def _output_metadata_dict(self, entry, mData):
-        entry.attrs[NX_CLASS] = 'NXcollection'
-        for key, value in mData.items():
-            nx_data = entry.require_group(key)
-            if isinstance(value, dict):
-                self._output_metadata_dict(nx_data, value)
-            else:
-                nx_data.attrs[NX_CLASS] = 'NXdata'
-                self.__output_data(nx_data, value, key)
+        self.metadata_writer.write_dict(entry, mData)
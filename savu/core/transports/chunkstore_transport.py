@@ -0,0 +1,163 @@
+# Copyright 2015 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+.. module:: chunkstore_transport
+   :platform: Unix
+   :synopsis: Transports data through directory chunk stores, with one file \
+       per chunk, converting the final results to hdf5.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import h5py
+import shutil
+import logging
+import itertools
+
+from savu.data.chunking import Chunking
+from savu.data.chunk_planner import get_transfer_shape
+from savu.data.chunk_store import ChunkStore, align_chunks
+from savu.core.transports.hdf5_transport import Hdf5Transport
+
+
+class ChunkstoreTransport(Hdf5Transport):
+    """
+    Writes the output datasets of each plugin to chunk stores (see
+    ChunkStore) in place of hdf5 files, with chunks aligned to the transfers
+    of the writing plugin so that each chunk is written by a single process
+    and no file locking is needed.  Datasets read by later plugins are read
+    from the chunk stores, and final results are copied to hdf5 files, in
+    parallel, once their plugin has completed, and linked to the NeXus file
+    as usual.  Datasets created by loaders are read with the hdf5 transport.
+    """
+
+    def _transport_pre_plugin_list_run(self):
+        # loaders have completed, so any output datasets created by a plugin
+        # will use chunk stores
+        if self.exp.meta_data.get("pre_run") == True or \
+                self.exp.meta_data.plugin_list.iterate_plugin_groups:
+            raise Exception("The chunkstore transport does not support a "
+                            "pre-run or iterative plugins.")
+        self.exp.meta_data.set('transport', 'chunkstore')
+        super(ChunkstoreTransport, self)._transport_pre_plugin_list_run()
+
+    def _transport_pre_plugin(self):
+        # a plugin may create a dataset with another transport
+        self.exp.meta_data.set('transport', 'chunkstore')
+        super(ChunkstoreTransport, self)._transport_pre_plugin()
+
+    def _get_filenames(self, plugin_dict):
+        files = super(ChunkstoreTransport, self)._get_filenames(plugin_dict)
+        for key, filename in files['filename'].items():
+            files['filename'][key] = os.path.splitext(filename)[0] + '.zarr'
+        return files
+
+    def _setup_h5_files(self):
+        """ Create a chunk store, in place of a hdf5 file, for each output
+        dataset. """
+        current_and_next = \
+            self.exp.meta_data.get_dictionary().get('current_and_next')
+        last = self.exp.meta_data.get('process') == \
+            len(self.exp.meta_data.get('processes')) - 1
+        out_data_dict = self.exp.index["out_data"]
+        for key, out_data in out_data_dict.items():
+            group_name = self.exp.meta_data.get(["group_name", key])
+            out_data.data_info.set('group_name', group_name)
+            out_data.group_name = group_name
+            c_and_n = current_and_next[key] if current_and_next else 0
+            if last:
+                ChunkStore.create(self.exp.meta_data.get(["filename", key]),
+                                  out_data.get_shape(), out_data.dtype,
+                                  self.__get_chunks(out_data, c_and_n))
+        self.exp._barrier(msg=self.__class__.__name__ + '_setup_h5_files')
+        for key, out_data in out_data_dict.items():
+            path = self.exp.meta_data.get(["filename", key])
+            out_data.data = ChunkStore(path)
+            out_data.backing_file = out_data.data
+
+    def __get_chunks(self, data, current_and_next):
+        """ The chunks chosen by Chunking, reduced so that each transfer of
+        the writing plugin covers whole chunks. """
+        shape = data.get_shape()
+        if current_and_next == 0:
+            logging.warning("No patterns are set for %s, creating a chunk "
+                            "store with a chunk per index of the first "
+                            "dimension.", data.get_name())
+            return (1,) + tuple(shape[1:])
+        current = current_and_next['current']
+        current = current[list(current.keys())[0]]
+        chunk_max = \
+            self.exp.meta_data.get('system_params')['max_chunk_size']*1e6
+        chunks = Chunking(self.exp, current_and_next)._calculate_chunking(
+            shape, data.dtype, chunk_max=chunk_max)
+        if chunks is True:
+            chunks = get_transfer_shape(current, shape)
+        return align_chunks(chunks, shape, current)
+
+    def _transport_post_plugin(self):
+        last = self.exp.meta_data.get('process') == \
+            len(self.exp.meta_data.get('processes')) - 1
+        for data in list(self.exp.index['out_data'].values()):
+            if data.remove:
+                continue
+            msg = self.__class__.__name__ + "_transport_post_plugin."
+            final = self.exp.meta_data.get(
+                ['link_type', data.get_name()]) == 'final_result'
+            store = data.data
+            self.exp._barrier(msg=msg)
+            if final:
+                self.__convert(data)
+            if last:
+                self._populate_nexus_file(data)
+                if final:
+                    self.hdf5._link_datafile_to_nexus_file(data)
+                    shutil.rmtree(store.filename)
+                else:
+                    self.__link_chunk_store(data)
+            self.exp._barrier(msg=msg)
+
+    def __convert(self, data):
+        """ Copy a final result from its chunk store to a hdf5 file with the
+        same chunks, with the chunks shared between the processes, and read
+        it from there from now on. """
+        store = data.data
+        filename = os.path.splitext(store.filename)[0] + '.h5'
+        group_name = self.exp.meta_data.get(['group_name', data.get_name()])
+        logging.debug("Converting %s to %s", store.filename, filename)
+
+        backing_file = self.hdf5._open_backing_h5(filename, 'w')
+        group = backing_file.require_group(group_name)
+        dataset = self.hdf5.create_dataset_nofill(
+            group, 'data', store.shape, store.dtype, chunks=store.chunks)
+        process = self.exp.meta_data.get('process')
+        nProcesses = len(self.exp.meta_data.get('processes'))
+        for sl in itertools.islice(store.chunk_slices(), process, None,
+                                   nProcesses):
+            dataset[sl] = store[sl]
+        backing_file.close()
+
+        data.backing_file = self.hdf5._open_backing_h5(filename, 'r')
+        data.data = data.backing_file[group_name + '/data']
+
+    def __link_chunk_store(self, data):
+        """ Record the location of an intermediate chunk store in the NeXus
+        file, in place of a link. """
+        name = data.get_name()
+        group_name = self.exp.meta_data.get(['group_name', name])
+        link_type = self.exp.meta_data.get(['link_type', name])
+        with h5py.File(self.exp.meta_data.get('nxs_filename'), 'a') as f:
+            entry = f['entry'][link_type][group_name]
+            entry['data_store'] = os.path.abspath(data.data.filename)
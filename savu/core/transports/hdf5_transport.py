@@ -25,6 +25,10 @@ import os
 import logging
 
 from savu.core.transport_setup import MPI_setup
+from savu.core.staging import get_staging_folder, FileMigrator
+from savu.core.result_cache import copy_file
+from savu.core.frame_scheduler import is_dynamic_frame_distribution
+from savu.core.collective_writer import is_collective_writes
 from savu.plugins.savers.utils.hdf5_utils import Hdf5Utils
 from savu.core.transports.base_transport import BaseTransport
 from savu.core.iterate_plugin_group_utils import check_if_in_iterative_loop, \
@@ -42,7 +46,8 @@ class Hdf5Transport(BaseTransport):
         MPI_setup(options)
         self.exp_coll = None
         self.data_flow = []
-        self.files = []
+        self.files = {}
+        self.migrator = None
 
     def _transport_update_plugin_list(self):
         plugin_list = self.exp.meta_data.plugin_list
@@ -60,21 +65,62 @@ class Hdf5Transport(BaseTransport):
 
     def _transport_pre_plugin_list_run(self):
         # run through the experiment (no processing) and create output files
+        self.exp.meta_data.set(
+            'dynamic_frames', is_dynamic_frame_distribution(self.exp))
+        if self.exp.meta_data.get('dynamic_frames'):
+            logging.warning("Dynamic frame distribution: checkpoints are only "
+                            "taken between plugins, so a restart repeats the "
+                            "whole of the plugin that was running.")
+        self.exp.meta_data.set(
+            'collective_writes', is_collective_writes(self.exp))
         self.hdf5 = Hdf5Utils(self.exp)
+        self.hdf5._check_compression()
+        staging = get_staging_folder(self.exp)
+        self.exp.meta_data.set('staging_folder', staging)
+        if staging and self.exp.meta_data.get('process') == \
+                len(self.exp.meta_data.get('processes'))-1:
+            self.migrator = FileMigrator(
+                self.exp.meta_data.get('nxs_filename'),
+                self.exp.meta_data.get('out_path'))
         self.exp_coll = self.exp._get_collection()
         self.data_flow = self.exp.meta_data.plugin_list._get_dataset_flow()
-        n_plugins = list(range(len(self.exp_coll['datasets'])))
 
-        for i in n_plugins:
-            self.exp._set_experiment_for_current_plugin(i)
-            self.files.append(
-                self._get_filenames(self.exp_coll['plugin_dict'][i]))
-            self._set_file_details(self.files[i])
-            self._setup_h5_files()  # creates the hdf5 files
+        # the output files of each plugin are created just before it runs,
+        # unless restarting from a checkpoint (when the files of completed
+        # plugins are reopened) or iterating over plugins (when the files
+        # are swapped between iterations)
+        if self.exp.meta_data.get('checkpoint') or \
+                self.exp.meta_data.plugin_list.iterate_plugin_groups:
+            for i in range(len(self.exp_coll['datasets'])):
+                self.exp._set_experiment_for_current_plugin(i)
+                self.__create_files(i)
 
     def _transport_pre_plugin(self):
         count = self.exp.meta_data.get('nPlugin')
+        if count not in self.files:
+            self.__create_files(count)
+        self._set_file_details(self.files[count])
+
+    def __create_files(self, count):
+        """ Create the output files of the plugin at index count. """
+        self.files[count] = \
+            self._get_filenames(self.exp_coll['plugin_dict'][count])
         self._set_file_details(self.files[count])
+        cached = self.exp.meta_data.get_dictionary().get('cached_result')
+        if cached:
+            self.__copy_cached_files(*cached)
+        self._setup_h5_files()  # creates the hdf5 files
+        self.hdf5._save_chunk_plans()
+
+    def __copy_cached_files(self, cache, entry):
+        """ Copy the cached output files of the plugin in place of new files,
+        which are then opened with their data. """
+        if self.exp.meta_data.get('process') == \
+                len(self.exp.meta_data.get('processes'))-1:
+            for key in self.exp.index['out_data'].keys():
+                copy_file(cache.get_file(entry, key),
+                          self.exp.meta_data.get(['filename', key]))
+        self.exp._barrier(msg=self.__class__.__name__ + '_copy_cached_files')
 
     def _transport_post_plugin(self):
         iterate_group = check_if_in_iterative_loop(self.exp)
@@ -102,6 +148,35 @@ class Hdf5Transport(BaseTransport):
                 else:
                     # reopen file as read-only
                     self.hdf5._reopen_file(data, 'r')
+                    self.__migrate(data)
+        if self.migrator:
+            self.migrator.update_links()
+
+    def __migrate(self, data):
+        """ Copy a staged backing file to the output (or intermediate)
+        folder, now that it is complete.  Later plugins still read the staged
+        file, which is removed when the migration finishes. """
+        if not self.migrator:
+            return
+        name = data.get_name()
+        if self.exp.meta_data.get(['link_type', name]) == 'final_result':
+            self.migrator.add(data.backing_file.filename,
+                              '/entry/final_result_%s/data' % name)
+        else:
+            group_name = self.exp.meta_data.get(['group_name', name])
+            self.migrator.add(data.backing_file.filename,
+                              '/entry/intermediate/%s/data' % group_name,
+                              folder=self.exp.meta_data.get('inter_path'))
+
+    def __finish_migration(self):
+        """ Wait for the staged files to be copied and their links updated,
+        so none are left on node-local storage when the run ends. """
+        if self.migrator:
+            self.migrator.finish()
+            self.migrator = None
+
+    def _transport_post_plugin_list_run(self):
+        self.__finish_migration()
 
     def _transport_post_plugin_in_iterative_loop(self, data, iterate_group):
         """
@@ -159,8 +234,11 @@ class Hdf5Transport(BaseTransport):
             self._metadata_dump(f, 'out_data')
 
     def _metadata_dump(self, f, gname):
-        if gname in list(f.keys()):
-            del f[gname]
+        # the entries are kept between dumps, so only changes are written
+        group = f.require_group(gname)
+        for name in [n for n in group.keys()
+                     if n not in self.exp.index[gname]]:
+            del group[name]
 
         for data in list(self.exp.index[gname].values()):
             name = data.get_name()
@@ -187,4 +265,6 @@ class Hdf5Transport(BaseTransport):
             self.exp._set_experiment_for_current_plugin(i)
             for data in list(self.exp.index['out_data'].values()):
                 self.hdf5._close_file(data)
+        # the completed files are needed in the output folder for a restart
+        self.__finish_migration()
 
@@ -0,0 +1,142 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: chunk_planner
+   :platform: Unix
+   :synopsis: Chooses hdf5 chunk shapes by scoring candidates against the \
+   transfers of the writing and reading patterns.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import itertools
+import numpy as np
+
+
+def get_transfer_shape(pattern, shape):
+    """ The shape of a single transfer of the pattern: the full core
+    dimensions and max_frames_transfer frames in the first slice dimension.
+
+    :param dict pattern: A pattern dictionary with 'core_dims', 'slice_dims'
+        and 'max_frames_transfer' (and optionally 'transfer_shape').
+    :param tuple shape: The dataset shape.
+    """
+    if 'transfer_shape' in pattern:
+        return tuple(int(min(t, s)) for t, s in
+                     zip(pattern['transfer_shape'], shape))
+    transfer = [1]*len(shape)
+    for dim in pattern['core_dims']:
+        transfer[dim] = shape[dim]
+    sdir = pattern['slice_dims'][0]
+    transfer[sdir] = int(min(pattern['max_frames_transfer'], shape[sdir]))
+    return tuple(transfer)
+
+
+class ChunkPlanner(object):
+    """
+    Scores candidate chunk shapes by simulating the transfers of the current
+    (writing) and next (reading) patterns.  The cost of each transfer is the
+    number of bytes in the chunks it touches, plus a fixed cost for each
+    chunk touched, and transfers start at multiples of the transfer shape.
+
+    :param tuple shape: The dataset shape.
+    :param int itemsize: The bytes per element.
+    :param dict current: The pattern dictionary of the writing plugin.
+    :param dict nnext: The pattern dictionary of the reading plugin.
+    :param int chunk_max: The maximum bytes in a chunk.
+    :keyword float touch_bytes: The cost of touching a chunk, in bytes.
+    :keyword tuple max_chunks: The maximum chunk size in each dimension.
+    """
+
+    def __init__(self, shape, itemsize, current, nnext, chunk_max,
+                 touch_bytes=1e6, max_chunks=None):
+        self.shape = tuple(int(s) for s in shape)
+        self.itemsize = itemsize
+        self.chunk_max = chunk_max
+        self.touch_bytes = touch_bytes
+        self.max_chunks = tuple(int(m) for m in max_chunks) if max_chunks \
+            else self.shape
+        self.transfers = [get_transfer_shape(current, self.shape),
+                          get_transfer_shape(nnext, self.shape)]
+        self._dim_costs = {}
+
+    def _get_dim_cost(self, dim, transfer, chunk):
+        """ The mean number of chunks, and the mean length of those chunks,
+        touched by a transfer in one dimension. """
+        key = (dim, transfer, chunk)
+        if key not in self._dim_costs:
+            n = self.shape[dim]
+            starts = np.arange(0, n, transfer)
+            stops = np.minimum(starts + transfer, n)
+            first = starts // chunk
+            last = -(-stops // chunk)
+            touched = np.minimum(last*chunk, n) - first*chunk
+            self._dim_costs[key] = \
+                (float(np.mean(last - first)), float(np.mean(touched)))
+        return self._dim_costs[key]
+
+    def score(self, chunks):
+        """ The simulated cost, in bytes, of writing the dataset in the
+        current pattern and reading it in the next.
+
+        :param tuple chunks: The chunk shape.
+        :rtype: float
+        """
+        cost = 0.0
+        for transfer in self.transfers:
+            ntransfers = np.prod([-(-n // t) for n, t in
+                                  zip(self.shape, transfer)])
+            touches, length = 1.0, 1.0
+            for dim, (t, c) in enumerate(zip(transfer, chunks)):
+                dim_touches, dim_length = self._get_dim_cost(dim, t, c)
+                touches *= dim_touches
+                length *= dim_length
+            cost += ntransfers * (touches*self.touch_bytes +
+                                  length*self.itemsize)
+        return cost
+
+    def _get_candidates(self, dim):
+        """ Candidate chunk sizes in one dimension: powers of two, multiples
+        of the transfer sizes, and even divisions of the dimension. """
+        limit = self.max_chunks[dim]
+        if limit <= 1:
+            return [1]
+        n = self.shape[dim]
+        values = {1, limit}
+        values.update(2**j for j in range(int(np.log2(limit)) + 1))
+        for transfer in self.transfers:
+            t = transfer[dim]
+            values.update(t*2**j for j in range(int(np.log2(limit / t)) + 1))
+        values.update(-(-n // k) for k in range(1, 9))
+        return sorted(v for v in values if 1 <= v <= limit)
+
+    def plan(self, n_best=1):
+        """ Score all candidate chunk shapes that fit in chunk_max.
+
+        :keyword int n_best: The number of chunk shapes to return.
+        :returns: The chunk shapes with the lowest cost, best first.  Ties
+            are broken in favour of larger chunks.
+        :rtype: list(tuple)
+        """
+        candidates = [self._get_candidates(d) for d in range(len(self.shape))]
+        max_elements = max(self.chunk_max // self.itemsize, 1)
+        scored = []
+        for chunks in itertools.product(*candidates):
+            elements = np.prod(chunks)
+            if elements <= max_elements:
+                scored.append((self.score(chunks), -elements, chunks))
+        scored.sort()
+        return [tuple(int(c) for c in s[2]) for s in scored[:n_best]]
@@ -0,0 +1,207 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: chunk_store
+   :platform: Unix
+   :synopsis: A dataset stored as a directory with one file per chunk, in the \
+   Zarr (version 2) layout, that processes can write to without locking.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import json
+import threading
+import itertools
+import numpy as np
+
+from savu.data.chunk_planner import get_transfer_shape
+
+
+def align_chunks(chunks, shape, pattern):
+    """ Reduce the chunk shape so that each transfer of the (writing) pattern
+    covers whole chunks, so no chunk is written by more than one transfer.
+
+    :param tuple chunks: The chunk shape.
+    :param tuple shape: The dataset shape.
+    :param dict pattern: The pattern dictionary of the writing plugin.
+    :rtype: tuple
+    """
+    transfer = get_transfer_shape(pattern, shape)
+    aligned = []
+    for c, t, n in zip(chunks, transfer, shape):
+        c = max(min(int(c), int(n)), 1)
+        if t < n:
+            # the largest divisor of the transfer size that fits
+            c = min(c, t)
+            while t % c:
+                c -= 1
+        aligned.append(c)
+    return tuple(aligned)
+
+
+class ChunkStore(object):
+    """
+    A dataset held in a directory, with a .zarray metadata file and each
+    chunk in a separate uncompressed file named by its chunk indices, as in
+    the Zarr (version 2) format.  Chunks are replaced atomically, so writes
+    from different processes never conflict as long as no chunk is written
+    by more than one process (see align_chunks).  Chunks that have not been
+    written read as zero.
+
+    :param str path: The directory of the dataset.
+    """
+
+    def __init__(self, path):
+        self.filename = path
+        with open(os.path.join(path, '.zarray'), 'r') as f:
+            meta = json.load(f)
+        self.shape = tuple(meta['shape'])
+        self.chunks = tuple(meta['chunks'])
+        self.dtype = np.dtype(meta['dtype'])
+        self.fill_value = meta['fill_value']
+        self.ndim = len(self.shape)
+
+    @classmethod
+    def create(cls, path, shape, dtype, chunks):
+        """ Create the dataset, or open it if it already exists with the same
+        shape, dtype and chunks (when restarting from a checkpoint).
+
+        :rtype: ChunkStore
+        """
+        meta = {'zarr_format': 2, 'shape': [int(n) for n in shape],
+                'chunks': [int(c) for c in chunks],
+                'dtype': np.dtype(dtype).str, 'compressor': None,
+                'fill_value': 0, 'filters': None, 'order': 'C',
+                'dimension_separator': '.'}
+        zarray = os.path.join(path, '.zarray')
+        if os.path.exists(zarray):
+            with open(zarray, 'r') as f:
+                if json.load(f) == meta:
+                    return cls(path)
+        os.makedirs(path, exist_ok=True)
+        with open(zarray + '.tmp', 'w') as f:
+            json.dump(meta, f, indent=4, sort_keys=True)
+        os.replace(zarray + '.tmp', zarray)
+        return cls(path)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def close(self):
+        """ There is nothing held open. """
+
+    def chunk_slices(self):
+        """ The slice list of each chunk, clipped to the dataset shape. """
+        ranges = [range(0, n, c) for n, c in zip(self.shape, self.chunks)]
+        for start in itertools.product(*ranges):
+            yield tuple(slice(s, min(s + c, n)) for s, c, n in
+                        zip(start, self.chunks, self.shape))
+
+    def __chunk_path(self, idx):
+        return os.path.join(self.filename, '.'.join(str(i) for i in idx))
+
+    def __read_chunk(self, idx):
+        try:
+            return np.fromfile(self.__chunk_path(idx), dtype=self.dtype)\
+                .reshape(self.chunks)
+        except FileNotFoundError:
+            return np.full(self.chunks, self.fill_value, dtype=self.dtype)
+
+    def __write_chunk(self, idx, chunk):
+        path = self.__chunk_path(idx)
+        temp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        np.ascontiguousarray(chunk, dtype=self.dtype).tofile(temp)
+        os.replace(temp, path)
+
+    def __get_selection(self, key):
+        """ The (start, stop, step) selected in each dimension, and the
+        dimensions indexed by an integer. """
+        key = key if isinstance(key, tuple) else (key,)
+        if Ellipsis in key:
+            i = key.index(Ellipsis)
+            key = key[:i] + (slice(None),)*(self.ndim - len(key) + 1) + \
+                key[i+1:]
+        key = key + (slice(None),)*(self.ndim - len(key))
+        if len(key) != self.ndim:
+            raise IndexError("Too many indices for the chunk store %s"
+                             % self.filename)
+        sel, drop = [], []
+        for dim, (k, n) in enumerate(zip(key, self.shape)):
+            if isinstance(k, slice):
+                start, stop, step = k.indices(n)
+                if step < 1:
+                    raise ValueError("Negative steps are not supported")
+                count = len(range(start, stop, step))
+                stop = start + (count - 1)*step + 1 if count else start
+            else:
+                k = int(k)
+                start = k + n if k < 0 else k
+                if not 0 <= start < n:
+                    raise IndexError("Index %s is out of range" % k)
+                stop, step = start + 1, 1
+                drop.append(dim)
+            sel.append((start, stop, step))
+        return sel, drop
+
+    def __overlaps(self, box):
+        """ For each chunk overlapping the box, the chunk indices and the
+        region of the overlap in the chunk and in the box. """
+        ranges = [range(start // c, -(-stop // c)) if stop > start else []
+                  for (start, stop), c in zip(box, self.chunks)]
+        for idx in itertools.product(*ranges):
+            in_chunk, in_box = [], []
+            for i, (start, stop), c in zip(idx, box, self.chunks):
+                lo, hi = max(start, i*c), min(stop, (i + 1)*c)
+                in_chunk.append(slice(lo - i*c, hi - i*c))
+                in_box.append(slice(lo - start, hi - start))
+            yield idx, tuple(in_chunk), tuple(in_box)
+
+    def __getitem__(self, key):
+        sel, drop = self.__get_selection(key)
+        box = [(start, stop) for start, stop, _ in sel]
+        out = np.empty([stop - start for start, stop in box], self.dtype)
+        for idx, in_chunk, in_box in self.__overlaps(box):
+            out[in_box] = self.__read_chunk(idx)[in_chunk]
+        out = out[tuple(slice(None, None, step) for _, _, step in sel)]
+        return out[tuple(0 if d in drop else slice(None)
+                         for d in range(self.ndim))]
+
+    def __setitem__(self, key, value):
+        sel, drop = self.__get_selection(key)
+        if any(step != 1 for _, _, step in sel):
+            raise ValueError("Only unit steps can be written to a chunk store")
+        box = [(start, stop) for start, stop, _ in sel]
+        shape = [stop - start for start, stop in box]
+        value = np.broadcast_to(
+            np.asarray(value, dtype=self.dtype),
+            [n for d, n in enumerate(shape) if d not in drop]).reshape(shape)
+        for idx, in_chunk, in_box in self.__overlaps(box):
+            extent = [min(c, n - i*c) for i, c, n in
+                      zip(idx, self.chunks, self.shape)]
+            whole = all(s.start == 0 and s.stop == e
+                        for s, e in zip(in_chunk, extent))
+            if whole and extent == list(self.chunks):
+                chunk = value[in_box]
+            else:
+                chunk = self.__read_chunk(idx) if not whole else \
+                    np.full(self.chunks, self.fill_value, dtype=self.dtype)
+                chunk[in_chunk] = value[in_box]
+            self.__write_chunk(idx, chunk)
@@ -24,6 +24,27 @@ import logging
 from math import gcd
 import numpy as np
 
+from savu.data.chunk_planner import ChunkPlanner
+
+
+def is_chunk_aligned(dataset, slice_list):
+    """ True if a tuple of unit step slices selects whole chunks of a chunked
+    hdf5 dataset (or runs to the end of the dataset).
+
+    :param h5py.Dataset dataset: The dataset.
+    :param tuple(slice) slice_list: The selection.
+    """
+    chunks = getattr(dataset, 'chunks', None)
+    if not chunks or len(slice_list) != len(chunks):
+        return False
+    for sl, chunk, length in zip(slice_list, chunks, dataset.shape):
+        if not isinstance(sl, slice) or sl.step not in [None, 1]:
+            return False
+        start, stop, _ = sl.indices(length)
+        if stop <= start or start % chunk or (stop % chunk and stop != length):
+            return False
+    return True
+
 
 class Chunking(object):
     """
@@ -48,6 +69,7 @@ class Chunking(object):
         self.slice1 = None
         self.other = None
         self.default_chunk_max = 1000000
+        self.plan = None
 
     def __lustre_workaround(self, chunks, shape):
         nChunks_to_create_file = \
@@ -77,11 +99,17 @@ class Chunking(object):
         chunks = [1]*len(shape)
         adjust = self.__set_adjust_params(shape)
         self.__set_chunks(chunks, shape, adjust)
+        max_chunks = [1]*len(shape)
+        for dim, bound in zip(adjust['dim'], adjust['bounds']['max']):
+            max_chunks[dim] = int(bound)
 
         if 0 in chunks:
             return True
         else:
             chunks = self.__adjust_chunk_size(chunks, ttype, shape, adjust)
+            if self.__get_system_params().get(
+                    'chunk_planner', 'heuristic') == 'cost':
+                chunks = self.__plan_chunks(shape, ttype, chunks, max_chunks)
             # temporary work around for lustre
             if self.exp.meta_data.get('lustre') is True:
                 chunks = self.__lustre_workaround(chunks, shape)
@@ -89,6 +117,30 @@ class Chunking(object):
             logging.debug("chunk size %s", chunks)
             return tuple(chunks)
 
+    def __get_system_params(self):
+        return self.exp.meta_data.get_dictionary().get('system_params', {})
+
+    def __plan_chunks(self, shape, ttype, chunks, max_chunks):
+        """
+        Choose the chunks with the lowest simulated cost for the current and
+        next patterns, keeping the heuristic choice if it scores better.
+        """
+        touch_bytes = self.__get_system_params().get(
+            'chunk_touch_bytes', 1e6)
+        planner = ChunkPlanner(shape, np.dtype(ttype).itemsize, self.current,
+                               self.next, self.chunk_max,
+                               touch_bytes=touch_bytes, max_chunks=max_chunks)
+        planned = planner.plan()[0]
+        if planner.score(chunks) <= planner.score(planned):
+            planned = tuple(chunks)
+        self.plan = {'shape': tuple(shape), 'dtype': np.dtype(ttype).name,
+                     'current': self.current, 'next': self.next,
+                     'chunk_max': self.chunk_max, 'touch_bytes': touch_bytes,
+                     'max_chunks': tuple(max_chunks),
+                     'heuristic_chunks': tuple(chunks), 'chunks': planned}
+        logging.debug("planned chunks %s (heuristic %s)", planned, chunks)
+        return planned
+
     def __set_adjust_params(self, shape):
         """
         Set adjustable dimension parameters (the dimension number, increment
@@ -213,6 +265,9 @@ class Chunking(object):
         """
         Calculate the max possible frames per process
         """
+        if self.exp.meta_data.get_dictionary().get('dynamic_frames'):
+            # transfers are handed out one at a time
+            return int(min(nFrames, shape))
         nSlices = allslices if allslices else shape
         total_plugin_runs = np.ceil(float(nSlices) / nFrames)
         frame_list = np.arange(total_plugin_runs)
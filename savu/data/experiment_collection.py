@@ -62,6 +62,20 @@ class Experiment(object):
         return self.meta_data.get(entry)
 
     def __meta_data_setup(self, process_file):
+        checked = self.meta_data.get_dictionary().pop(
+            'checked_plugin_list', None)
+        if checked is not None:
+            # a later scan of a batch run, with the plugin list checked by
+            # the first (see PluginList._get_checked_copy)
+            self.meta_data.plugin_list = checked
+        else:
+            self._populate_plugin_list(process_file)
+        self.meta_data.set("nPlugin", 0) # initialise
+        self.meta_data.set('iterate_groups', [])
+
+    def _populate_plugin_list(self, process_file):
+        """ Read the plugin list from the process list file (or the options,
+        in tests). """
         self.meta_data.plugin_list = PluginList()
         try:
             rtype = self.meta_data.get('run_type')
@@ -74,8 +88,6 @@ class Experiment(object):
             template = self.meta_data.get('template')
             self.meta_data.plugin_list._populate_plugin_list(process_file,
                                                              template=template)
-        self.meta_data.set("nPlugin", 0) # initialise
-        self.meta_data.set('iterate_groups', [])
 
     def create_data_object(self, dtype, name, override=True):
         """ Create a data object.
@@ -225,7 +237,7 @@ class Experiment(object):
             fname = 'system_parameters.yml'
             sys_file = os.path.join(sys_files, sys_folder, fname)
         logging.info('Using the system parameters file: %s', sys_file)
-        self.meta_data.set('system_params', yaml.read_yaml(sys_file))
+        self.meta_data.set('system_params', yaml.read_system_params(sys_file))
 
     def _check_checkpoint(self):
         # if checkpointing has been set but the nxs file doesn't contain an
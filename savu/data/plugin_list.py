@@ -61,6 +61,8 @@ class PluginList(object):
         self._template = None
         self.version = None
         self.iterate_plugin_groups = []
+        # the loader datasets of the scan a checked copy was made from
+        self._checked_datasets = None
 
     def add_template(self, create=False):
         self._template = Template(self)
@@ -592,6 +594,26 @@ class PluginList(object):
     def _reset_datasets_list(self):
         self.datasets_list = []
 
+    def _get_checked_copy(self, datasets=None):
+        """ A copy of the plugin list, after the plugin list check, to be run
+        on another scan of a batch run without checking it again (see
+        PluginRunner._run_plugin_list_setup).  The plugin classes, tools and
+        parameter definitions are shared, and the datasets list is rebuilt
+        for each scan.
+
+        :keyword list(str) datasets: The names of the datasets created by the
+            loaders, which must match for the copy to be used.  Defaults to
+            those of the list being copied.
+        """
+        plist = copy.copy(self)
+        plist.plugin_list = [dict(p, data=copy.deepcopy(p['data']))
+                             for p in self.plugin_list]
+        plist.iterate_plugin_groups = copy.deepcopy(self.iterate_plugin_groups)
+        plist.datasets_list = []
+        plist._checked_datasets = sorted(datasets) if datasets is not None \
+            else self._checked_datasets
+        return plist
+
     def _get_n_loaders(self):
         return self.n_loaders
 
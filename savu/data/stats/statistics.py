@@ -30,6 +30,7 @@ class Statistics(object):
                         "range_used": ("min", "max")}  # volume stat: required slice stat(s)
     #_savers = ["Hdf5Saver", "ImageSaver", "MrcSaver", "TiffSaver", "XrfSaver"]
     _has_setup = False
+    _deferred_writes = None  # stats written by a plugin on a concurrent branch
 
 
     def __init__(self):
@@ -481,6 +482,28 @@ class Statistics(object):
                 for stats_dict in Statistics.global_stats[p_num]:
                     self._link_stats_to_datasets(stats_dict, self._iterative_group)
 
+    def _get_branch_state(self):
+        """Returns the stats of a plugin that has run on a concurrent branch, to be shared with the other processes."""
+        p_num = self.p_num
+        return {"calc_stats": self.calc_stats,
+                "global_stats": Statistics.global_stats.get(p_num),
+                "plugin_name": Statistics.plugin_names.get(p_num),
+                "residuals": Statistics.global_residuals.get(p_num)}
+
+    def _set_branch_state(self, state):
+        """Sets the stats of a plugin that has run on a concurrent branch of other processes.
+
+        :param state: The stats returned by _get_branch_state on a process of the branch.
+        """
+        p_num = self.p_num
+        self.calc_stats = state["calc_stats"]
+        Statistics.global_stats[p_num] = state["global_stats"]
+        if state["plugin_name"] is not None:
+            Statistics.plugin_names[p_num] = state["plugin_name"]
+            Statistics.plugin_numbers[state["plugin_name"]] = p_num
+        if state["residuals"] is not None:
+            Statistics.global_residuals[p_num] = state["residuals"]
+
     def _set_pattern_info(self):
         """Gathers information about the pattern of the data in the current plugin."""
         out_datasets = self.plugin.get_out_datasets()
@@ -536,6 +559,10 @@ class Statistics(object):
             p_num = self.p_num
         if plugin_name is None:
             plugin_name = self.plugin_names[p_num]
+        if Statistics._deferred_writes is not None:
+            # written by all processes once the concurrent branches have joined
+            Statistics._deferred_writes.append((p_num, plugin_name))
+            return
         path = Statistics.path
         filename = f"{path}/stats.h5"
         stats_dict = self.get_stats(p_num, instance="all")
@@ -53,6 +53,11 @@ class BaseTransportData(object):
         raise NotImplementedError("_get_padded_data needs to be"
                                   " implemented in  %s", self.__class__)
 
+    def _set_direct_io(self, direct):
+        """ Set whether transfers are read directly into arrays from the
+        buffer pool.  Override if appropriate.
+        """
+
     def _calc_max_frames_transfer(self, nFrames):
         """ Calculate the number of frames to transfer from file at a time.
         """
@@ -102,8 +107,7 @@ class BaseTransportData(object):
 
         settings = self.data.exp.meta_data.get(
                 ['system_params', 'data_transfer_settings'])
-        max_bytes = self.__convert_str(
-                settings['max_bytes'], b_per_p)*mem_multiply
+        max_bytes = self._get_max_bytes(b_per_p)
         bytes_threshold = self.__convert_str(
                 settings['bytes_threshold'], b_per_p)*mem_multiply
         b_per_p = b_per_p if b_per_p < bytes_threshold else bytes_threshold
@@ -117,6 +121,15 @@ class BaseTransportData(object):
 
         return min_mft, max_mft
 
+    def _get_max_bytes(self, b_per_p):
+        """ The maximum number of bytes, per process, that can be
+        transferred from file at a time. """
+        mem_multiply = \
+            self._get_data_obj()._get_plugin_data()._plugin.get_mem_multiply()
+        settings = self.data.exp.meta_data.get(
+                ['system_params', 'data_transfer_settings'])
+        return self.__convert_str(settings['max_bytes'], b_per_p)*mem_multiply
+
     def __convert_str(self, val, b_per_p):
         if isinstance(val, str):
             # FIXME this is still a potential security risk!
@@ -60,6 +60,9 @@ class Hdf5TransportData(BaseTransportData, SliceLists):
     def _get_padded_data(self, slice_list, end=False):
         return self.transfer_data._get_padded_data(slice_list, end=False)
 
+    def _set_direct_io(self, direct):
+        self.transfer_data._set_direct_io(direct)
+
     def _calc_max_frames_transfer(self, nFrames):
         return self.max_frames_function(nFrames)
 
@@ -21,8 +21,112 @@
 
 """
 
+import h5py
 import numpy as np
 
+from savu.core.buffer_pool import get_buffer_pool
+
+
+class LazySliceList(object):
+    """
+    A read-only sequence of slice lists, described by the start, step and
+    length of each slice dimension and the rules used to group frames.  Each
+    slice list is created when it is requested, so no slice lists are held in
+    memory.
+
+    Frames are ordered with the first slice dimension changing fastest and
+    are grouped into slice lists of up to max_frames frames, which never cross
+    a multiple of bank frames.
+
+    :param tuple(slice) base: The slices of the dimensions that are not slice
+        dimensions.
+    :param list(int) slice_dirs: The slice dimensions.
+    :param list(tuple(int, int, int)) ranges: The start, step and length of
+        the index in each slice dimension.
+    :param dict group_steps: The step of the grouped slice for each slice
+        dimension that is grouped.
+    :param int max_frames: The maximum number of frames in a group.
+    :param int bank: The number of frames in a bank.
+    :keyword list(int) pad: Added to the stop of each dimension of the last
+        frame in a bank.
+    """
+
+    def __init__(self, base, slice_dirs, ranges, group_steps, max_frames,
+                 bank, pad=None):
+        self.base = tuple(base)
+        self.slice_dirs = list(slice_dirs)
+        self.ranges = [tuple(int(v) for v in r) for r in ranges]
+        self.group_steps = dict(group_steps)
+        self.max_frames = max(int(max_frames), 1)
+        self.bank = int(bank)
+        self.pad = list(pad) if pad and any(pad) else None
+        lengths = [r[2] for r in self.ranges]
+        self._chunks = [int(np.prod(lengths[0:d])) for d in range(len(lengths))]
+        self._nGroups = -(-self.bank // self.max_frames)
+        nFrames = int(np.prod(lengths))
+        self._index = range(nFrames // self.bank * self._nGroups
+                            if self.bank else 0)
+        self._pads = []
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            view = self.__copy()
+            view._index = self._index[key]
+            return view
+        return self.__get_slice_list(self._index[key])
+
+    def __iter__(self):
+        for n in self._index:
+            yield self.__get_slice_list(n)
+
+    def _pad(self, dim, inc_start, inc_stop, length):
+        """ Get a copy of the slice list with the start and stop of dimension
+        dim increased.
+
+        :param int length: The length of the dimension, used if the slice
+            has no start.
+        """
+        padded = self.__copy()
+        padded._pads = self._pads + [(dim, inc_start, inc_stop, length)]
+        return padded
+
+    def __copy(self):
+        new = object.__new__(LazySliceList)
+        new.__dict__.update(self.__dict__)
+        return new
+
+    def __get_slice_list(self, n):
+        bank, group = divmod(n, self._nGroups)
+        first = bank*self.bank + group*self.max_frames
+        last = min(first + self.max_frames, (bank + 1)*self.bank) - 1
+
+        sl = list(self.base)
+        for dim, (start, step, length), chunk in \
+                zip(self.slice_dirs, self.ranges, self._chunks):
+            idx = start + ((first // chunk) % length)*step
+            if dim in self.group_steps:
+                stop = start + ((last // chunk) % length)*step + 1
+                sl[dim] = slice(idx, stop, self.group_steps[dim])
+            else:
+                sl[dim] = slice(idx, idx + 1, 1)
+
+        if self.pad and group == self._nGroups - 1:
+            for dim, inc in enumerate(self.pad):
+                # other dimensions are taken from the first frame
+                if inc and (dim in self.group_steps or first == last):
+                    s = sl[dim]
+                    sl[dim] = slice(s.start, s.stop + inc, s.step)
+
+        for dim, inc_start, inc_stop, length in self._pads:
+            s = sl[dim]
+            if s.start is None:
+                s = slice(0, length, 1)
+            sl[dim] = slice(s.start + inc_start, s.stop + inc_stop, s.step)
+        return tuple(sl)
+
 
 class SliceLists(object):
     """
@@ -186,12 +290,15 @@ class SliceLists(object):
     def _get_frames_per_process(self, slice_list):
         processes = self.data.exp.meta_data.get("processes")
         process = self.data.exp.meta_data.get("process")
-        frame_idx = np.arange(len(slice_list))
-        try:
-            frames = np.array_split(frame_idx, len(processes))[process]
-            slice_list = slice_list[frames[0]:frames[-1]+1]
-        except IndexError:
-            slice_list = []
+        if self.data.exp.meta_data.get_dictionary().get('dynamic_frames'):
+            # every process may be handed any transfer at run time
+            return slice_list, np.arange(len(slice_list))
+        # the block of np.array_split for this process
+        size, extra = divmod(len(slice_list), len(processes))
+        start = process*size + min(process, extra)
+        frames = np.arange(start, start + size + int(process < extra))
+        slice_list = slice_list[frames[0]:frames[-1]+1] if len(frames) \
+            else []
         return slice_list, frames
 
     def _pad_slice_list(self, slice_list, inc_start_str: str, inc_stop_str: str):
@@ -207,6 +314,10 @@ class SliceLists(object):
         for ddir, value in pad_dict.items():
             inc_start = eval(inc_start_str)
             inc_stop = eval(inc_stop_str)
+            if isinstance(slice_list, LazySliceList):
+                slice_list = slice_list._pad(
+                    ddir, inc_start, inc_stop, shape[ddir])
+                continue
             for i in range(len(slice_list)):
                 slice_list[i] = list(slice_list[i])
                 sl = slice_list[i][ddir]
@@ -318,8 +429,13 @@ class LocalData(SliceLists):
         pData = self.pData
         mf_process = pData.meta_data.get('max_frames_process')
         shape = pData.get_shape_transfer()
+        if slice_dirs and not any(isinstance(shape[d], str) for d in slice_dirs):
+            ranges = [(0, 1, shape[d]) for d in slice_dirs]
+            return LazySliceList(
+                [slice(None)]*len(shape), slice_dirs, ranges, {self.sdir: 1},
+                mf_process, int(np.prod([shape[d] for d in slice_dirs])))
+
         process_ssl = self._get_local_single_slice_list(shape)
-        
         process_gsl = self._group_slice_list_in_one_dimension(
                 process_ssl, mf_process, self.sdir)
         return process_gsl
@@ -353,6 +469,8 @@ class GlobalData(SliceLists):
         self.data = transport.data
         self.pData = self.data._get_plugin_data()
         self.shape = self.data.get_shape()
+        self._halo = None
+        self._direct = False
 
     def _get_dict(self, pad):
         temp = self._get_dict_in(pad) if self.dtype == 'in' else \
@@ -450,9 +568,51 @@ class GlobalData(SliceLists):
             else:
                 return np.arange(starts[dim], stops[dim], steps[dim])
 
+    def _get_lazy_slice_list(self, shape, max_frames, pad):
+        """ Get the grouped slice list as a LazySliceList, or None if the
+        slice dimensions cannot be described by a start, step and length. """
+        slice_dirs = list(self.data.get_slice_dimensions())
+        fix_dirs, value = self.pData._get_fixed_dimensions()
+        starts, stops, steps, chunks = \
+            self.data.get_preview().get_starts_stops_steps()
+        if not slice_dirs or set(fix_dirs) & set(slice_dirs) or \
+                any(chunks[d] > 1 for d in slice_dirs) or \
+                any(isinstance(shape[d], str) for d in slice_dirs):
+            return None
+        ranges = [(starts[d], steps[d], shape[d]) for d in slice_dirs]
+        if any(len(range(starts[d], stops[d], steps[d])) != shape[d]
+               for d in slice_dirs):
+            return None
+
+        base = [slice(None)]*len(shape)
+        core_dirs = self.data.get_core_dimensions()
+        for d, sl in zip(core_dirs, self._get_core_slices(core_dirs)):
+            base[d] = sl
+        for d, v in zip(fix_dirs, value):
+            base[d] = slice(v, v + 1, 1)
+
+        sdir_shape = [shape[d] for d in slice_dirs]
+        bank, _ = self._get_split_length(max_frames, sdir_shape)
+        if pad and any(pad):
+            pad = [s*p for s, p in zip(self.data.data_info.get("steps"), pad)]
+        pstep = self.data.get_preview().get_starts_stops_steps('steps')
+        return LazySliceList(base, slice_dirs, ranges,
+                             {d: pstep[d] for d in slice_dirs}, max_frames,
+                             int(bank), pad=pad)
+
     def _get_slice_list(self, shape, current_sl=None, pad=False):
         mft = self.pData._get_max_frames_transfer()
         pad = self._get_padded_shape(shape) if pad else False
+        transfer_gsl = self._get_lazy_slice_list(shape, mft, pad)
+        if transfer_gsl is not None:
+            if current_sl:
+                current_sl = self._get_lazy_slice_list(
+                    shape, self.pData._get_max_frames_process(), pad)
+            split_list = self.pData.split
+            transfer_gsl = self.__split_frames(transfer_gsl, split_list) if \
+                split_list else transfer_gsl
+            return transfer_gsl, current_sl
+
         transfer_ssl = self._get_global_single_slice_list(shape)
 
         if transfer_ssl is None:
@@ -498,10 +658,124 @@ class GlobalData(SliceLists):
                 slice_list[dim] = \
                     slice(slice_list[dim].start, sl.stop - diff, sl.step)
 
+        if pData.padding:
+            return self.__get_data_with_halo(slice_list, pad_list, shape)
+
+        if self._direct and not np.sum(pad_list) and \
+                isinstance(self.data.data, h5py.Dataset):
+            return self.__read_direct(tuple(slice_list))
+
         data = self.data.data[tuple(slice_list)]
 
         if np.sum(pad_list):
-            mode = pData.padding.mode if pData.padding else 'edge'
-            temp = np.pad(data, tuple(pad_list), mode=mode)
+            temp = np.pad(data, tuple(pad_list), mode='edge')
             return temp
         return data
+
+    def _set_direct_io(self, direct):
+        """ Read transfers directly into arrays from the buffer pool, which
+        are reused once the results of the transfer are written, so a plugin
+        that keeps a reference to its input frames will see them overwritten.
+        """
+        self._direct = direct
+
+    def __read_direct(self, slice_list):
+        dataset = self.data.data
+        shape = tuple(len(range(*sl.indices(n)))
+                      for sl, n in zip(slice_list, dataset.shape))
+        buf = get_buffer_pool().get(shape, dataset.dtype)
+        dataset.read_direct(buf, source_sel=slice_list)
+        return buf
+
+    def __get_data_with_halo(self, slice_list, pad_list, shape):
+        """ Read a padded transfer into a new padded buffer.  Frames that
+        overlap the end of the previous transfer (the halo) are copied from
+        memory, so only the new frames are read from file, and padding is
+        only added at the dataset boundaries. """
+        sdir = self.data.get_slice_dimensions()[0]
+        slice_list[sdir] = slice(*slice_list[sdir].indices(shape[sdir]))
+        step = slice_list[sdir].step or 1
+        overlap = self.__get_halo_overlap(slice_list, sdir, step)
+
+        read_sl = list(slice_list)
+        start, stop = slice_list[sdir].start, slice_list[sdir].stop
+        read_sl[sdir] = slice(start + overlap*step, stop, step)
+        new = self.data.data[tuple(read_sl)] \
+            if read_sl[sdir].start < stop else None
+
+        halo = self._halo[1] if overlap else None
+        if overlap:
+            offset = (start - self._halo[0][sdir].start) // step
+            halo = halo[self.__index(sdir, slice(offset, offset + overlap))]
+
+        parts = [p for p in [halo, new] if p is not None]
+        shape = list(parts[-1].shape)
+        shape[sdir] = sum(p.shape[sdir] for p in parts)
+
+        padded = [n + sum(pad) for n, pad in zip(shape, pad_list)]
+        buf = get_buffer_pool().get(padded, parts[-1].dtype) if self._direct \
+            else np.empty(padded, dtype=parts[-1].dtype)
+        interior = buf[tuple(slice(pad[0], pad[0] + n)
+                             for n, pad in zip(shape, pad_list))]
+        if halo is not None:
+            interior[self.__index(sdir, slice(0, overlap))] = halo
+        if new is not None:
+            interior[self.__index(sdir, slice(overlap, None))] = new
+
+        self.__set_halo(slice_list, interior, sdir, step)
+        return self.__pad(buf, interior, pad_list)
+
+    def __get_halo_overlap(self, slice_list, sdir, step):
+        """ The number of frames, in the slice dimension, at the start of this
+        transfer that are held in the halo of the previous one. """
+        if not self._halo:
+            return 0
+        prev = self._halo[0]
+        sl, psl = slice_list[sdir], prev[sdir]
+        same = all(slice_list[d] == prev[d] for d in range(len(slice_list))
+                   if d != sdir)
+        if not same or (psl.step or 1) != step or \
+                not psl.start <= sl.start < psl.stop or \
+                (sl.start - psl.start) % step:
+            return 0
+        nframes = len(range(sl.start, sl.stop, step))
+        return min(len(range(sl.start, psl.stop, step)), nframes)
+
+    def __set_halo(self, slice_list, interior, sdir, step):
+        """ Keep a copy of the trailing frames of the transfer that the next
+        transfer may overlap with (a copy, as plugins may modify their input
+        in place). """
+        pad = self.pData.padding._get_padding_directions().get(sdir)
+        width = min(sum(pad.values()), interior.shape[sdir]) if pad else 0
+        if not width:
+            self._halo = None
+            return
+        n = interior.shape[sdir]
+        start = slice_list[sdir].start
+        halo_sl = list(slice_list)
+        halo_sl[sdir] = slice(start + (n - width)*step, start + n*step, step)
+        self._halo = (halo_sl, np.array(
+            interior[self.__index(sdir, slice(n - width, n))]))
+
+    def __index(self, dim, sl):
+        index = [slice(None)]*len(self.shape)
+        index[dim] = sl
+        return tuple(index)
+
+    def __pad(self, buf, interior, pad_list):
+        """ Fill the padded regions of the buffer.  Edge padding is set in
+        place, other modes use np.pad. """
+        if not np.sum(pad_list):
+            return buf
+        mode = self.pData.padding.mode
+        if mode != 'edge':
+            return np.pad(np.array(interior), tuple(pad_list), mode=mode)
+        for dim, (before, after) in enumerate(pad_list):
+            first, last = before, buf.shape[dim] - after - 1
+            if before:
+                buf[self.__index(dim, slice(0, before))] = \
+                    buf[self.__index(dim, slice(first, first + 1))]
+            if after:
+                buf[self.__index(dim, slice(last + 1, None))] = \
+                    buf[self.__index(dim, slice(last, last + 1))]
+        return buf
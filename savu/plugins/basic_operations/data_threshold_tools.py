@@ -6,6 +6,8 @@ greaterequal) than the given value, based on the condition the data values
 will be replaced by the provided new value
 
     """
+    process_safe = True
+
     def define_parameters(self):
         """
         inequality_condition:
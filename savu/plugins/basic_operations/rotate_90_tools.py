@@ -2,6 +2,8 @@ from savu.plugins.plugin_tools import PluginTools
 
 class Rotate90Tools(PluginTools):
     """A plugin to rotate an image 90 degrees clockwise or anticlockwise."""
+    process_safe = True
+
     
     def define_parameters(self):
         """
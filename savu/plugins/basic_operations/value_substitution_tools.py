@@ -4,6 +4,8 @@ class ValueSubstitutionTools(PluginTools):
     """The function looks for a specific value in the provided second dataset
 (e.g. a mask image) and substitutes it with a given value.
     """
+    process_safe = True
+
     def define_parameters(self):
         """
         seek_value:
@@ -4,6 +4,8 @@ class CameraRotCorrectionTools(PluginTools):
     """A plugin to apply a rotation to projection images, for example to
      correct for missing camera alignment.
     """
+    process_safe = True
+
     def define_parameters(self):
         """
         angle:
@@ -4,6 +4,8 @@ from savu.plugins.plugin_tools import PluginTools
 class DistortionCorrectionTools(PluginTools):
     """A plugin to apply radial distortion correction.
     """
+    process_safe = True
+
 
     def define_parameters(self):
         """
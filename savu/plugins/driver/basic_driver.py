@@ -32,6 +32,7 @@ class BasicDriver(object):
 
     def __init__(self):
         super(BasicDriver, self).__init__()
+        self._branch_comm = None
 
     def get_mem_multiply(self):
         return 1
@@ -61,5 +62,10 @@ class BasicDriver(object):
     def get_communicator(self):
         return self._communicator
 
+    def _get_run_communicator(self):
+        """ The communicator to run the plugin on: that of its concurrent
+        branch, if any (see ConcurrentStep), or COMM_WORLD. """
+        return self._branch_comm if self._branch_comm else MPI.COMM_WORLD
+
     def plugin_barrier(self, msg=''):
         return self.exp._barrier(communicator=self.get_communicator(), msg=msg)
@@ -34,5 +34,6 @@ class CpuPlugin(_base):
         super(CpuPlugin, self).__init__()
 
     def _run_plugin(self, exp, transport):
-        self._run_plugin_instances(transport)
+        self._run_plugin_instances(
+            transport, communicator=self._get_run_communicator())
         return
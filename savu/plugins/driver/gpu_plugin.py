@@ -29,6 +29,7 @@ import pynvml as pv
 from mpi4py import MPI
 from itertools import chain
 
+from savu.core.io_helpers import get_io_channel
 from savu.plugins.driver.plugin_driver import PluginDriver
 from savu.plugins.driver.basic_driver import BasicDriver
 
@@ -66,6 +67,7 @@ class GpuPlugin(_base):
         ranks = list(chain.from_iterable(zip(*split_ranks)))
 
         self.__create_new_communicator(ranks, exp, process)
+        channel = get_io_channel(self, ranks)
 
         if gpu_processes[process]:
             self.stats_obj.GPU = True
@@ -75,9 +77,15 @@ class GpuPlugin(_base):
                           self.new_comm.Get_rank(), GPU_index)
             self.parameters['GPU_index'] = GPU_index
             os.environ['CUDA_DEVICE'] = str(GPU_index)
+            self._io_channel = channel
             self._run_plugin_instances(transport, communicator=self.new_comm)
+            self._io_channel = None
             self.__free_communicator()
             expInfo.set('process', MPI.COMM_WORLD.Get_rank())
+        elif channel:
+            logging.info('Not a GPU process: Serving the I/O of process %i',
+                         channel.partner)
+            transport._transport_serve_io(self, channel)
         else:
             logging.info('Not a GPU process: Waiting...')
         if self.stats_obj.calc_stats:
@@ -22,6 +22,7 @@
 """
 from mpi4py import MPI
 
+from savu.core.io_helpers import get_io_channel
 from savu.plugins.driver.plugin_driver import PluginDriver
 
 
@@ -41,13 +42,18 @@ class MultiThreadedPlugin(PluginDriver):
         masters = self._get_masters(self.processes)
 
         self.__create_new_communicator(masters, exp)
+        channel = get_io_channel(self, masters)
         self.exp._barrier()
 
         if process in masters:
             self.parameters['available_CPUs'] = nCores
             self.parameters['available_GPUs'] = len([p for p in self.processes if 'GPU' in p]) // self.nNodes
+            self._io_channel = channel
             self._run_plugin_instances(transport, communicator=self.new_comm)
+            self._io_channel = None
             self.__free_communicator()
+        elif channel:
+            transport._transport_serve_io(self, channel)
 
         self.exp._barrier()
         return
@@ -27,11 +27,23 @@ from mpi4py import MPI
 from savu.plugins.driver.basic_driver import BasicDriver
 
 
+def is_single_read_sweep(exp):
+    """ True if all instances of a parameter sweep are run over a single read
+    of the input data, as set by the 'parameter_sweep' system parameter
+    (otherwise the plugin is run once per instance).  This needs the output
+    to be written to file after each transfer. """
+    return exp.meta_data.get('system_params').get(
+        'parameter_sweep', 'repeat') == 'single_read' and \
+        exp.meta_data.get('transport') != 'basic'
+
+
 class PluginDriver(BasicDriver):
 
     def __init__(self):
         super(PluginDriver, self).__init__()
         self._communicator = None
+        self._sweep = None
+        self._io_channel = None
 
     def _run_plugin_instances(self, transport, communicator=MPI.COMM_WORLD):
         """ Runs the pre_process, process and post_process methods.
@@ -51,6 +63,11 @@ class PluginDriver(BasicDriver):
         if extra_dims:
             init_vars = self.__get_local_dict()
 
+        if extra_dims and is_single_read_sweep(self.exp):
+            self.__run_sweep(transport, out_data, param_idx, param_dims,
+                             init_vars)
+            repeat = 0
+
         for i in range(repeat):
             if extra_dims:
                 self.__reset_local_vars(init_vars)
@@ -69,12 +86,88 @@ class PluginDriver(BasicDriver):
         for j in range(len(out_data)):
             out_data[j].set_shape(out_data[j].data.shape)
 
+    def __run_sweep(self, transport, out_data, param_idx, param_dims,
+                    init_vars):
+        """ Run every instance of a parameter sweep over a single read of the
+        input data.  The pre_process of each instance is run in turn, keeping
+        its local variables, then each transfer is processed by every
+        instance before the next is read, with each instance writing to its
+        own index of the parameter dimensions.  The post_process of each
+        instance is then run, with the statistics calculated once for the
+        whole sweep. """
+        for j in range(len(out_data)):
+            out_data[j]._get_plugin_data()\
+                .set_fixed_dimensions(param_dims[j], param_idx[0])
+
+        self._sweep = {'instances': [], 'current': None, 'offsets': [],
+                       'exclude': self.__get_plugin_keys()}
+        logging.info("%s.%s", self.__class__.__name__, 'pre_process')
+        for idx in param_idx:
+            self.__reset_local_vars(init_vars)
+            self.get_plugin_tools()._set_parameters_this_instance(idx)
+            self.base_pre_process()
+            self.pre_process()
+            self._sweep['instances'].append(
+                {'idx': idx, 'vars': self.__get_instance_vars(), 'pcount': 0})
+            self._sweep['offsets'].append(
+                [[(d, int(v)) for d, v in zip(param_dims[j], idx)]
+                 for j in range(len(out_data))])
+
+        msg = "Pre-process completed for %s" % self.__class__.__name__
+        self.plugin_barrier(msg=msg)
+
+        logging.info("%s.%s", self.__class__.__name__, 'process_frames')
+        transport._transport_process(self)
+
+        msg = "Process_frames completed for %s" % self.__class__.__name__
+        self.plugin_barrier(msg=msg)
+
+        logging.info("%s.%s", self.__class__.__name__, 'post_process')
+        for n in range(len(param_idx)):
+            self._set_sweep_instance(n)
+            self.post_process()
+        self.base_post_process()
+        self._sweep = None
+        self._reset_process_frames_counter()
+
+    def _get_sweep_offsets(self):
+        """ For each instance of a parameter sweep that is being run over a
+        single read of the data, the (dimension, index) pairs of its results
+        in each output dataset, or None. """
+        return self._sweep['offsets'] if self._sweep else None
+
+    def _set_sweep_instance(self, n):
+        """ Swap in the parameters, local variables and frame counter of
+        instance n of the parameter sweep. """
+        current = self._sweep['current']
+        if current == n:
+            return
+        if current is not None:
+            instance = self._sweep['instances'][current]
+            instance['vars'] = self.__get_instance_vars()
+            instance['pcount'] = self.pcount
+        instance = self._sweep['instances'][n]
+        self.__reset_local_vars(instance['vars'])
+        self.pcount = instance['pcount']
+        self.get_plugin_tools()._set_parameters_this_instance(instance['idx'])
+        self._sweep['current'] = n
+
+    def __get_instance_vars(self):
+        """ As __get_local_dict, with the Plugin class variables found once
+        for the sweep, as instances are swapped for every frame. """
+        exclude = self._sweep['exclude']
+        return {k: v for k, v in vars(self).items() if k not in exclude}
+
+    def __get_plugin_keys(self):
+        """ The variables of the Plugin class, and the sweep itself, which
+        are shared by all instances. """
+        from savu.plugins.plugin import Plugin
+        return set(vars(Plugin()).keys()) | {'_sweep'}
+
     def __get_local_dict(self):
         """ Gets the local variables of the class minus those from the Plugin
         class. """
-        from savu.plugins.plugin import Plugin
-        plugin = Plugin()
-        copy_keys = vars(self).keys() - vars(plugin).keys()
+        copy_keys = vars(self).keys() - self.__get_plugin_keys()
         copy_dict = {}
         for key in copy_keys:
             copy_dict[key] = getattr(self, key)
@@ -97,5 +190,10 @@ class PluginDriver(BasicDriver):
     def __set_communicator(self, comm):
         self._communicator = comm
 
+    def _set_communicator(self, comm):
+        """ Set the communicator for a plugin that is run outside of
+        _run_plugin_instances (see FusedPluginGroup and ConcurrentStep). """
+        self.__set_communicator(comm)
+
     def get_communicator(self):
         return self._communicator
@@ -0,0 +1,163 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: threaded_cpu_plugin
+   :platform: Unix
+   :synopsis: Driver for CPU plugins that process the frames of each transfer \
+   in a pool of threads.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from mpi4py import MPI
+
+from savu.core.local_workers import get_n_workers
+from savu.plugins.driver.cpu_plugin import CpuPlugin
+
+
+class ThreadedCpuPlugin(CpuPlugin):
+    """
+    A CPU plugin driver that shares the process frames of each transfer
+    between a pool of threads, for plugins whose process_frames spends its
+    time in code that releases the GIL (NumPy, SciPy, pyFFTW...).  Threads
+    are only used if the tools class of the plugin sets thread_safe = True,
+    meaning process_frames does not change the plugin (other than through
+    get_buffer), otherwise the plugin runs as a CpuPlugin.  The number of
+    threads is the 'cpu_threads' system parameter (1 by default, so threads
+    are opt-in, or 0 for the cores this process can run on divided between
+    the processes on its node).  The frame counter and current slice list are
+    kept for each thread, so they give the same values as when the frames
+    are processed in order.
+    """
+
+    def __init__(self):
+        super(ThreadedCpuPlugin, self).__init__()
+        self._frame_threads = None
+
+    def __local(self):
+        local = self.__dict__.get('_thread_local')
+        if local is None:
+            local = self.__dict__['_thread_local'] = threading.local()
+        return local
+
+    @property
+    def pcount(self):
+        local = self.__local()
+        if getattr(local, 'worker', False):
+            return local.pcount
+        return self.__dict__.get('_pcount', 0)
+
+    @pcount.setter
+    def pcount(self, value):
+        local = self.__local()
+        if getattr(local, 'worker', False):
+            local.pcount = value
+        else:
+            self.__dict__['_pcount'] = value
+
+    @property
+    def slice_list(self):
+        local = self.__local()
+        if getattr(local, 'worker', False):
+            return local.slice_list
+        return self.__dict__.get('_slice_list')
+
+    @slice_list.setter
+    def slice_list(self, value):
+        local = self.__local()
+        if getattr(local, 'worker', False):
+            local.slice_list = value
+        else:
+            self.__dict__['_slice_list'] = value
+
+    def _run_plugin(self, exp, transport):
+        nThreads = self.__get_n_threads(exp)
+        if nThreads < 2:
+            return super(ThreadedCpuPlugin, self)._run_plugin(exp, transport)
+
+        self._frame_threads = ThreadPoolExecutor(
+            nThreads, thread_name_prefix=self.name)
+        self._busy = {}
+        self._elapsed = 0
+        self._lock = threading.Lock()
+        try:
+            self._run_plugin_instances(
+                transport, communicator=self._get_run_communicator())
+        finally:
+            self._frame_threads.shutdown()
+            self._frame_threads = None
+        self.__log_utilisation(nThreads)
+
+    def __get_n_threads(self, exp):
+        # frames are shared between local worker processes instead
+        if not self.get_plugin_tools().is_thread_safe() or \
+                get_n_workers(exp) > 1:
+            return 1
+        nThreads = exp.meta_data.get('system_params').get('cpu_threads', 1)
+        if nThreads:
+            return int(nThreads)
+        # the cores are shared with the other processes on the node
+        node_comm = self._get_run_communicator().Split_type(
+            MPI.COMM_TYPE_SHARED)
+        nProcs = node_comm.Get_size()
+        node_comm.Free()
+        return max(1, len(os.sched_getaffinity(0)) // nProcs)
+
+    def _map_frames(self, function, prange):
+        """ Call function for each process frame index in prange, shared
+        between the threads, with the frame counter of each call as if the
+        frames were processed in order.
+
+        :returns: The value returned by each call, in order.
+        :rtype: list
+        """
+        start = self.pcount
+        t0 = time.perf_counter()
+
+        def run(k, i):
+            local = self.__local()
+            local.worker, local.pcount, local.slice_list = True, start + k, None
+            t1 = time.perf_counter()
+            try:
+                return function(i)
+            finally:
+                local.worker = False
+                busy = time.perf_counter() - t1
+                with self._lock:
+                    name = threading.current_thread().name
+                    self._busy[name] = self._busy.get(name, 0) + busy
+
+        results = list(self._frame_threads.map(
+            run, range(len(prange)), prange))
+        self._elapsed += time.perf_counter() - t0
+        self.pcount = start + len(prange)
+        return results
+
+    def __log_utilisation(self, nThreads):
+        """ Log the fraction of the processing time each thread was busy. """
+        if not self._elapsed:
+            return
+        use = [self._busy.get(name, 0)/self._elapsed
+               for name in sorted(self._busy.keys())]
+        use += [0]*(nThreads - len(use))
+        logging.info("%s: thread utilisation %s (mean %.0f%%)", self.name,
+                     ', '.join('%.0f%%' % (100*u) for u in use),
+                     100*sum(use)/nThreads)
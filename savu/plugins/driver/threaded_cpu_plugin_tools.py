@@ -0,0 +1,5 @@
+from savu.plugins.plugin_tools import PluginTools
+
+class ThreadedCpuPluginTools(PluginTools):
+    """The driver for Cpu plugins that process the frames of each transfer
+    in a pool of threads, if the plugin tools set thread_safe = True."""
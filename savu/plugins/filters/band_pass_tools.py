@@ -4,6 +4,8 @@ class BandPassTools(PluginTools):
     """A plugin to filter each frame with a gaussian
 
     """
+    process_safe = True
+
     def define_parameters(self):
         """
         blur_width:
@@ -22,7 +22,7 @@
 """
 
 from savu.plugins.filters.denoising.base_median_filter import BaseMedianFilter
-from savu.plugins.driver.cpu_plugin import CpuPlugin
+from savu.plugins.driver.threaded_cpu_plugin import ThreadedCpuPlugin
 from savu.plugins.utils import register_plugin
 
 import numpy as np
@@ -30,7 +30,7 @@ from larix.methods.misc import MEDIAN_FILT
 
 
 @register_plugin
-class MedianFilter(BaseMedianFilter, CpuPlugin):
+class MedianFilter(BaseMedianFilter, ThreadedCpuPlugin):
 
     def __init__(self):
         super(MedianFilter, self).__init__("MedianFilter")
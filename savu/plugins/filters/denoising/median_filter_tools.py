@@ -5,3 +5,5 @@ class MedianFilterTools(PluginTools):
     through padding. Note that the kernel_size in 2D will be kernel_size x
     kernel_size and in 3D case kernel_size x kernel_size x kernel_size.
     """
+    # process_frames only reads the plugin parameters
+    thread_safe = True
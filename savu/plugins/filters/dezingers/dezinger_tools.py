@@ -4,6 +4,8 @@ class DezingerTools(PluginTools):
     """A plugin to apply median-based dezinger to PROJECTION (raw) data. \
     The plugin works in a 3D mode (kernel_size x kernel_size x kernel_size).
     """
+    process_safe = True
+
     def define_parameters(self):
         """
         kernel_size:
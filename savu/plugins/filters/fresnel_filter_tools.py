@@ -5,6 +5,8 @@ class FresnelFilterTools(PluginTools):
      is similar to the Paganin filter but can work on both sinograms and
      projections.
     """
+    process_safe = True
+
     def define_parameters(self):
         """
         ratio:
@@ -4,6 +4,8 @@ class PaganinFilterTools(PluginTools):
     """A plugin to apply the Paganin filter (for denoising or contrast
     enhancement) on projections.
     """
+    process_safe = True
+
     def define_parameters(self):
         """
         Ratio:
@@ -66,11 +66,27 @@ def check_yaml_errors(data):
         errors = list(gen)
     return errors
 
-def read_yaml(path):
+class BoolSafeLoader(yaml.SafeLoader):
+    """ A SafeLoader that reads true/false as booleans, even once the bool
+    constructor of the SafeLoader has been replaced to read plugin parameters
+    (see savu.plugins.utils._dumps). """
+    pass
+
+
+BoolSafeLoader.add_constructor("tag:yaml.org,2002:bool",
+                               yaml.constructor.SafeConstructor.construct_yaml_bool)
+
+
+def read_yaml(path, Loader=yaml.SafeLoader):
     with open(path, 'r') as stream:
-        data_dict = ordered_load(stream)
+        data_dict = ordered_load(stream, Loader=Loader)
     return data_dict
 
+
+def read_system_params(path):
+    """ Read a system parameters file, with its booleans as bool. """
+    return read_yaml(path, Loader=BoolSafeLoader)
+
 def read_yaml_from_doc(docstring):
     """Take the docstring and use ordered_loading to read in the yaml format as an ordered dict.
 
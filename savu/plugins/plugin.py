@@ -26,6 +26,7 @@ import logging
 import numpy as np
 
 import savu.plugins.utils as pu
+from savu.core.buffer_pool import get_buffer_pool
 from savu.plugins.plugin_datasets import PluginDatasets
 from savu.data.stats.statistics import Statistics
 
@@ -135,15 +136,41 @@ class Plugin(PluginDatasets):
         return data
 
     def plugin_process_frames(self, data):
-        data_copy = data.copy()
+        stats = self.stats_obj.calc_stats and self.stats_obj._stats_flag
+        base_slice = self.__get_base_slice(data) if stats else None
         frames = self.base_process_frames_after(self.process_frames(
                 self.base_process_frames_before(data)))
 
-        if self.stats_obj.calc_stats and self.stats_obj._stats_flag:
-            self.stats_obj.set_slice_stats(frames, data_copy)
+        if stats:
+            self.stats_obj.set_slice_stats(frames, base_slice)
         self.pcount += 1
         return frames
 
+    def __get_base_slice(self, data):
+        """ A copy of the first input frames, in a pooled array, for the
+        residuals of the slice stats, as process_frames may change its input
+        in place.  None if the residuals are not calculated. """
+        if 'RSS' not in self.stats_obj.slice_stats_key:
+            return None
+        frames = self.stats_obj._de_list(data)
+        if not isinstance(frames, np.ndarray):
+            return None
+        base_slice = self.get_buffer(frames.shape, frames.dtype)
+        base_slice[...] = frames
+        return base_slice
+
+    def get_buffer(self, shape, dtype=np.float32):
+        """ Get an uninitialised scratch array from the buffer pool.  When
+        called from process_frames the array is reused once the results of
+        the current transfer have been written, so it must not be kept
+        between calls.
+
+        :param tuple shape: The shape of the array.
+        :keyword dtype dtype: The dtype of the array.
+        :rtype: np.ndarray
+        """
+        return get_buffer_pool().get(shape, dtype)
+
     def process_frames(self, data):
         """
         This method is called after the plugin has been created by the
@@ -253,6 +280,11 @@ class Plugin(PluginDatasets):
         for data in data_object_list:
             data._clear_plugin_data()
 
+    def _clean_up_plugin_data(self):
+        """ Remove the pluginData objects of a plugin that is loaded but
+        not run (see FusedPluginGroup). """
+        self.__clean_up_plugin_data()
+
     def _revert_preview(self, in_data):
         """ Revert dataset back to original shape if previewing was used in a
         plugin to reduce the data shape but the original data shape should be
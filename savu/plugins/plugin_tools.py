@@ -855,6 +855,10 @@ class PluginTools(PluginParameters, PluginCitations, PluginDocumentation):
     """Holds all of the parameter, citation and documentation information
     for one plugin class - cls"""
 
+    # parameter definitions, citations and documentation read from the
+    # tools docstrings, by plugin class
+    _tools_data = {}
+
     def __init__(self, cls):
         super(PluginTools, self).__init__()
         self.plugin_class = cls
@@ -878,11 +882,25 @@ class PluginTools(PluginParameters, PluginCitations, PluginDocumentation):
 
     def _set_tools_data(self):
         """Populate the parameters, citations and documentation
-        with information from all of the tools classes
-        """
-        self.populate_parameters(self.tools_list)
-        self.set_cite(self.tools_list)
-        self.set_doc(self.tools_list)
+        with information from all of the tools classes.  The docstrings of
+        each plugin class are only read and checked once per process, as
+        plugins are created for the plugin list check and again to run
+        (for every scan of a batch run).
+        """
+        key = self.plugin_class.__class__
+        cached = PluginTools._tools_data.get(key)
+        if cached is None:
+            self.populate_parameters(self.tools_list)
+            self.set_cite(self.tools_list)
+            self.set_doc(self.tools_list)
+            PluginTools._tools_data[key] = \
+                copy.deepcopy((self.param, self.cite, self.doc))
+            return
+        param, cite, document = copy.deepcopy(cached)
+        self.param = param
+        # the default parameters are set before the documentation
+        self._populate_default_parameters()
+        self.cite, self.doc = cite, document
 
     def get_param_definitions(self):
         """
@@ -893,6 +911,32 @@ class PluginTools(PluginParameters, PluginCitations, PluginDocumentation):
         """
         return self.param.get_dictionary()
 
+    def is_thread_safe(self):
+        """
+        Returns
+        -------
+        bool
+            True if the tools class of the plugin sets thread_safe, meaning
+            process_frames does not change the plugin, so frames can be
+            processed concurrently.
+        """
+        return bool(self.tools_list) and \
+            getattr(self.tools_list[-1], 'thread_safe', False)
+
+    def is_process_safe(self):
+        """
+        Returns
+        -------
+        bool
+            True if the tools class of the plugin sets process_safe (or
+            thread_safe), meaning each frame is processed independently of
+            the others, so frames can be shared between copies of the plugin
+            in separate processes.
+        """
+        return bool(self.tools_list) and (
+            getattr(self.tools_list[-1], 'process_safe', False) or
+            self.is_thread_safe())
+
     def get_param_values(self):
         """
         Returns
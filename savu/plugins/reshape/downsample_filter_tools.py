@@ -4,6 +4,8 @@ class DownsampleFilterTools(PluginTools):
     """A plugin to downsample and rescale data volume including options of
     flipping and rotating images
     """
+    process_safe = True
+
     def define_parameters(self):
         """
         bin_size:
@@ -4,6 +4,8 @@ class RemoveAllRingsTools(PluginTools):
     """Combination of methods working in the sinogram space to remove most types
      of ring artefacts.
     """
+    process_safe = True
+
     def define_parameters(self):
         """
         sm_size:
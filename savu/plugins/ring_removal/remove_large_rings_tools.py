@@ -4,6 +4,8 @@ from savu.plugins.plugin_tools import PluginTools
 class RemoveLargeRingsTools(PluginTools):
     """Method working in the sinogram space to remove large ring artifacts.
     """
+    process_safe = True
+
 
     def define_parameters(self):
         """
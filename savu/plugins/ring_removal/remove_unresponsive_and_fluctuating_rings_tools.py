@@ -5,6 +5,8 @@ class RemoveUnresponsiveAndFluctuatingRingsTools(PluginTools):
     """Method working in the sinogram space to remove ring artifacts caused by
     dead pixels.
     """
+    process_safe = True
+
 
     def define_parameters(self):
         """
@@ -4,6 +4,8 @@ class RingRemovalFilteringTools(PluginTools):
     """Method working in the sinogram space to remove ring artifacts by
     combining a filtering and sorting technique.
     """
+    process_safe = True
+
     def define_parameters(self):
         """
         sigma:
@@ -4,6 +4,8 @@ class RingRemovalFittingTools(PluginTools):
     """Fitting-based method working in the sinogram space to remove ring
     artifacts.
     """
+    process_safe = True
+
     def define_parameters(self):
         """
         sigmax:
@@ -4,6 +4,8 @@ class RingRemovalRegularizationTools(PluginTools):
     """Regularization-based method working in the sinogram space to remove ring
     artifacts.
     """
+    process_safe = True
+
     def define_parameters(self):
         """
         alpha:
@@ -4,6 +4,8 @@ class RingRemovalSortingTools(PluginTools):
     """Sorting-based method working in the sinogram space to remove ring
     artifacts.
     """
+    process_safe = True
+
     def define_parameters(self):
         """
         size:
@@ -22,6 +22,7 @@
 """
 
 import os
+import json
 import h5py
 import logging
 from mpi4py import MPI
@@ -50,12 +51,22 @@ class Hdf5Utils(object):
         settings = self.exp.meta_data.get(['system_params', 'mpi-io_settings'])
         for key, value in settings.items():
             self.info.Set(key, value)
+        if self.exp.meta_data.get_dictionary().get('collective_writes') and \
+                'romio_cb_write' not in settings:
+            # aggregate the collective writes into large contiguous requests
+            self.info.Set('romio_cb_write', 'enable')
 
-    def _open_backing_h5(self, filename, mode, comm=MPI.COMM_WORLD, mpi=True):
+    def _open_backing_h5(self, filename, mode, comm=MPI.COMM_WORLD, mpi=True,
+                         barrier=True):
         """
         Create a h5 backend for output data
+
+        :keyword bool barrier: Synchronise the processes before and after the
+            open.  The open is collective with MPI, so this is only needed if
+            the processes must not be working on the file at the time.
         """
-        if mpi:
+        barrier = mpi and barrier
+        if barrier:
             msg = self.__class__.__name__ + "_open_backing_h5 %s" + filename
             self.exp._barrier(communicator=comm, msg=msg+'1')
 
@@ -64,7 +75,7 @@ class Hdf5Utils(object):
 
         backing_file = h5py.File(filename, mode, **kwargs)
 
-        if mpi:
+        if barrier:
             self.exp._barrier(communicator=comm, msg=msg+'2')
 
         if backing_file is None:
@@ -139,8 +150,12 @@ class Hdf5Utils(object):
         else:
             # entry path in output file path
             m_data = self.exp.meta_data.get
+            staging = self.exp.meta_data.get_dictionary().get(
+                'staging_folder')
+            staged = staging and h5file.startswith(staging + os.sep)
             if not (link == 'intermediate' and
-                    m_data('inter_path') != m_data('out_path')):
+                    m_data('inter_path') != m_data('out_path')) and \
+                    not staged:
                 h5file = h5file.split(m_data('out_folder') + '/')[-1]
             nxs_file[data_entry] = \
                 h5py.ExternalLink(h5file, group_name + '/data')
@@ -154,12 +169,15 @@ class Hdf5Utils(object):
         except:
             return False
 
-    def create_dataset_nofill(self, group, name:str, shape, dtype, chunks=None):
+    def create_dataset_nofill(self, group, name:str, shape, dtype, chunks=None,
+                              compression=None):
         spaceid = h5py.h5s.create_simple(shape)
         plist = h5py.h5p.create(h5py.h5p.DATASET_CREATE)
         plist.set_fill_time(h5py.h5d.FILL_TIME_NEVER)
         if chunks not in [None, []] and isinstance(chunks, tuple):
             plist.set_chunk(chunks)
+            if compression:
+                self.__set_filters(plist, compression)
         typeid = h5py.h5t.py_create(dtype)
         group_name = (group.name + '/' + name).encode("ascii")
         datasetid = h5py.h5d.create(
@@ -168,9 +186,8 @@ class Hdf5Utils(object):
         return data
 
     def _create_entries(self, data, key:str, current_and_next):
-        msg = self.__class__.__name__ + '_create_entries'
-        self.exp._barrier(msg=msg+'1')
-
+        # creating groups and datasets is collective with MPI, so all
+        # processes are in step without any barriers
         expInfo = self.exp.meta_data
         group_name = expInfo.get(["group_name", key])
         data.data_info.set('group_name', group_name)
@@ -179,9 +196,7 @@ class Hdf5Utils(object):
         except AttributeError:
             pass
 
-        self.exp._barrier(msg=msg+'2')
         group = data.backing_file.require_group(group_name)
-        self.exp._barrier(msg=msg+'3')
         shape = data.get_shape()
 
         if 'data' in group:
@@ -194,14 +209,143 @@ class Hdf5Utils(object):
             chunking = Chunking(self.exp, current_and_next)
             chunks = chunking._calculate_chunking(shape, data.dtype,
                                                   chunk_max=chunk_max)
+            if chunking.plan:
+                filename = os.path.basename(data.backing_file.filename)
+                self.exp.meta_data.set(['chunk_plans', filename],
+                                       chunking.plan)
 
-            self.exp._barrier(msg=msg+'4')
+            compression = self._get_compression(key)
             data.data = self.create_dataset_nofill(
-                    group, "data", shape, data.dtype, chunks=chunks)
-
-        self.exp._barrier(msg=msg+'5')
+                    group, "data", shape, data.dtype, chunks=chunks,
+                    compression=compression)
         return group_name, group
 
+    def _save_chunk_plans(self):
+        """ Record the inputs and results of the chunk planner for each
+        dataset in the NeXus file, to be replayed by savu_chunk_bench. """
+        plans = self.exp.meta_data.get_dictionary().get('chunk_plans')
+        if not plans or self.exp.meta_data.get('process') != \
+                len(self.exp.meta_data.get('processes')) - 1:
+            return
+        filename = self.exp.meta_data.get('nxs_filename')
+        with h5py.File(filename, 'a') as nxs_file:
+            group = nxs_file['entry'].require_group('chunk_plans')
+            group.attrs[NX_CLASS] = 'NXcollection'
+            for name, plan in plans.items():
+                if name in group:
+                    del group[name]
+                entry = group.require_group(name)
+                entry.attrs[NX_CLASS] = 'NXcollection'
+                entry.attrs['plan'] = \
+                    json.dumps(plan, default=lambda x: x.tolist())
+
+    def _get_compression(self, key):
+        """ Get the hdf5 filter settings for an output dataset from the
+        'hdf5_compression' system parameters, with any overrides for the
+        current plugin, then for the dataset name, applied.
+
+        :param str key: The name of the dataset.
+        :returns: The filter settings, or None if the dataset is not
+            compressed.
+        :rtype: dict
+        """
+        settings = self.exp.meta_data.get('system_params').get(
+            'hdf5_compression', None)
+        if not settings:
+            return None
+        settings = dict(settings)
+        overrides = settings.pop('plugins', None) or {}
+        settings.update(overrides.get(self.__get_plugin_name(), None) or {})
+        names = settings.pop('names', None) or {}
+        settings.update(names.get(key, None) or {})
+
+        if str(settings.get('filter', 'none')).lower() in ['none', 'false']:
+            return None
+        datasets = settings.get('datasets', 'all')
+        if datasets != 'all' and \
+                datasets != self.exp.meta_data.get(['link_type', key]):
+            return None
+        if not self.__filters_allowed():
+            raise ValueError(self.__get_filters_error(key))
+        return settings
+
+    def _check_compression(self):
+        """ Fail before any processing if a compression filter is set in the
+        'hdf5_compression' system parameters, including any plugin or
+        dataset override, and the datasets cannot be filtered. """
+        settings = self.exp.meta_data.get('system_params').get(
+            'hdf5_compression', None)
+        if not settings or self.__filters_allowed():
+            return
+        entries = [settings] + \
+            list((settings.get('plugins', None) or {}).values()) + \
+            list((settings.get('names', None) or {}).values())
+        if any(str((entry or {}).get('filter', 'none')).lower() not in
+               ['none', 'false'] for entry in entries):
+            raise ValueError(self.__get_filters_error())
+
+    def __get_filters_error(self, key=None):
+        dataset = " (dataset %s)" % key if key else ""
+        return "Parallel writes to compressed hdf5 datasets need " \
+            "'write_mode: collective' and hdf5 >= 1.10.2%s.  Set " \
+            "'write_mode: collective' or 'filter: none' in the " \
+            "hdf5_compression system parameters." % dataset
+
+    def __get_plugin_name(self):
+        nPlugin = self.exp.meta_data.get('nPlugin')
+        return self.exp._get_collection()['plugin_dict'][nPlugin]['name']
+
+    def __filters_allowed(self):
+        """ Filtered datasets can only be written in parallel if all
+        processes write collectively (hdf5 >= 1.10.2).  Parallel hdf5 cannot
+        write filtered chunks independently, so there is no fallback. """
+        if not self.exp.meta_data.get('mpi'):
+            return True
+        collective = self.exp.meta_data.get_dictionary().get(
+            'collective_writes', False)
+        return collective and h5py.version.hdf5_version_tuple >= (1, 10, 2)
+
+    def __set_filters(self, plist, compression):
+        """ Add the requested filters to a dataset creation property list.
+        The filters are optional, so a chunk that fails to compress is stored
+        as is. """
+        ftype = str(compression.get('filter')).lower()
+        level = int(compression.get('level', 1))
+        shuffle = compression.get('shuffle', True)
+        optional = h5py.h5z.FLAG_OPTIONAL
+
+        if ftype in ['gzip', 'lzf'] and shuffle:
+            plist.set_shuffle()
+        if ftype == 'gzip':
+            plist.set_filter(h5py.h5z.FILTER_DEFLATE, optional, (level,))
+        elif ftype == 'lzf':
+            plist.set_filter(h5py.h5z.FILTER_LZF, optional)
+        else:
+            f = self.__get_plugin_filter(ftype, level, shuffle)
+            plist.set_filter(f['compression'], optional,
+                             tuple(f['compression_opts']))
+
+    def __get_plugin_filter(self, ftype, level, shuffle):
+        """ Lossless filters registered by the optional hdf5plugin package.
+        """
+        try:
+            import hdf5plugin
+        except ImportError:
+            raise ImportError("The '%s' hdf5 filter requires the hdf5plugin "
+                              "package." % ftype)
+        blosc_shuffle = hdf5plugin.Blosc.SHUFFLE if shuffle else \
+            hdf5plugin.Blosc.NOSHUFFLE
+        filters = {'blosc': lambda: hdf5plugin.Blosc(
+                       cname='lz4', clevel=level, shuffle=blosc_shuffle),
+                   'lz4': lambda: hdf5plugin.LZ4(),
+                   'zstd': lambda: hdf5plugin.Zstd(),
+                   'bitshuffle': lambda: hdf5plugin.Bitshuffle()}
+        if ftype not in filters:
+            raise ValueError("Unknown hdf5 compression filter '%s', choose "
+                             "from none, gzip, lzf, %s." %
+                             (ftype, ', '.join(filters.keys())))
+        return filters[ftype]()
+
     def __set_optimal_hdf5_chunk_cache_size(self, data, group):
         # calculate the number first
         # change cache properties
@@ -123,7 +123,9 @@ def _set_options(args):
     options['mode'] = 'full'
     options['template'] = args.template
     options['transport'] = args.transport
-    options['process_names'] = args.names
+    # a pre-run from local mode (tomo_recon) runs as a single process
+    options['process_names'] = 'CPU0' if \
+        getattr(args, 'mode', None) == 'local' else args.names
     options['verbose'] = args.verbose
     options['quiet'] = args.quiet
     options['cluster'] = args.cluster
@@ -27,7 +27,11 @@ import os
 import copy
 import glob
 import shutil
+import h5py
+import numpy as np
 
+import savu
+import savu.plugins.loaders.utils.yaml_utils as yu
 from savu.core.plugin_runner import PluginRunner
 from savu.data.experiment_collection import Experiment
 from savu.data.data_structures.plugin_data import PluginData
@@ -185,6 +189,73 @@ def set_options(path, **kwargs):
     return options
 
 
+def set_system_params(options, **params):
+    """
+    Run with the default system parameters, updated with params, written to
+    a file in the output folder.  Nested parameters (e.g. hdf5_compression)
+    are updated rather than replaced.
+    """
+    sys_file = os.path.join(os.path.dirname(savu.__path__[0]),
+                            'system_files', 'dls', 'system_parameters.yml')
+    sys_params = yu.read_system_params(sys_file)
+    for key, value in params.items():
+        if isinstance(value, dict) and isinstance(sys_params.get(key), dict):
+            sys_params[key].update(value)
+        else:
+            sys_params[key] = value
+    if not os.path.exists(options['out_path']):
+        os.makedirs(options['out_path'])
+    options['system_params'] = \
+        os.path.join(options['out_path'], 'system_parameters.yml')
+    with open(options['system_params'], 'w') as stream:
+        yu.dump_yaml(sys_params, stream)
+
+
+def get_final_results(exp):
+    """ The final result datasets of a run, by NeXus entry name. """
+    results = {}
+    with h5py.File(exp.meta_data.get('nxs_filename'), 'r') as f:
+        for name in f['entry']:
+            if name.startswith('final_result'):
+                results[name] = f['entry'][name]['data'][...]
+    return results
+
+
+def run_random_tomo(plugins, size=(40, 12, 16), data=None, seed=0,
+                    system_params=None, preview=None, **kwargs):
+    """
+    Run a list of plugins on a random 3D tomography dataset, generated from
+    the given seed, so that runs with different options can be compared.
+
+    :param list plugins: The plugin modules.
+    :keyword tuple size: The size of the random dataset.
+    :keyword list data: The parameters and datasets of each plugin.
+    :keyword int seed: The seed of the random dataset.
+    :keyword dict system_params: System parameters to override.
+    :keyword list preview: The preview of the random dataset.
+    :keyword kwargs: Options to override.
+    :returns: The final result datasets, by NeXus entry name.
+    :rtype: dict
+    """
+    options = set_options(get_test_data_path('24888.nxs'))
+    options['loader'] = \
+        'savu.plugins.loaders.full_field_loaders.random_3d_tomo_loader'
+    options['stats'] = 'off'
+    options.update(kwargs)
+    loader = {'size': list(size)}
+    if preview:
+        loader['preview'] = preview
+    set_plugin_list(options, plugins, [loader] +
+                    (data or [{} for _ in plugins]))
+    if system_params:
+        set_system_params(options, **system_params)
+    np.random.seed(seed)
+    try:
+        return get_final_results(PluginRunner(options)._run_plugin_list())
+    finally:
+        cleanup(options)
+
+
 def set_data_dict(in_data, out_data):
     return {'in_datasets': in_data, 'out_datasets': out_data}
 
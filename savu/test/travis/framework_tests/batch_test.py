@@ -0,0 +1,91 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: batch_test
+   :platform: Unix
+   :synopsis: checking the scans of a batch run reuse the plugin list checked \
+   by the first scan, with the same results as separate runs
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import unittest
+import numpy as np
+from unittest import mock
+
+from savu.test import test_utils as tu
+from savu.data.plugin_list import PluginList
+from savu.core.plugin_runner import PluginRunner
+
+
+class BatchTest(unittest.TestCase):
+
+    plugins = ['savu.plugins.filters.band_pass']*2
+
+    def __run_scans(self, seeds, datasets=None):
+        """ Run the plugins on a random dataset for each seed, as the scans
+        of a batch run (see tomo_recon), returning the final results of each
+        scan and the number of times the loaders were checked. """
+        results = []
+        checked = None
+        check_loaders = PluginList._check_loaders
+        with mock.patch.object(PluginList, '_check_loaders', autospec=True,
+                               side_effect=check_loaders) as spy:
+            for seed in seeds:
+                options = tu.set_options(tu.get_test_data_path('24888.nxs'))
+                options['loader'] = 'savu.plugins.loaders.full_field_' \
+                    'loaders.random_3d_tomo_loader'
+                options['stats'] = 'off'
+                options['batch'] = True
+                tu.set_plugin_list(options, self.plugins,
+                                   [{'size': [40, 12, 16]}] +
+                                   [{} for _ in self.plugins])
+                if checked:
+                    options['checked_plugin_list'] = \
+                        checked._get_checked_copy(datasets)
+                np.random.seed(seed)
+                try:
+                    runner = PluginRunner(options)
+                    results.append(
+                        tu.get_final_results(runner._run_plugin_list()))
+                finally:
+                    tu.cleanup(options)
+                checked = checked or runner.checked_plugin_list
+        return results, spy.call_count
+
+    def test_checked_once(self):
+        seeds = [0, 1, 2]
+        results, n_checks = self.__run_scans(seeds)
+        self.assertEqual(n_checks, 1)
+        for seed, result in zip(seeds, results):
+            expected = tu.run_random_tomo(self.plugins, seed=seed)
+            self.assertEqual(sorted(result), sorted(expected))
+            for name in expected:
+                self.assertEqual(result[name].tobytes(),
+                                 expected[name].tobytes())
+
+    def test_different_datasets(self):
+        # a scan whose loaders create other datasets is checked again
+        results, n_checks = self.__run_scans([0, 1], datasets=['other'])
+        self.assertEqual(n_checks, 2)
+        expected = tu.run_random_tomo(self.plugins, seed=1)
+        for name in expected:
+            self.assertEqual(results[1][name].tobytes(),
+                             expected[name].tobytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
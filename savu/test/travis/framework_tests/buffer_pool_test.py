@@ -0,0 +1,138 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: buffer_pool_test
+   :platform: Unix
+   :synopsis: checking arrays are held per transfer and reused by BufferPool
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import unittest
+import numpy as np
+from unittest import mock
+
+from savu.test import test_utils as tu
+from savu.core.buffer_pool import BufferPool
+from savu.data.stats.statistics import Statistics
+from savu.plugins.filters.band_pass import BandPass
+
+
+class BufferPoolTest(unittest.TestCase):
+
+    def test_reuse_after_release(self):
+        pool = BufferPool()
+        with pool.transfer(0):
+            a = pool.get((4, 5))
+        with pool.transfer(1):
+            b = pool.get((4, 5))
+        self.assertIsNot(a, b)
+        pool.release(0)
+        with pool.transfer(2):
+            c = pool.get((4, 5))
+        self.assertIs(a, c)
+        self.assertEqual(pool.allocated, 2*a.nbytes)
+        self.assertEqual(pool.reused, a.nbytes)
+
+    def test_shape_and_dtype(self):
+        pool = BufferPool()
+        a = pool.get((3, 3), np.float64, tag=0)
+        pool.release(0)
+        self.assertIsNot(pool.get((3, 3), np.float32, tag=1), a)
+        self.assertIsNot(pool.get((9,), np.float64, tag=1), a)
+        self.assertIs(pool.get((3, 3), np.float64, tag=1), a)
+
+    def test_unheld(self):
+        pool = BufferPool()
+        a = pool.get((10,))
+        pool.release_all()
+        self.assertIsNot(pool.get((10,), tag=0), a)
+
+    def test_max_bytes(self):
+        pool = BufferPool(max_bytes=100)
+        pool.get((20,), tag=0)
+        pool.get((20,), tag=0)
+        pool.release(0)
+        # only one array of 80 bytes is kept
+        pool.get((20,), tag=1)
+        pool.get((20,), tag=1)
+        self.assertEqual(pool.reused, 80)
+        self.assertEqual(pool.allocated, 240)
+
+
+class DirectIoTest(unittest.TestCase):
+    """ Input frames kept by a plugin are only overwritten by later transfers
+    if direct_io is switched on. """
+
+    def __run(self, system_params):
+        kept = []
+        process_frames = BandPass.process_frames
+
+        def keep(plugin, data):
+            kept.append((data[0], data[0].copy()))
+            return process_frames(plugin, data)
+
+        system_params.update({
+            'pattern_transpose': 'off', 'data_transfer_settings': {
+                'max_bytes': '4*40*16*4', 'min_bytes': '0',
+                'bytes_threshold': '4*40*16*4'}})
+        with mock.patch.object(BandPass, 'process_frames', autospec=True,
+                               side_effect=keep):
+            tu.run_random_tomo(['savu.plugins.filters.band_pass']*2,
+                               system_params=system_params)
+        self.assertGreater(len(kept), 2)
+        return sum(not np.array_equal(frames, copy) for frames, copy in kept)
+
+    def test_frames_kept_by_default(self):
+        self.assertEqual(self.__run({}), 0)
+
+    def test_frames_reused_with_direct_io(self):
+        self.assertGreater(self.__run({'direct_io': True}), 0)
+
+
+class StatsBaseSliceTest(unittest.TestCase):
+    """ The residuals in the slice stats are calculated from the input
+    frames before process_frames, even if it changes them in place. """
+
+    def test_in_place_process_frames(self):
+        inputs = []
+        base_slices = []
+        set_slice_stats = Statistics.set_slice_stats
+
+        def double(plugin, data):
+            inputs.append(data[0].copy())
+            data[0] *= 2
+            return data[0]
+
+        def spy(stats, my_slice, base_slice=None, pad=True):
+            base_slices.append(base_slice.copy())
+            return set_slice_stats(stats, my_slice, base_slice, pad)
+
+        with mock.patch.object(BandPass, 'process_frames', autospec=True,
+                               side_effect=double), \
+                mock.patch.object(Statistics, 'set_slice_stats',
+                                  autospec=True, side_effect=spy), \
+                mock.patch.object(Statistics, '_post_chain'):
+            tu.run_random_tomo(['savu.plugins.filters.band_pass'],
+                               stats='on')
+        self.assertTrue(inputs)
+        self.assertEqual(len(base_slices), len(inputs))
+        for frames, base_slice in zip(inputs, base_slices):
+            self.assertTrue(np.array_equal(frames, base_slice))
+
+
+if __name__ == "__main__":
+    unittest.main()
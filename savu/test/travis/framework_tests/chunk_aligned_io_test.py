@@ -0,0 +1,107 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: chunk_aligned_io_test
+   :platform: Unix
+   :synopsis: checking chunk aligned transfers are written with write_direct, \
+   with the same results as ordinary writes
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import h5py
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from savu.test import test_utils as tu
+from savu.data.chunking import Chunking, is_chunk_aligned
+
+
+class IsChunkAlignedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.file = h5py.File(os.path.join(self.folder, 'test.h5'), 'w')
+        self.dataset = self.file.create_dataset(
+            'data', shape=(36, 12, 16), chunks=(8, 12, 4), dtype='f4')
+
+    def tearDown(self):
+        self.file.close()
+        shutil.rmtree(self.folder)
+
+    def test_aligned(self):
+        self.assertTrue(is_chunk_aligned(
+            self.dataset, (slice(8, 24), slice(0, 12), slice(4, 8))))
+        # the last chunk runs to the end of the dataset
+        self.assertTrue(is_chunk_aligned(
+            self.dataset, (slice(32, 36), slice(None), slice(None))))
+
+    def test_not_aligned(self):
+        self.assertFalse(is_chunk_aligned(
+            self.dataset, (slice(0, 12), slice(None), slice(None))))
+        self.assertFalse(is_chunk_aligned(
+            self.dataset, (slice(0, 8, 2), slice(None), slice(None))))
+        self.assertFalse(is_chunk_aligned(
+            self.dataset, (slice(0, 8), slice(None))))
+        unchunked = self.file.create_dataset('unchunked', shape=(8,))
+        self.assertFalse(is_chunk_aligned(unchunked, (slice(None),)))
+
+
+class WriteDirectTest(unittest.TestCase):
+
+    def __run(self, chunks, direct_io):
+        """ Run the plugins over transfers of 12 frames, with output datasets
+        of the given chunks, returning the final results and the number of
+        writes made with write_direct. """
+        system_params = {'direct_io': direct_io, 'data_transfer_settings': {
+            'max_bytes': '4*40*16*4', 'min_bytes': '0',
+            'bytes_threshold': '4*40*16*4'}}
+        write_direct = h5py.Dataset.write_direct
+        with mock.patch.object(Chunking, '_calculate_chunking',
+                               return_value=chunks), \
+                mock.patch.object(h5py.Dataset, 'write_direct',
+                                  autospec=True,
+                                  side_effect=write_direct) as spy:
+            results = tu.run_random_tomo(
+                ['savu.plugins.filters.band_pass']*2,
+                system_params=system_params)
+        return results, spy.call_count
+
+    def __check(self, chunks):
+        expected, n_direct = self.__run(chunks, False)
+        self.assertEqual(n_direct, 0)
+        results, n_direct = self.__run(chunks, True)
+        for name in expected:
+            self.assertEqual(results[name].tobytes(),
+                             expected[name].tobytes())
+        return n_direct
+
+    def test_aligned_chunks(self):
+        # three transfers for each of the two plugins
+        self.assertEqual(self.__check((12, 12, 16)), 6)
+        self.assertEqual(self.__check((4, 6, 8)), 6)
+
+    def test_misaligned_chunks(self):
+        self.assertEqual(self.__check((10, 12, 16)), 0)
+        # only the last transfers, which run to the end of the dataset
+        self.assertEqual(self.__check((8, 12, 16)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: chunk_planner_test
+   :platform: Unix
+   :synopsis: checking the chunk shapes chosen by the cost model
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import unittest
+import numpy as np
+
+from savu.data.chunk_planner import ChunkPlanner, get_transfer_shape
+
+
+def pattern(mft, slice_dims, core_dims):
+    return {'max_frames_transfer': mft, 'slice_dims': slice_dims,
+            'core_dims': core_dims}
+
+
+class ChunkPlannerTest(unittest.TestCase):
+
+    def test_transfer_shape(self):
+        shape = (100, 20, 30)
+        self.assertEqual(get_transfer_shape(
+            pattern(8, (0,), (1, 2)), shape), (8, 20, 30))
+        self.assertEqual(get_transfer_shape(
+            pattern(200, (1,), (0, 2)), shape), (100, 20, 30))
+
+    def test_same_pattern(self):
+        proj = pattern(4, (0,), (1, 2))
+        planner = ChunkPlanner((64, 32, 32), 4, proj, proj, 1e6,
+                               touch_bytes=1e3)
+        chunks = planner.plan()[0]
+        # each transfer should touch whole chunks only
+        self.assertEqual(chunks[1:], (32, 32))
+        self.assertEqual(4 % chunks[0], 0)
+
+    def test_changing_pattern_balances_both(self):
+        proj = pattern(1, (0,), (1, 2))
+        sino = pattern(1, (1,), (0, 2))
+        shape = (64, 64, 64)
+        planner = ChunkPlanner(shape, 4, proj, sino, 64*64*4*8,
+                               touch_bytes=4096)
+        chunks = planner.plan()[0]
+        self.assertLess(planner.score(chunks), planner.score((1, 64, 64)))
+        self.assertLess(planner.score(chunks), planner.score((64, 1, 64)))
+
+    def test_chunk_max_and_bounds(self):
+        proj = pattern(1, (0,), (1, 2))
+        planner = ChunkPlanner((10, 100, 100), 4, proj, proj, 4000,
+                               max_chunks=(1, 100, 100))
+        for chunks in planner.plan(n_best=5):
+            self.assertLessEqual(np.prod(chunks)*4, 4000)
+            self.assertEqual(chunks[0], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
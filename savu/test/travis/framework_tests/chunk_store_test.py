@@ -0,0 +1,91 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: chunk_store_test
+   :platform: Unix
+   :synopsis: checking reads, writes and chunk alignment of ChunkStore
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from savu.data.chunk_store import ChunkStore, align_chunks
+
+
+class ChunkStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'data.zarr')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_zarr_layout(self):
+        store = ChunkStore.create(self.path, (7, 5, 6), np.float32, (3, 2, 4))
+        store[0:3, 0:2, 0:4] = 1
+        with open(os.path.join(self.path, '.zarray')) as f:
+            meta = json.load(f)
+        self.assertEqual(meta['zarr_format'], 2)
+        self.assertEqual(meta['chunks'], [3, 2, 4])
+        self.assertEqual(meta['dtype'], '<f4')
+        self.assertEqual(sorted(os.listdir(self.path)), ['.zarray', '0.0.0'])
+
+    def test_read_write(self):
+        store = ChunkStore.create(self.path, (7, 5, 6), np.float32, (3, 2, 4))
+        expected = np.zeros(store.shape, dtype=np.float32)
+        np.random.seed(0)
+        for _ in range(20):
+            sl = tuple(slice(*sorted(np.random.randint(0, n + 1, 2)))
+                       for n in store.shape)
+            value = np.random.random([s.stop - s.start for s in sl])
+            store[sl] = value
+            expected[sl] = value
+        store[2, :, 1] = 5
+        expected[2, :, 1] = 5
+        self.assertTrue(np.array_equal(store[...], expected))
+        for key in [(1,), (slice(None, None, 2), 3), (Ellipsis, -1),
+                    (slice(1, 6, 3), slice(None), slice(0, 5, 2))]:
+            self.assertTrue(np.array_equal(store[key], expected[key]))
+
+    def test_reopen(self):
+        store = ChunkStore.create(self.path, (4, 4), np.float64, (2, 2))
+        store[:] = np.arange(16).reshape(4, 4)
+        store = ChunkStore.create(self.path, (4, 4), np.float64, (2, 2))
+        self.assertEqual(store[3, 3], 15)
+        self.assertEqual(len(list(store.chunk_slices())), 4)
+
+    def test_align_chunks(self):
+        pattern = {'core_dims': (1, 2), 'slice_dims': (0,),
+                   'max_frames_transfer': 6}
+        self.assertEqual(align_chunks((8, 30, 30), (100, 30, 30), pattern),
+                         (6, 30, 30))
+        self.assertEqual(align_chunks((4, 7, 30), (100, 30, 30), pattern),
+                         (3, 7, 30))
+        pattern['slice_dims'] = (0, 1)
+        pattern['core_dims'] = (2,)
+        self.assertEqual(align_chunks((4, 7, 30), (100, 30, 30), pattern),
+                         (3, 1, 30))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: collective_writer_test
+   :platform: Unix
+   :synopsis: checking results written through the collective writer are the \
+   same as those written independently
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import h5py
+import shutil
+import tempfile
+import unittest
+import contextlib
+import numpy as np
+from unittest import mock
+
+from savu.test import test_utils as tu
+from savu.core.collective_writer import CollectiveWriter
+
+
+class SerialDXID(h5py.h5p.PropDXID):
+    """ A dataset transfer property list that ignores the MPI-IO transfer
+    mode, so the collective writes can be made with a serial build of
+    h5py. """
+
+    def set_dxpl_mpio(self, mode):
+        pass
+
+
+def create_plist(cls, create=h5py.h5p.create):
+    plist = create(cls)
+    if cls is not h5py.h5p.DATASET_XFER:
+        return plist
+    # the new object shares the identifier, so needs its own reference
+    h5py.h5i.inc_ref(plist)
+    return SerialDXID(plist.id)
+
+
+@contextlib.contextmanager
+def serial_collective_writes():
+    """ Write through the collective writer in a serial run, without the
+    MPI-IO transfer mode. """
+    collective = property(lambda self: contextlib.nullcontext())
+    with mock.patch('savu.core.transports.base_transport.'
+                    'is_collective_writes', return_value=True), \
+            mock.patch('savu.core.transports.hdf5_transport.'
+                       'is_collective_writes', return_value=True), \
+            mock.patch.object(h5py.h5p, 'create', side_effect=create_plist), \
+            mock.patch.object(h5py.Dataset, 'collective', collective,
+                              create=True):
+        yield
+
+
+class CollectiveWriterTest(unittest.TestCase):
+
+    plugins = ['savu.plugins.filters.band_pass']*2
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def __run(self, write_mode):
+        """ Run the plugins, in several transfers, returning the final
+        results and the number of collective writes. """
+        system_params = {
+            'write_mode': write_mode, 'data_transfer_settings': {
+                'max_bytes': '4*40*16*4', 'min_bytes': '0',
+                'bytes_threshold': '4*40*16*4'}}
+        write = CollectiveWriter.write
+        with mock.patch.object(CollectiveWriter, 'write', autospec=True,
+                               side_effect=write) as spy:
+            if write_mode == 'collective':
+                with serial_collective_writes():
+                    results = tu.run_random_tomo(
+                        self.plugins, system_params=system_params)
+            else:
+                results = tu.run_random_tomo(
+                    self.plugins, system_params=system_params)
+        return results, spy.call_count
+
+    def test_same_results(self):
+        expected, n_writes = self.__run('independent')
+        self.assertEqual(n_writes, 0)
+        results, n_writes = self.__run('collective')
+        # one write per transfer of each plugin
+        self.assertGreater(n_writes, 2*len(self.plugins))
+        self.assertEqual(sorted(results), sorted(expected))
+        for name in expected:
+            self.assertEqual(results[name].tobytes(),
+                             expected[name].tobytes())
+
+    def test_empty_writes(self):
+        # a process with fewer transfers than another makes empty writes
+        data = np.random.rand(6, 5).astype(np.float32)
+        filenames = [os.path.join(self.folder, name)
+                     for name in ['independent.h5', 'collective.h5']]
+        with h5py.File(filenames[0], 'w') as f:
+            f.create_dataset('data', data=data)
+        comm = mock.Mock()
+        comm.allreduce.return_value = 4
+        with serial_collective_writes(), h5py.File(filenames[1], 'w') as f:
+            dataset = f.create_dataset('data', shape=data.shape,
+                                       dtype=data.dtype)
+            writer = CollectiveWriter(comm, [dataset], 2)
+            writer.write([np.s_[:3]], [data[:3]])
+            writer.write([None], [None])
+            writer.write([np.s_[3:]], [data[3:]])
+            writer.finish()
+            self.assertEqual(writer.done, 4)
+        files = [h5py.File(filename, 'r') for filename in filenames]
+        try:
+            self.assertEqual(files[0]['data'][...].tobytes(),
+                             files[1]['data'][...].tobytes())
+        finally:
+            for f in files:
+                f.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
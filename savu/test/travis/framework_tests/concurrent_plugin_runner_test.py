@@ -0,0 +1,66 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: concurrent_plugin_runner_test
+   :platform: Unix
+   :synopsis: checking which plugins are run concurrently and how the \
+   processes are split between them
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import unittest
+
+from savu.core.concurrent_plugin_runner import plan_steps, split_processes
+
+
+class ConcurrentPluginRunnerTest(unittest.TestCase):
+
+    def test_independent_chains(self):
+        # fluorescence then diffraction chains, each processed in place
+        names = [{'fluo'}, {'fluo'}, {'xrd'}, {'xrd'}]
+        plugins = ['A', 'B', 'C', 'D']
+        self.assertEqual(plan_steps(names, plugins, [True]*4),
+                         [[0, 2], [1, 3]])
+
+    def test_dependent_plugins(self):
+        # the third plugin reads the output of the first
+        names = [{'fluo', 'sum'}, {'xrd'}, {'sum', 'stxm'}]
+        self.assertEqual(plan_steps(names, ['A', 'B', 'C'], [True]*3),
+                         [[0, 1]])
+        # a plugin cannot be run ahead of an earlier plugin of the same name
+        names = [{'fluo'}, {'fluo'}, {'xrd'}]
+        self.assertEqual(plan_steps(names, ['A', 'B', 'B'], [True]*3), [])
+
+    def test_candidates_and_width(self):
+        names = [{'a'}, {'b'}, {'c'}, {'d'}]
+        plugins = ['A', 'B', 'C', 'D']
+        self.assertEqual(plan_steps(names, plugins, [True, False, True, True]),
+                         [[0, 2, 3]])
+        self.assertEqual(plan_steps(names, plugins, [True]*4, max_width=2),
+                         [[0, 1], [2, 3]])
+        self.assertEqual(plan_steps(names, plugins, [True]*4, first=2),
+                         [[2, 3]])
+
+    def test_split_processes(self):
+        self.assertEqual(split_processes([3, 1], 8), [6, 2])
+        self.assertEqual(split_processes([100, 1, 1], 4), [2, 1, 1])
+        self.assertEqual(split_processes([1, 1, 1], 3), [1, 1, 1])
+        self.assertEqual(sum(split_processes([5, 3, 2], 11)), 11)
+
+
+if __name__ == "__main__":
+    unittest.main()
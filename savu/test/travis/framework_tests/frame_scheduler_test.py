@@ -0,0 +1,80 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: frame_scheduler_test
+   :platform: Unix
+   :synopsis: checking the FrameScheduler hands out each transfer once
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import unittest
+from unittest import mock
+from mpi4py import MPI
+
+from savu.test import test_utils as tu
+from savu.core.frame_scheduler import FrameScheduler
+
+
+class FrameSchedulerTest(unittest.TestCase):
+
+    def test_each_transfer_claimed_once(self):
+        scheduler = FrameScheduler(MPI.COMM_SELF, 5)
+        try:
+            self.assertEqual(list(scheduler), list(range(5)))
+            self.assertEqual(scheduler.claimed, list(range(5)))
+            # the counter stops once every transfer has been claimed
+            self.assertIsNone(scheduler.claim())
+            self.assertEqual(list(scheduler), [])
+        finally:
+            scheduler.close()
+
+    def test_no_transfers(self):
+        scheduler = FrameScheduler(MPI.COMM_SELF, 0)
+        try:
+            self.assertIsNone(scheduler.claim())
+            self.assertEqual(scheduler.claimed, [])
+        finally:
+            scheduler.close()
+
+
+class DynamicFramesTest(unittest.TestCase):
+    """ Run a plugin list with transfers claimed from the scheduler, on a
+    single process (dynamic frames otherwise need MPI-IO). """
+
+    plugins = ['savu.plugins.filters.band_pass']*2
+    system_params = {'data_transfer_settings': {
+        'max_bytes': '4*40*16*4', 'min_bytes': '0',
+        'bytes_threshold': '4*40*16*4'}}
+
+    def test_same_as_static(self):
+        expected = tu.run_random_tomo(self.plugins,
+                                      system_params=self.system_params)
+        claim = FrameScheduler.claim
+        with mock.patch('savu.core.transports.hdf5_transport.'
+                        'is_dynamic_frame_distribution', return_value=True), \
+                mock.patch.object(FrameScheduler, 'claim', autospec=True,
+                                  side_effect=claim) as spy:
+            result = tu.run_random_tomo(self.plugins,
+                                        system_params=self.system_params)
+        self.assertTrue(spy.called)
+        self.assertEqual(sorted(result), sorted(expected))
+        for name in expected:
+            self.assertEqual(result[name].tobytes(), expected[name].tobytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
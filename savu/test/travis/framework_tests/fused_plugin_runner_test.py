@@ -0,0 +1,125 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: fused_plugin_runner_test
+   :platform: Unix
+   :synopsis: checking which consecutive plugins can be fused
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import unittest
+from unittest import mock
+
+from savu.test import test_utils as tu
+from savu.plugins.filters.band_pass import BandPass
+from savu.core.transports.hdf5_transport import Hdf5Transport
+from savu.core.fused_plugin_runner import _is_fusable_pair, FusedPluginGroup
+
+
+def pattern(name, mft=8, shape=(8, 1, 1)):
+    return {name: {'core_dims': (1, 2), 'slice_dims': (0,),
+                   'max_frames_transfer': mft, 'transfer_shape': shape}}
+
+
+def entry(in_list, out_list):
+    return {'in_datasets': [{'name': n, 'pattern': p} for n, p in in_list],
+            'out_datasets': [{'name': n, 'pattern': p} for n, p in out_list]}
+
+
+class FusedPluginRunnerTest(unittest.TestCase):
+
+    def test_same_pattern_and_name(self):
+        sino = pattern('SINOGRAM')
+        dlist = [entry([('tomo', sino)], [('tomo', sino)]),
+                 entry([('tomo', sino)], [('tomo', sino)])]
+        self.assertTrue(_is_fusable_pair(dlist, 0))
+
+    def test_different_transfer_size(self):
+        dlist = [entry([('tomo', pattern('SINOGRAM'))],
+                       [('tomo', pattern('SINOGRAM'))]),
+                 entry([('tomo', pattern('SINOGRAM', mft=4, shape=(4, 1, 1)))],
+                       [('tomo', pattern('SINOGRAM'))])]
+        self.assertFalse(_is_fusable_pair(dlist, 0))
+
+    def test_different_pattern(self):
+        dlist = [entry([('tomo', pattern('PROJECTION'))],
+                       [('tomo', pattern('PROJECTION'))]),
+                 entry([('tomo', pattern('SINOGRAM'))],
+                       [('tomo', pattern('SINOGRAM'))])]
+        self.assertFalse(_is_fusable_pair(dlist, 0))
+
+    def test_intermediate_required_later(self):
+        sino = pattern('SINOGRAM')
+        dlist = [entry([('tomo', sino)], [('tmp', sino)]),
+                 entry([('tmp', sino)], [('tomo', sino)]),
+                 entry([('tmp', sino)], [('out', sino)])]
+        self.assertFalse(_is_fusable_pair(dlist, 0))
+
+    def test_intermediate_is_final_result(self):
+        sino = pattern('SINOGRAM')
+        dlist = [entry([('tomo', sino)], [('tmp', sino)]),
+                 entry([('tmp', sino)], [('out', sino)])]
+        self.assertFalse(_is_fusable_pair(dlist, 0))
+
+    def test_multiple_datasets(self):
+        sino = pattern('SINOGRAM')
+        dlist = [entry([('tomo', sino)], [('tomo', sino), ('extra', sino)]),
+                 entry([('tomo', sino)], [('tomo', sino)])]
+        self.assertFalse(_is_fusable_pair(dlist, 0))
+
+    def test_same_as_unfused(self):
+        plugins = ['savu.plugins.filters.band_pass'] * 2
+        data = [{'blur_width': [0, 1, 1]}, {'blur_width': [0, 2, 2]}]
+        execute = FusedPluginGroup._execute
+        with mock.patch.object(FusedPluginGroup, '_execute', autospec=True,
+                               side_effect=execute) as fused:
+            expected = tu.run_random_tomo(
+                plugins, data=data, system_params={'fuse_plugins': False})
+            fused.assert_not_called()
+            result = tu.run_random_tomo(
+                plugins, data=data, system_params={'fuse_plugins': True})
+        groups = set(call[0][0] for call in fused.call_args_list)
+        self.assertEqual(len(groups), 1)
+        self.assertFalse(groups.pop().fallback)
+        self.assertEqual(sorted(result), sorted(expected))
+        for name in expected:
+            self.assertEqual(result[name].dtype, expected[name].dtype)
+            self.assertEqual(result[name].tobytes(), expected[name].tobytes())
+
+    def test_killed_before_post_process(self):
+        plugins = ['savu.plugins.filters.band_pass'] * 2
+        execute = FusedPluginGroup._execute
+        params = {'fuse_plugins': True, 'checkpoint_interval': 0}
+        with mock.patch.object(FusedPluginGroup, '_execute', autospec=True,
+                               side_effect=execute) as fused, \
+                mock.patch.object(Hdf5Transport, '_transport_kill_signal',
+                                  return_value=True), \
+                mock.patch.object(BandPass, 'post_process') as post_process, \
+                mock.patch.object(FusedPluginGroup,
+                                  '_FusedPluginGroup__finalise_plugins') \
+                as finalise:
+            tu.run_random_tomo(plugins, system_params=params)
+        group = fused.call_args_list[0][0][0]
+        self.assertTrue(group.killed)
+        # the run stops with the group
+        self.assertEqual(len(fused.call_args_list), 1)
+        post_process.assert_not_called()
+        finalise.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
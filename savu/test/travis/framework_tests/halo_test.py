@@ -0,0 +1,100 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: halo_test
+   :platform: Unix
+   :synopsis: checking padded transfers that reuse the halo of the previous \
+   transfer are the same as plain padded reads from file
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import unittest
+import numpy as np
+from unittest import mock
+
+from savu.test import test_utils as tu
+from savu.plugins.filters.band_pass import BandPass
+from savu.data.transport_data.slice_lists import GlobalData
+
+
+def plain_padded_read(gdata, slice_list):
+    """ Read the whole transfer from file and pad it with np.pad. """
+    shape = gdata.data.data.shape
+    slice_list = list(slice_list)
+    pad_list = [[0, 0] for sl in slice_list]
+    for dim, sl in enumerate(slice_list):
+        start, stop = sl.start, sl.stop
+        if start < 0:
+            pad_list[dim][0], start = -start, 0
+        if stop > shape[dim]:
+            pad_list[dim][1], stop = stop - shape[dim], shape[dim]
+        slice_list[dim] = slice(start, stop, sl.step)
+    data = np.asarray(gdata.data.data[tuple(slice_list)])
+    return np.pad(data, pad_list, mode=gdata.pData.padding.mode)
+
+
+class HaloTest(unittest.TestCase):
+
+    def __run(self, pad):
+        """ Run a plugin with padding over several transfers, checking each
+        padded transfer against a plain padded read, and returning the number
+        of transfers that reused a halo. """
+        padded_reads = []
+        overlaps = []
+        get_padded_data = GlobalData._get_padded_data
+        get_overlap = GlobalData._GlobalData__get_halo_overlap
+
+        def set_padding(plugin, in_data, out_data):
+            in_data[0].padding = {'pad_multi_frames': pad}
+            out_data[0].padding = {'pad_multi_frames': pad}
+
+        def read(gdata, slice_list, end=False):
+            data = get_padded_data(gdata, slice_list, end=end)
+            padded_reads.append(
+                (np.array(data), plain_padded_read(gdata, slice_list)))
+            return data
+
+        def overlap(gdata, *args):
+            overlaps.append(get_overlap(gdata, *args))
+            return overlaps[-1]
+
+        system_params = {'data_transfer_settings': {
+            'max_bytes': '4*40*16*4', 'min_bytes': '0',
+            'bytes_threshold': '4*40*16*4'}}
+        with mock.patch.object(BandPass, 'set_filter_padding', autospec=True,
+                               side_effect=set_padding), \
+                mock.patch.object(GlobalData, '_get_padded_data',
+                                  autospec=True, side_effect=read), \
+                mock.patch.object(GlobalData, '_GlobalData__get_halo_overlap',
+                                  autospec=True, side_effect=overlap):
+            tu.run_random_tomo(['savu.plugins.filters.band_pass'],
+                               system_params=system_params)
+        self.assertGreater(len(padded_reads), 2)
+        for data, expected in padded_reads:
+            self.assertEqual(data.shape, expected.shape)
+            self.assertEqual(data.tobytes(), expected.tobytes())
+        return sum(n > 0 for n in overlaps)
+
+    def test_single_frame_padding(self):
+        self.assertGreater(self.__run(1), 0)
+
+    def test_multi_frame_padding(self):
+        self.assertGreater(self.__run(3), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: hdf5_compression_test
+   :platform: Unix
+   :synopsis: checking the hdf5_compression system parameters are applied to \
+   the output datasets
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import h5py
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from savu.data.meta_data import MetaData
+from savu.plugins.savers.utils.hdf5_utils import Hdf5Utils
+
+
+class Experiment(object):
+    """ The parts of an experiment used to create the output datasets. """
+
+    def __init__(self, compression, mpi=False, collective=False):
+        self.meta_data = MetaData({
+            'system_params': {'mpi-io_settings': {},
+                              'hdf5_compression': compression},
+            'mpi': mpi, 'collective_writes': collective, 'nPlugin': 0,
+            'process': 0,
+            'link_type': {'tomo': 'final_result', 'tmp': 'intermediate'}})
+
+    def _get_collection(self):
+        return {'plugin_dict': [{'name': 'PaganinFilter'}]}
+
+
+class Hdf5CompressionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def __write(self, compression, name='tomo'):
+        """ Write and read back a chunked dataset, returning the data and the
+        filters in the file. """
+        hdf5 = Hdf5Utils(Experiment(compression))
+        filename = os.path.join(self.folder, name + '.h5')
+        data = np.tile(np.arange(32, dtype=np.float32), (16, 8, 1))
+        with h5py.File(filename, 'w') as f:
+            dataset = hdf5.create_dataset_nofill(
+                f, 'data', data.shape, data.dtype, chunks=(4, 8, 32),
+                compression=hdf5._get_compression(name))
+            dataset[...] = data
+        with h5py.File(filename, 'r') as f:
+            plist = f['data'].id.get_create_plist()
+            filters = [plist.get_filter(i)[0]
+                       for i in range(plist.get_nfilters())]
+            np.testing.assert_array_equal(f['data'][...], data)
+            nbytes = f['data'].id.get_storage_size()
+        return filters, nbytes
+
+    def test_gzip(self):
+        filters, nbytes = self.__write({'filter': 'gzip', 'level': 4})
+        self.assertEqual(filters, [h5py.h5z.FILTER_SHUFFLE,
+                                   h5py.h5z.FILTER_DEFLATE])
+        self.assertLess(nbytes, 16*8*32*4)
+
+    def test_lzf_without_shuffle(self):
+        filters, _ = self.__write({'filter': 'lzf', 'shuffle': False})
+        self.assertEqual(filters, [h5py.h5z.FILTER_LZF])
+
+    def test_off(self):
+        self.assertEqual(self.__write({'filter': 'none'})[0], [])
+        self.assertEqual(self.__write({})[0], [])
+
+    def test_selected_datasets(self):
+        compression = {'filter': 'gzip', 'datasets': 'intermediate'}
+        self.assertEqual(self.__write(compression, name='tomo')[0], [])
+        self.assertIn(h5py.h5z.FILTER_DEFLATE,
+                      self.__write(compression, name='tmp')[0])
+
+    def test_overrides(self):
+        compression = {'filter': 'gzip',
+                       'plugins': {'PaganinFilter': {'filter': 'lzf'}},
+                       'names': {'tmp': {'filter': 'none'}}}
+        self.assertIn(h5py.h5z.FILTER_LZF, self.__write(compression)[0])
+        self.assertEqual(self.__write(compression, name='tmp')[0], [])
+
+    def test_mpi_without_collective_writes(self):
+        compression = {'filter': 'gzip'}
+        hdf5 = Hdf5Utils(Experiment(compression, mpi=True))
+        with self.assertRaises(ValueError):
+            hdf5._check_compression()
+        with self.assertRaises(ValueError):
+            hdf5._get_compression('tomo')
+        hdf5 = Hdf5Utils(Experiment(compression, mpi=True, collective=True))
+        if h5py.version.hdf5_version_tuple >= (1, 10, 2):
+            hdf5._check_compression()
+            self.assertEqual(hdf5._get_compression('tomo')['filter'], 'gzip')
+
+    def test_mpi_filter_override(self):
+        # a filter set only for one dataset is checked up front
+        compression = {'filter': 'none', 'names': {'tmp': {'filter': 'lzf'}}}
+        hdf5 = Hdf5Utils(Experiment(compression, mpi=True))
+        with self.assertRaises(ValueError):
+            hdf5._check_compression()
+        compression = {'filter': 'none', 'plugins': {'PaganinFilter': None}}
+        Hdf5Utils(Experiment(compression, mpi=True))._check_compression()
+
+
+if __name__ == "__main__":
+    unittest.main()
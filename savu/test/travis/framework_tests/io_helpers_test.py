@@ -0,0 +1,79 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: io_helpers_test
+   :platform: Unix
+   :synopsis: checking idle processes are paired with those running a plugin \
+   and the messages between them
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import copy
+import unittest
+import collections
+import numpy as np
+
+from savu.core.io_helpers import IoChannel, pair_ranks, DATA
+
+
+class Comm(object):
+    """ Point-to-point messages between ranks in a single process. """
+
+    def __init__(self, rank, queues):
+        self.rank = rank
+        self.queues = queues
+
+    def send(self, obj, dest, tag):
+        self.queues[(self.rank, dest, tag)].append(copy.deepcopy(obj))
+
+    def recv(self, source, tag):
+        return self.queues[(source, self.rank, tag)].popleft()
+
+    def Send(self, buf, dest, tag):
+        self.send(buf, dest, tag)
+
+    def Recv(self, buf, source, tag):
+        buf[...] = self.recv(source, tag)
+
+
+class IoHelpersTest(unittest.TestCase):
+
+    def test_pair_ranks(self):
+        hosts = ['a', 'a', 'b', 'b', 'a', 'b']
+        # GPU processes on ranks 0 and 2, with idle ranks on the same node
+        self.assertEqual(pair_ranks([0, 2], [1, 3, 4, 5], hosts),
+                         {0: 1, 2: 3})
+        # no idle ranks left on node b
+        self.assertEqual(pair_ranks([2, 3, 5], [0, 1, 4], hosts),
+                         {2: 0, 3: 1, 5: 4})
+        self.assertEqual(pair_ranks([0, 1, 2], [3, 4], hosts), {})
+
+    def test_channel(self):
+        queues = collections.defaultdict(collections.deque)
+        helper = IoChannel(Comm(1, queues), 0, serving=True)
+        compute = IoChannel(Comm(0, queues), 1)
+        data = np.arange(24, dtype=np.float32).reshape(2, 3, 4)
+        helper.send(DATA, {'count': 3, 'written': [1, 2]},
+                    [data[:, 1:], None])
+        header, arrays = compute.recv(DATA)
+        self.assertEqual(header, {'count': 3, 'written': [1, 2]})
+        np.testing.assert_array_equal(arrays[0], data[:, 1:])
+        self.assertIsNone(arrays[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: lazy_file_creation_test
+   :platform: Unix
+   :synopsis: checking the output files created as each plugin runs have the \
+   same layout as those created before the plugin list runs
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import h5py
+import unittest
+import numpy as np
+from unittest import mock
+
+from savu.test import test_utils as tu
+from savu.plugins.filters.band_pass import BandPass
+from savu.core.transports.hdf5_transport import Hdf5Transport
+
+
+def get_layout(folder):
+    """ The groups, datasets (with their shape, dtype, chunks, filters and
+    data), attributes and links of each hdf5 file in the folder. """
+    layout = {}
+    for name in sorted(os.listdir(folder)):
+        if os.path.splitext(name)[1] not in ['.h5', '.nxs']:
+            continue
+        entries = {}
+
+        def visit(path, obj):
+            link = obj.parent.get(path.split('/')[-1], getlink=True)
+            if isinstance(link, h5py.ExternalLink):
+                entries[path] = ('link', link.filename, link.path)
+                return
+            attrs = {k: str(v) for k, v in obj.attrs.items()}
+            if isinstance(obj, h5py.Dataset):
+                entries[path] = (
+                    'dataset', obj.shape, obj.dtype.str, obj.chunks,
+                    obj.compression, attrs, np.asarray(obj[()]).tobytes())
+            else:
+                entries[path] = ('group', attrs)
+
+        with h5py.File(os.path.join(folder, name), 'r') as f:
+            f.visititems(visit)
+        layout[name] = entries
+    return layout
+
+
+class LazyFileCreationTest(unittest.TestCase):
+
+    plugins = ['savu.plugins.filters.band_pass']*3
+
+    def __run(self, eager=False):
+        """ Run the plugins, returning the layout of the output files and the
+        files that existed while the first plugin was processing. """
+        layouts = []
+        existing = set()
+        pre_plugin_list_run = Hdf5Transport._transport_pre_plugin_list_run
+        process_frames = BandPass.process_frames
+
+        def create_all(transport):
+            # the files of all plugins are created up front, as when
+            # restarting from a checkpoint
+            pre_plugin_list_run(transport)
+            if eager:
+                for i in range(len(transport.exp_coll['datasets'])):
+                    transport.exp._set_experiment_for_current_plugin(i)
+                    transport._Hdf5Transport__create_files(i)
+
+        def keep_files(plugin, data):
+            if plugin.exp.meta_data.get('nPlugin') == 0:
+                existing.update(os.listdir(
+                    plugin.exp.meta_data.get('out_path')))
+            return process_frames(plugin, data)
+
+        def get_results(exp):
+            layouts.append(get_layout(exp.meta_data.get('out_path')))
+            return {}
+
+        with mock.patch.object(Hdf5Transport,
+                               '_transport_pre_plugin_list_run',
+                               autospec=True, side_effect=create_all), \
+                mock.patch.object(BandPass, 'process_frames', autospec=True,
+                                  side_effect=keep_files), \
+                mock.patch.object(tu, 'get_final_results',
+                                  side_effect=get_results):
+            tu.run_random_tomo(self.plugins)
+        return layouts[0], existing
+
+    def test_layout(self):
+        layout, existing = self.__run()
+        expected, existing_eager = self.__run(eager=True)
+        self.assertEqual(sorted(layout), sorted(expected))
+        for name in expected:
+            self.assertEqual(sorted(layout[name]), sorted(expected[name]))
+            for path in expected[name]:
+                self.assertEqual(layout[name][path], expected[name][path],
+                                 msg="%s: %s" % (name, path))
+        # the files of later plugins are only created when they run
+        plugin_files = sorted(f for f in layout if f.startswith('tomo_p'))
+        self.assertEqual(len(plugin_files), len(self.plugins))
+        self.assertTrue(set(plugin_files).issubset(existing_eager))
+        self.assertEqual(set(plugin_files) & existing, {plugin_files[0]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: lazy_slice_list_test
+   :platform: Unix
+   :synopsis: checking the slice lists created on demand by LazySliceList, \
+   and that they match the slice lists grouped eagerly
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import unittest
+import numpy as np
+from unittest import mock
+
+from savu.test import test_utils as tu
+from savu.plugins.filters.band_pass import BandPass
+from savu.data.transport_data.slice_lists import LazySliceList, GlobalData, \
+    LocalData
+
+
+class LazySliceListTest(unittest.TestCase):
+
+    def __get_3d(self, max_frames, pad=None):
+        core = slice(0, 4, 1)
+        return LazySliceList([slice(None), core, core], [0], [(0, 1, 10)],
+                             {0: 1}, max_frames, 10, pad=pad)
+
+    def test_grouping(self):
+        sl = self.__get_3d(4)
+        self.assertEqual(len(sl), 3)
+        self.assertEqual(sl[0][0], slice(0, 4, 1))
+        self.assertEqual(sl[2][0], slice(8, 10, 1))
+        self.assertEqual(sl[1][1:], (slice(0, 4, 1), slice(0, 4, 1)))
+
+    def test_pad_last_in_bank(self):
+        sl = self.__get_3d(4, pad=[2, 0, 0])
+        self.assertEqual(sl[1][0], slice(4, 8, 1))
+        self.assertEqual(sl[-1][0], slice(8, 12, 1))
+
+    def test_view(self):
+        sl = self.__get_3d(2)
+        view = sl[1:4]
+        self.assertEqual(len(view), 3)
+        self.assertEqual(list(view), [sl[1], sl[2], sl[3]])
+        self.assertEqual(view[-1], sl[3])
+
+    def test_multiple_slice_dims(self):
+        # dimension 0 changes fastest, grouped in banks of one row
+        sl = LazySliceList([slice(None)]*3, [0, 1], [(0, 1, 3), (2, 2, 2)],
+                           {0: 1, 1: 2}, 2, 3)
+        self.assertEqual(len(sl), 4)
+        self.assertEqual(sl[0][:2], (slice(0, 2, 1), slice(2, 3, 2)))
+        self.assertEqual(sl[1][:2], (slice(2, 3, 1), slice(2, 3, 2)))
+        self.assertEqual(sl[2][:2], (slice(0, 2, 1), slice(4, 5, 2)))
+
+    def test_padding_directions(self):
+        sl = self.__get_3d(5)._pad(0, -2, 2, 10)._pad(2, 0, 1, 4)
+        self.assertEqual(sl[0][0], slice(-2, 7, 1))
+        self.assertEqual(sl[1][2], slice(0, 5, 1))
+
+
+def get_eager_local_slice_list(ldata):
+    """ The process slice list grouped from the list of single frames. """
+    slice_dirs = ldata.data.get_slice_dimensions()
+    ldata.sdir = slice_dirs[0] if len(slice_dirs) > 0 else None
+    shape = ldata.pData.get_shape_transfer()
+    return ldata._group_slice_list_in_one_dimension(
+        ldata._get_local_single_slice_list(shape),
+        ldata.pData.meta_data.get('max_frames_process'), ldata.sdir)
+
+
+class LazyEagerTest(unittest.TestCase):
+    """ The slice lists of each dataset of a run, created lazily, are the
+    same as those grouped eagerly from the lists of single frames. """
+
+    def __compare(self, lazy, eager):
+        self.assertEqual(sorted(lazy), sorted(eager))
+        for key in lazy:
+            if isinstance(lazy[key], np.ndarray):
+                self.assertEqual(lazy[key].tolist(), eager[key].tolist())
+            else:
+                self.assertEqual(list(lazy[key]), list(eager[key]), msg=key)
+                self.nLazy += isinstance(lazy[key], LazySliceList)
+
+    def __run(self, plugins, pad=0, max_bytes=None, preview=None):
+        self.nLazy = 0
+        get_global_dict = GlobalData._get_dict
+        get_local_dict = LocalData._get_dict
+
+        def global_dict(gdata, *args):
+            lazy = get_global_dict(gdata, *args)
+            with mock.patch.object(GlobalData, '_get_lazy_slice_list',
+                                   return_value=None):
+                self.__compare(lazy, get_global_dict(gdata, *args))
+            return lazy
+
+        def local_dict(ldata):
+            lazy = get_local_dict(ldata)
+            with mock.patch.object(LocalData, '_get_slice_list',
+                                   autospec=True,
+                                   side_effect=get_eager_local_slice_list):
+                self.__compare(lazy, get_local_dict(ldata))
+            return lazy
+
+        def set_padding(plugin, in_data, out_data):
+            if pad:
+                in_data[0].padding = {'pad_multi_frames': pad}
+                out_data[0].padding = {'pad_multi_frames': pad}
+
+        system_params = {'data_transfer_settings': {
+            'max_bytes': max_bytes, 'min_bytes': '0',
+            'bytes_threshold': max_bytes}} if max_bytes else None
+        with mock.patch.object(GlobalData, '_get_dict', autospec=True,
+                               side_effect=global_dict), \
+                mock.patch.object(LocalData, '_get_dict', autospec=True,
+                                  side_effect=local_dict), \
+                mock.patch.object(BandPass, 'set_filter_padding',
+                                  autospec=True, side_effect=set_padding):
+            tu.run_random_tomo(plugins, system_params=system_params,
+                               preview=preview)
+        self.assertGreater(self.nLazy, 0)
+
+    def test_patterns(self):
+        self.__run(['savu.plugins.filters.band_pass',
+                    'savu.plugins.ring_removal.ring_removal_sorting'],
+                   max_bytes='4*40*16*4')
+
+    def test_padding(self):
+        self.__run(['savu.plugins.filters.band_pass'], pad=2,
+                   max_bytes='4*40*16*4')
+
+    def test_preview(self):
+        self.__run(['savu.plugins.filters.band_pass',
+                    'savu.plugins.ring_removal.ring_removal_sorting'],
+                   preview=['1:39:3', '2:11', ':'], max_bytes='4*40*16*4')
+
+
+if __name__ == "__main__":
+    unittest.main()
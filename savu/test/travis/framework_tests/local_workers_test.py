@@ -0,0 +1,102 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: local_workers_test
+   :platform: Unix
+   :synopsis: checking LocalWorkers gives the same results as processing the \
+   frames in order
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import unittest
+import contextlib
+import numpy as np
+
+from savu.test import test_utils as tu
+from savu.core.local_workers import LocalWorkers
+
+
+class Pool(object):
+
+    def transfer(self, count):
+        return contextlib.nullcontext()
+
+
+class Transport(object):
+    """ The parts of a transport used to process a frame. """
+
+    def __init__(self, pDict):
+        self.pool = Pool()
+        self.pDict = pDict
+
+    def _get_input_data(self, plugin, tdata, i, count):
+        return [tdata[0][self.pDict['in_sl']['process'][i][0]]]
+
+    def _get_output_data(self, result, i):
+        return result if isinstance(result, list) else [result]
+
+
+class Stats(object):
+    calc_stats = True
+    stats = None
+
+
+class Plugin(object):
+    name = 'TestPlugin'
+
+    def __init__(self):
+        self.pcount = 0
+        self.stats_obj = Stats()
+
+    def plugin_process_frames(self, data):
+        return data[0]*2 + self.pcount
+
+
+class LocalWorkersTest(unittest.TestCase):
+
+    def test_same_as_in_order(self):
+        nFrames = 10
+        sl = [[(slice(i, i + 1), slice(None))] for i in range(nFrames)]
+        pDict = {'in_sl': {'process': sl}, 'out_sl': {'process': sl},
+                 'nOut': [0]}
+        plugin = Plugin()
+        tdata = [np.arange(nFrames*5, dtype=np.float32).reshape(nFrames, 5)]
+        expected = tdata[0]*2 + np.arange(nFrames)[:, None]
+
+        workers = LocalWorkers(Transport(pDict), plugin, pDict, 3)
+        try:
+            result = [np.zeros_like(tdata[0])]
+            self.assertTrue(workers.process(0, list(range(nFrames)), tdata,
+                                            result))
+            np.testing.assert_array_equal(result[0], expected)
+            self.assertEqual(plugin.pcount, nFrames)
+        finally:
+            workers.close()
+
+    def test_same_as_hdf5_transport(self):
+        # BandPass is process_safe, so its frames go to the workers
+        plugins = ['savu.plugins.filters.band_pass']
+        expected = tu.run_random_tomo(plugins)
+        local = tu.run_random_tomo(plugins, workers=3)
+        self.assertTrue(expected)
+        self.assertEqual(sorted(local), sorted(expected))
+        for name in expected:
+            self.assertEqual(local[name].dtype, expected[name].dtype)
+            self.assertEqual(local[name].tobytes(), expected[name].tobytes())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: metadata_writer_test
+   :platform: Unix
+   :synopsis: checking metadata is written, and rewritten only when changed, \
+   by MetadataWriter
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import h5py
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from savu.core.metadata_writer import MetadataWriter
+
+
+class MetadataWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'meta.h5')
+        self.mdict = {'angles': np.linspace(0, 180, 5), 'name': 'test',
+                      'shifts': [1, 2, 3], 'labels': ['a', 'b'],
+                      'nested': {'a': 1}}
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def __write(self, writer):
+        with h5py.File(self.filename, 'a') as f:
+            writer.write_dict(f.require_group('meta_data'), self.mdict)
+
+    def test_values(self):
+        self.__write(MetadataWriter())
+        with h5py.File(self.filename, 'r') as f:
+            entry = f['meta_data']
+            self.assertTrue(np.array_equal(entry['angles/angles'][()],
+                                           self.mdict['angles']))
+            self.assertEqual(entry['name/name'][()], b'test')
+            self.assertTrue(np.array_equal(entry['shifts/shifts'][()],
+                                           [1, 2, 3]))
+            self.assertEqual(entry['labels/labels'][0], b'["a", "b"]')
+            self.assertEqual(entry['nested/a/a'][()], 1)
+
+    def test_changes(self):
+        writer = MetadataWriter()
+        self.__write(writer)
+        with h5py.File(self.filename, 'a') as f:
+            # a value that is unchanged is not written again
+            f['meta_data/name/name'][...] = 'other'
+        self.mdict['angles'] = self.mdict['angles'] + 1
+        self.mdict['shifts'] = [1, 2]
+        del self.mdict['labels']
+        self.__write(writer)
+        with h5py.File(self.filename, 'r') as f:
+            entry = f['meta_data']
+            self.assertEqual(entry['name/name'][()], b'other')
+            self.assertEqual(entry['angles/angles'][-1], 181)
+            self.assertEqual(entry['shifts/shifts'].shape, (2,))
+            self.assertNotIn('labels', entry)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: parameter_sweep_test
+   :platform: Unix
+   :synopsis: checking single read parameter sweeps give the same results as \
+   running the plugin once per value
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import unittest
+
+from savu.data.meta_data import MetaData
+from savu.test import test_utils as tu
+from savu.plugins.driver.plugin_driver import is_single_read_sweep
+
+
+class Experiment(object):
+
+    def __init__(self, system_params, transport='hdf5'):
+        self.meta_data = MetaData({'system_params': system_params,
+                                   'transport': transport})
+
+
+class ParameterSweepTest(unittest.TestCase):
+
+    def test_repeat_by_default(self):
+        self.assertFalse(is_single_read_sweep(Experiment({})))
+        self.assertTrue(is_single_read_sweep(
+            Experiment({'parameter_sweep': 'single_read'})))
+        self.assertFalse(is_single_read_sweep(
+            Experiment({'parameter_sweep': 'single_read'}, 'basic')))
+
+    def test_same_as_repeat(self):
+        plugins = ['savu.plugins.filters.band_pass']
+        data = [{'type': 'High;Low'}]
+        expected = tu.run_random_tomo(
+            plugins, data=data, system_params={'parameter_sweep': 'repeat'})
+        result = tu.run_random_tomo(
+            plugins, data=data,
+            system_params={'parameter_sweep': 'single_read'})
+        self.assertTrue(expected)
+        self.assertEqual(sorted(result), sorted(expected))
+        for name in expected:
+            # one index of the parameter dimension for each value
+            self.assertEqual(expected[name].shape[-1], 2)
+            self.assertNotEqual(expected[name][..., 0].tobytes(),
+                                expected[name][..., 1].tobytes())
+            self.assertEqual(result[name].dtype, expected[name].dtype)
+            self.assertEqual(result[name].tobytes(), expected[name].tobytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
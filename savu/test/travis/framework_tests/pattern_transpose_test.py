@@ -0,0 +1,125 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: pattern_transpose_test
+   :platform: Unix
+   :synopsis: checking the block arithmetic and in memory reads used to \
+   redistribute data between patterns
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import unittest
+import numpy as np
+from unittest import mock
+from mpi4py import MPI
+
+from savu.data.meta_data import MetaData
+from savu.core.pattern_transpose import TransposedDataset, _get_box, \
+    _get_bounding_box, _intersect, _get_volume, _alltoallv, \
+    is_pattern_transpose, is_transpose_required
+
+
+class Experiment(object):
+    """ The parts of an experiment used to decide on a transpose, with a
+    PROJECTION writer followed by a SINOGRAM reader. """
+
+    def __init__(self, reader, system_params=None):
+        self.meta_data = MetaData({
+            'system_params': system_params or {}, 'nPlugin': 0,
+            'transport': 'hdf5', 'mpi': True, 'processes': ['CPU0', 'CPU1'],
+            'iterate_groups': [],
+            'current_and_next': {'tomo': {
+                'current': {'PROJECTION': {'slice_dims': (0,)}},
+                'next': {'SINOGRAM': {'slice_dims': (1,)}}}}})
+        self.meta_data.plugin_list = mock.Mock(plugin_list=[
+            {'id': 'loader'}, {'id': 'writer'}, {'id': reader}])
+        self.meta_data.plugin_list._get_n_loaders.return_value = 1
+        self.meta_data.plugin_list._get_datasets_list.return_value = [
+            {'in_datasets': [], 'out_datasets': [{'name': 'tomo'}]},
+            {'in_datasets': [{'name': 'tomo'}], 'out_datasets': []}]
+
+
+class PatternTransposeTest(unittest.TestCase):
+
+    def test_box_is_clipped(self):
+        sl = (slice(-2, 5, 1), slice(None), slice(3, 12, None))
+        self.assertEqual(_get_box(sl, (10, 4, 10)), ((0, 5), (0, 4), (3, 10)))
+
+    def test_stepped_slices_are_not_boxes(self):
+        self.assertIsNone(_get_box((slice(0, 10, 2), slice(None)), (10, 4)))
+        self.assertIsNone(_get_box((slice(0, 10),), (10, 4)))
+
+    def test_intersect_and_bound(self):
+        b1 = ((0, 4), (0, 10))
+        b2 = ((2, 8), (5, 6))
+        self.assertEqual(_intersect(b1, b2), ((2, 4), (5, 6)))
+        self.assertIsNone(_intersect(b1, ((4, 8), (0, 10))))
+        self.assertEqual(_get_bounding_box([b1, None, b2]), ((0, 8), (0, 10)))
+        self.assertEqual(_get_volume(b2), 6)
+
+    def test_transposed_reads(self):
+        dataset = np.arange(60, dtype=np.float32).reshape(3, 4, 5)
+        box = ((0, 3), (1, 3), (0, 5))
+        block = np.array(dataset[:, 1:3, :])
+        data = TransposedDataset(dataset, box, block)
+        inside = (slice(0, 3), slice(2, 3), slice(1, 4))
+        outside = (slice(0, 3), slice(0, 2), slice(None))
+        np.testing.assert_array_equal(data[inside], dataset[inside])
+        np.testing.assert_array_equal(data[outside], dataset[outside])
+        self.assertEqual(data.shape, dataset.shape)
+        block[:] = -1
+        self.assertTrue((data[inside] == -1).all())
+        self.assertTrue((data[outside] >= 0).all())
+
+    def test_alltoallv_single_process(self):
+        send = [np.arange(10, dtype=np.uint8)]
+        recv = _alltoallv(MPI.COMM_SELF, send, [10])
+        np.testing.assert_array_equal(recv[0], send[0])
+
+
+class TransposeRequiredTest(unittest.TestCase):
+
+    cpu = 'savu.plugins.filters.band_pass'
+    gpu = 'savu.plugins.driver.gpu_plugin'
+    threaded = 'savu.plugins.driver.multi_threaded_plugin'
+
+    def __required(self, reader, comm=MPI.COMM_WORLD):
+        data = mock.Mock(dtype=np.float32)
+        data.get_name.return_value = 'tomo'
+        data.get_shape.return_value = (4, 4, 4)
+        return is_transpose_required(Experiment(reader), data, comm)
+
+    def test_off_by_default(self):
+        self.assertFalse(is_pattern_transpose(Experiment(self.cpu)))
+        self.assertTrue(is_pattern_transpose(
+            Experiment(self.cpu, {'pattern_transpose': 'auto'})))
+
+    def test_cpu_reader(self):
+        self.assertTrue(self.__required(self.cpu))
+
+    def test_subset_reader(self):
+        self.assertFalse(self.__required(self.gpu))
+        self.assertFalse(self.__required(self.threaded))
+
+    def test_subset_writer(self):
+        comm = MPI.COMM_WORLD.Dup()
+        self.assertFalse(self.__required(self.cpu, comm))
+        comm.Free()
+
+
+if __name__ == "__main__":
+    unittest.main()
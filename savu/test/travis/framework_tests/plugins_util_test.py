@@ -27,6 +27,7 @@ import savu
 import os
 
 from savu.plugins import utils as pu
+import savu.plugins.loaders.utils.yaml_utils as yu
 from savu.plugins import plugin as test_plugin
 
 
@@ -212,6 +213,15 @@ class PluginsUtilTest(unittest.TestCase):
         _int = pu._str_to_int(_str)
         self.assertEqual(_int, "a")
 
+    def test_system_params_booleans(self):
+        """ Reading plugin parameters keeps on/off as strings, which must
+        not change the booleans of the system parameters. """
+        self.assertEqual(pu._dumps("off"), "off")
+        sys_file = os.path.join(os.path.dirname(savu.__path__[0]),
+                                'system_files', 'dls', 'system_parameters.yml')
+        params = yu.read_system_params(sys_file)
+        self.assertIs(params['fuse_plugins'], False)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,111 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: result_cache_test
+   :platform: Unix
+   :synopsis: checking plugin results are stored, found and evicted by \
+   ResultCache
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from savu.test import test_utils as tu
+from savu.plugins.filters.band_pass import BandPass
+from savu.core.result_cache import ResultCache, copy_file
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = ResultCache(os.path.join(self.folder, 'cache'), 1e9)
+        os.makedirs(self.cache.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def __output_file(self, name, nbytes=100):
+        filename = os.path.join(self.folder, name + '.h5')
+        with open(filename, 'wb') as f:
+            f.write(b'\0'*nbytes)
+        return filename
+
+    def test_store_and_lookup(self):
+        self.assertIsNone(self.cache.lookup('a'))
+        filename = self.__output_file('tomo')
+        self.cache.store('a', {'tomo': filename}, {'out_data': {'tomo': {}}})
+        entry = self.cache.lookup('a')
+        self.assertIsNotNone(entry)
+        self.assertEqual(self.cache.get_metadata(entry),
+                         {'out_data': {'tomo': {}}})
+
+        # the output file and the cached file are independent
+        cached = self.cache.get_file(entry, 'tomo')
+        os.remove(filename)
+        copy_file(cached, filename)
+        self.assertEqual(os.path.getsize(filename), 100)
+        with open(filename, 'r+b') as f:
+            f.write(b'\1'*10)
+        with open(cached, 'rb') as f:
+            self.assertEqual(f.read(), b'\0'*100)
+        self.assertNotEqual(os.stat(filename).st_ino, os.stat(cached).st_ino)
+
+    def test_least_recently_used_evicted(self):
+        self.cache.max_bytes = 250
+        for key in ['a', 'b']:
+            self.cache.store(key, {'tomo': self.__output_file(key)}, {})
+            time.sleep(0.01)
+        # a later run uses 'a', then stores 'c'
+        cache = ResultCache(self.cache.folder, 250)
+        cache.lookup('a')
+        time.sleep(0.01)
+        cache.store('c', {'tomo': self.__output_file('c')}, {})
+        self.assertIsNotNone(cache.lookup('a'))
+        self.assertIsNone(cache.lookup('b'))
+        self.assertIsNotNone(cache.lookup('c'))
+
+    def test_cached_files_unchanged_by_reuse(self):
+        plugins = ['savu.plugins.filters.band_pass']*2
+        params = {'result_cache_path': self.cache.folder}
+        expected = tu.run_random_tomo(plugins, system_params=params)
+        cached = {}
+        for key in os.listdir(self.cache.folder):
+            for name in os.listdir(os.path.join(self.cache.folder, key)):
+                path = os.path.join(self.cache.folder, key, name)
+                with open(path, 'rb') as f:
+                    cached[path] = f.read()
+        self.assertTrue(cached)
+
+        # the results are copied from the cache rather than recomputed
+        with mock.patch.object(BandPass, 'process_frames') as process:
+            result = tu.run_random_tomo(plugins, system_params=params)
+        self.assertFalse(process.called)
+        for name in expected:
+            self.assertEqual(result[name].tobytes(), expected[name].tobytes())
+        for path, contents in cached.items():
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), contents, path)
+
+
+if __name__ == "__main__":
+    unittest.main()
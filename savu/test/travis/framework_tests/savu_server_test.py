@@ -0,0 +1,111 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: savu_server_test
+   :platform: Unix
+   :synopsis: checking the plugin chain keys and shared memory frames of the \
+   plugin server
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import numpy as np
+
+import savu
+from scripts.dawn_runner.run_savu import runSavu
+from scripts.dawn_runner.savu_server import chain_key, SharedBlock, \
+    Attached, PluginServer, SavuClient, _new_persistence
+
+
+class SavuServerTest(unittest.TestCase):
+
+    def test_chain_key(self):
+        chain = [('/plugins/a.py', {'x': {'value': 1}})]
+        inputs = {'dataset_name': 'data', 'xaxis': np.arange(4),
+                  'xaxis_title': 'x'}
+        key = chain_key(chain, inputs, (4, 5), np.float32)
+        self.assertEqual(key, chain_key(chain, dict(inputs), [4, 5], 'f4'))
+        others = [
+            ([('/plugins/a.py', {'x': {'value': 2}})], inputs, (4, 5), 'f4'),
+            (chain, dict(inputs, xaxis=np.arange(1, 5)), (4, 5), 'f4'),
+            (chain, inputs, (5, 4), 'f4'),
+            (chain, inputs, (4, 5), 'f8')]
+        for args in others:
+            self.assertNotEqual(key, chain_key(*args))
+
+    def test_shared_frames(self):
+        block, attached = SharedBlock(), Attached()
+        data = np.arange(12, dtype=np.float32).reshape(3, 4)
+        spec = block.put(data)
+        view = attached.view(spec)
+        np.testing.assert_array_equal(view, data)
+        # a smaller frame reuses the block, which is shared in place
+        frame = block.get((2, 2), np.int16)
+        frame[...] = 7
+        self.assertEqual(block.spec[0], spec[0])
+        np.testing.assert_array_equal(attached.view(block.spec), frame)
+        # a larger frame replaces it
+        block.put(np.zeros(100))
+        self.assertNotEqual(block.spec[0], spec[0])
+        del view, frame
+        attached.detach()
+        block.close()
+
+    def test_round_trip(self):
+        folder = tempfile.mkdtemp()
+        address = os.path.join(folder, 'savu.sock')
+        server = PluginServer(address)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        while not os.path.exists(address):
+            time.sleep(0.01)
+
+        path = os.path.join(savu.__path__[0], 'plugins', 'filters',
+                            'band_pass.py')
+        params = {'type': {'value': 'Low'}, 'blur_width': {'value': [0, 1, 1]}}
+        np.random.seed(0)
+        frame = np.random.rand(8, 10).astype(np.float32)
+        inputs = {'dataset_name': 'data', 'xaxis': None, 'xaxis_title': None,
+                  'yaxis': None, 'yaxis_title': None, 'data': frame}
+        expected = runSavu(path, params, False, inputs,
+                           _new_persistence(threading.Lock()))['data']
+
+        client = SavuClient(address)
+        try:
+            for _ in range(2):
+                result = client.process([(path, params)], frame)
+                np.testing.assert_array_equal(result['data'], expected)
+                self.assertEqual(len(result['latency']), 1)
+                name, seconds = result['latency'][0]
+                self.assertEqual(name, 'BandPass')
+                self.assertGreaterEqual(seconds, 0)
+            del result
+            client.stop()
+        finally:
+            client.close()
+            thread.join(10)
+            shutil.rmtree(folder)
+        self.assertFalse(thread.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: staging_test
+   :platform: Unix
+   :synopsis: checking staged backing files are migrated to the output \
+   folders, and their NeXus links updated, when a run completes or is killed
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import h5py
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from unittest import mock
+
+from savu.test import test_utils as tu
+from savu.data.meta_data import MetaData
+from savu.core.staging import FileMigrator, get_staging_folder
+
+
+class Experiment(object):
+    """ The parts of an experiment used to choose the staging folder. """
+
+    def __init__(self, staging_path):
+        self.meta_data = MetaData({
+            'system_params': {'staging_path': staging_path},
+            'transport': 'hdf5', 'mpi': True, 'out_folder': 'test'})
+        self.meta_data.plugin_list = mock.Mock(iterate_plugin_groups=[])
+
+
+class StagingTest(unittest.TestCase):
+
+    plugins = ['savu.plugins.filters.band_pass']*2
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.staging = os.path.join(self.folder, 'staging')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def __write(self, filename, data):
+        with h5py.File(filename, 'w') as f:
+            f['1-BandPass-tomo/data'] = data
+
+    def test_migrator(self):
+        out_path = os.path.join(self.folder, 'out')
+        inter_path = os.path.join(self.folder, 'inter')
+        for path in [self.staging, out_path, inter_path]:
+            os.makedirs(path)
+        nxs_filename = os.path.join(out_path, 'test.nxs')
+        entries = {'/entry/final_result_tomo/data': 'tomo_p2.h5',
+                   '/entry/intermediate/1-BandPass-tomo/data': 'tomo_p1.h5'}
+        with h5py.File(nxs_filename, 'w') as nxs_file:
+            for i, (entry, name) in enumerate(entries.items()):
+                staged = os.path.join(self.staging, name)
+                self.__write(staged, np.full((2, 3), i))
+                nxs_file[entry] = \
+                    h5py.ExternalLink(staged, '1-BandPass-tomo/data')
+
+        migrator = FileMigrator(nxs_filename, out_path)
+        migrator.add(os.path.join(self.staging, 'tomo_p2.h5'),
+                     '/entry/final_result_tomo/data')
+        migrator.add(os.path.join(self.staging, 'tomo_p1.h5'),
+                     '/entry/intermediate/1-BandPass-tomo/data',
+                     folder=inter_path)
+        migrator.finish()
+
+        self.assertEqual(os.listdir(self.staging), [])
+        with h5py.File(nxs_filename, 'r') as nxs_file:
+            links = {entry: nxs_file.get(entry, getlink=True).filename
+                     for entry in entries}
+            for i, entry in enumerate(entries):
+                self.assertTrue((nxs_file[entry][...] == i).all())
+        self.assertEqual(links, {
+            '/entry/final_result_tomo/data': 'tomo_p2.h5',
+            '/entry/intermediate/1-BandPass-tomo/data':
+                os.path.join(inter_path, 'tomo_p1.h5')})
+
+    def test_single_node_only(self):
+        with mock.patch('savu.core.staging.MPI') as MPI:
+            MPI.COMM_WORLD.Get_size.return_value = 2
+            MPI.COMM_WORLD.Split_type.return_value.Get_size.return_value = 2
+            self.assertEqual(get_staging_folder(Experiment(self.staging)),
+                             os.path.join(self.staging, 'test'))
+            MPI.COMM_WORLD.Split_type.return_value.Get_size.return_value = 1
+            with self.assertLogs(level='WARNING'):
+                self.assertIsNone(get_staging_folder(Experiment(self.staging)))
+
+    def __run(self, killed=False, **kwargs):
+        """ Run the plugins with staging, returning the NeXus links to the
+        backing files, by entry, and the final results (unless killed). """
+        links = {}
+        get_final_results = tu.get_final_results
+
+        def get_links(exp):
+            with h5py.File(exp.meta_data.get('nxs_filename'), 'r') as f:
+                for name in f['entry']:
+                    for entry in ['entry/%s/data' % name] + \
+                            ['entry/%s/%s/data' % (name, group) for group in
+                             f['entry'][name] if name == 'intermediate']:
+                        link = f.get(entry, getlink=True)
+                        if isinstance(link, h5py.ExternalLink):
+                            links[entry] = (link.filename, f[entry][...])
+            return {} if killed else get_final_results(exp)
+
+        with mock.patch.object(tu, 'get_final_results', side_effect=get_links):
+            results = tu.run_random_tomo(
+                self.plugins, system_params={'staging_path': self.staging},
+                **kwargs)
+        return links, results
+
+    def test_run(self):
+        expected = tu.run_random_tomo(self.plugins)
+        links, results = self.__run()
+        self.assertEqual(len(links), 2)
+        self.assertFalse(any(filename.startswith(self.staging)
+                             for filename, _ in links.values()))
+        self.assertEqual([f for _, _, files in os.walk(self.staging)
+                          for f in files], [])
+        for name in expected:
+            self.assertEqual(results[name].tobytes(), expected[name].tobytes())
+
+    def test_killed_run(self):
+        out_path = os.path.join(self.folder, 'out')
+        os.makedirs(out_path)
+        open(os.path.join(out_path, 'killsignal'), 'w').close()
+        links, _ = self.__run(killed=True, out_path=out_path,
+                              inter_path=out_path)
+        self.assertTrue(links)
+        self.assertFalse(any(filename.startswith(self.staging)
+                             for filename, _ in links.values()))
+        self.assertEqual([f for _, _, files in os.walk(self.staging)
+                          for f in files], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: threaded_cpu_plugin_test
+   :platform: Unix
+   :synopsis: checking the ThreadedCpuPlugin driver gives the same results as \
+   processing the frames in order
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import unittest
+from unittest import mock
+
+from savu.test import test_utils as tu
+from savu.plugins.driver.threaded_cpu_plugin import ThreadedCpuPlugin
+
+
+class ThreadedCpuPluginTest(unittest.TestCase):
+
+    plugins = ['savu.plugins.filters.denoising.median_filter']
+
+    def __run(self, cpu_threads=None):
+        map_frames = ThreadedCpuPlugin._map_frames
+        with mock.patch.object(ThreadedCpuPlugin, '_map_frames',
+                               autospec=True, side_effect=map_frames) as spy:
+            result = tu.run_random_tomo(
+                self.plugins, data=[{'pattern': 'SINOGRAM'}],
+                system_params=None if cpu_threads is None else
+                {'cpu_threads': cpu_threads})
+        return result, spy.called
+
+    def test_serial_by_default(self):
+        with mock.patch('os.sched_getaffinity', return_value=set(range(4))):
+            result, threaded = self.__run()
+        self.assertTrue(result)
+        self.assertFalse(threaded)
+
+    def test_same_as_serial(self):
+        expected, _ = self.__run(1)
+        result, threaded = self.__run(4)
+        self.assertTrue(threaded)
+        self.assertEqual(sorted(result), sorted(expected))
+        for name in expected:
+            self.assertEqual(result[name].dtype, expected[name].dtype)
+            self.assertEqual(result[name].tobytes(), expected[name].tobytes())
+
+    def test_cores_per_node(self):
+        # one process on the node can use all of its cores
+        with mock.patch('os.sched_getaffinity', return_value=set(range(4))):
+            result, threaded = self.__run(0)
+        self.assertTrue(result)
+        self.assertTrue(threaded)
+
+
+if __name__ == "__main__":
+    unittest.main()
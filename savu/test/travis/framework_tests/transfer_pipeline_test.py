@@ -0,0 +1,120 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: transfer_pipeline_test
+   :platform: Unix
+   :synopsis: checking the ordering of reads and writes in the transfer \
+   pipeline
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import threading
+import unittest
+from unittest import mock
+
+from savu.core.transfer_pipeline import TransferPipeline
+from savu.core.transports.base_transport import BaseTransport
+
+
+class DummyTransport(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reads = []
+        self.writes = []
+
+    def _transfer_all_data(self, count):
+        with self.lock:
+            self.reads.append(count)
+        return [count]
+
+    def _return_all_data(self, count, result, end):
+        with self.lock:
+            self.writes.append((count, list(result), end))
+
+
+class TransferPipelineTest(unittest.TestCase):
+
+    def run_pipeline(self, counts, depth):
+        transport = DummyTransport()
+        pipeline = TransferPipeline(transport, depth)
+        pipeline.start(iter(counts))
+        processed = []
+        for count, data in pipeline:
+            processed.append(count)
+            self.assertEqual(data, [count])
+            pipeline.put(count, [count*2], count == counts[-1])
+            self.assertLessEqual(len(pipeline._writes), depth)
+        pipeline.close()
+        self.assertEqual(processed, counts)
+        return transport
+
+    def test_ordering(self):
+        counts = list(range(3, 10))
+        transport = self.run_pipeline(counts, 2)
+        self.assertEqual(transport.reads, counts)
+        self.assertEqual([w[0] for w in transport.writes], counts)
+        self.assertEqual([w[2] for w in transport.writes].count(True), 1)
+
+    def test_depth_larger_than_transfers(self):
+        transport = self.run_pipeline([0, 1], 4)
+        self.assertEqual(transport.reads, [0, 1])
+        self.assertEqual(len(transport.writes), 2)
+
+    def test_wait_for_writes(self):
+        transport = DummyTransport()
+        pipeline = TransferPipeline(transport, 3)
+        pipeline.start([0])
+        for count, data in pipeline:
+            pipeline.put(count, data, True)
+        pipeline.wait_for_writes()
+        self.assertEqual(len(transport.writes), 1)
+        pipeline.close()
+
+
+class PipelineDepthTest(unittest.TestCase):
+
+    def get_depth(self, depth, in_bytes, out_bytes, max_bytes, nTrans=100):
+        transport = BaseTransport.__new__(BaseTransport)
+        transport.exp = mock.Mock()
+        transport.exp.meta_data.get.return_value = \
+            {'transfer_pipeline_depth': depth}
+        transport.pDict = {'out_sl': {'transfer': []}}
+        transport._writer = None
+        nbytes = {'in_data': in_bytes, 'out_data': out_bytes}
+
+        def transfer_bytes(keys):
+            return sum(nbytes[key] for key in keys), max_bytes
+
+        with mock.patch.object(transport, '_BaseTransport__get_transfer_bytes',
+                               side_effect=transfer_bytes, create=True):
+            return transport._get_pipeline_depth(nTrans)
+
+    def test_unlimited(self):
+        self.assertEqual(self.get_depth(3, 10, 10, None), 3)
+        self.assertEqual(self.get_depth(3, 10, 10, None, nTrans=2), 1)
+
+    def test_buffers_in_flight(self):
+        # depth + 2 input and depth output buffers
+        self.assertEqual(self.get_depth(4, 10, 10, 80), 3)
+        self.assertEqual(self.get_depth(4, 10, 10, 79), 2)
+        self.assertEqual(self.get_depth(4, 10, 30, 60), 1)
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(self.get_depth(4, 10, 10, 30), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
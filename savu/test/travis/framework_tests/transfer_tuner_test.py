@@ -0,0 +1,126 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: transfer_tuner_test
+   :platform: Unix
+   :synopsis: checking consecutive transfers read from file as one by the \
+   transfer tuner give the same plugin input as separate reads
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import unittest
+import numpy as np
+from unittest import mock
+
+from savu.test import test_utils as tu
+from savu.plugins.filters.band_pass import BandPass
+from savu.core.transfer_tuner import TransferTuner, _get_merge_dim
+
+
+class MergeDimTest(unittest.TestCase):
+
+    def test_consecutive(self):
+        sls = [(slice(n, n+4, 1), slice(0, 12, 1)) for n in range(0, 16, 4)]
+        self.assertEqual(_get_merge_dim(sls), (4, 0))
+
+    def test_overlapping(self):
+        # padded transfers overlap
+        sls = [(slice(0, 12, 1), slice(n-1, n+5, 1)) for n in range(0, 12, 4)]
+        self.assertEqual(_get_merge_dim(sls), (3, 1))
+
+    def test_gap(self):
+        sls = [(slice(0, 4, 1),), (slice(4, 8, 1),), (slice(9, 12, 1),)]
+        self.assertEqual(_get_merge_dim(sls), (2, 0))
+
+    def test_steps_and_dims(self):
+        sls = [(slice(0, 4, 2), slice(0, 2, 1)),
+               (slice(4, 8, 2), slice(0, 2, 1))]
+        self.assertEqual(_get_merge_dim(sls)[0], 1)
+        sls = [(slice(0, 4, 1), slice(0, 2, 1)),
+               (slice(4, 8, 1), slice(0, 2, 1)),
+               (slice(4, 8, 1), slice(2, 4, 1))]
+        self.assertEqual(_get_merge_dim(sls), (2, 0))
+
+
+class MergedReadsTest(unittest.TestCase):
+
+    def __run(self, tuning, pad=0):
+        """ Run a plugin over transfers of four frames, returning the input
+        frames of each call to process_frames, the final results and the
+        number of transfers in each read. """
+        inputs = []
+        reads = []
+        process_frames = BandPass.process_frames
+        read_batch = TransferTuner._TransferTuner__read_batch
+
+        def keep(plugin, data):
+            inputs.append(np.array(data[0]))
+            return process_frames(plugin, data)
+
+        def read(tuner, count, nTrans):
+            batch = read_batch(tuner, count, nTrans)
+            reads.append(len(batch))
+            return batch
+
+        def set_padding(plugin, in_data, out_data):
+            if pad:
+                in_data[0].padding = {'pad_multi_frames': pad}
+                out_data[0].padding = {'pad_multi_frames': pad}
+
+        max_bytes = '8*12*16*4'
+        system_params = {
+            'transfer_tuning': tuning, 'data_transfer_settings': {
+                'max_bytes': max_bytes, 'min_bytes': '0',
+                'bytes_threshold': max_bytes}}
+        # start from the most transfers per read that fit in max_bytes, as
+        # if chosen by a previous run
+        with mock.patch.object(BandPass, 'process_frames', autospec=True,
+                               side_effect=keep), \
+                mock.patch.object(BandPass, 'get_max_frames',
+                                  return_value=4), \
+                mock.patch.object(BandPass, 'set_filter_padding',
+                                  autospec=True, side_effect=set_padding), \
+                mock.patch.object(TransferTuner, '_TransferTuner__read_batch',
+                                  autospec=True, side_effect=read), \
+                mock.patch('savu.core.transfer_tuner._get_previous_tuning',
+                           return_value={'0_BandPass': 4}):
+            results = tu.run_random_tomo(['savu.plugins.filters.band_pass'],
+                                         system_params=system_params)
+        return inputs, results, reads
+
+    def __check(self, pad=0):
+        inputs, results, reads = self.__run('static', pad=pad)
+        self.assertEqual(reads, [])
+        tuned_inputs, tuned_results, reads = self.__run('adaptive', pad=pad)
+        self.assertGreater(max(reads), 1)
+        self.assertEqual(len(tuned_inputs), len(inputs))
+        for frames, expected in zip(tuned_inputs, inputs):
+            self.assertEqual(frames.shape, expected.shape)
+            self.assertEqual(frames.tobytes(), expected.tobytes())
+        for name in results:
+            self.assertEqual(tuned_results[name].tobytes(),
+                             results[name].tobytes())
+
+    def test_merged_reads(self):
+        self.__check()
+
+    def test_merged_padded_reads(self):
+        self.__check(pad=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
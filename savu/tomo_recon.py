@@ -24,6 +24,8 @@
 import tempfile  # this import is required for pyFAI - DO NOT REMOVE!
 import argparse
 import traceback
+import copy
+import time
 import sys
 import os
 from mpi4py import MPI
@@ -76,6 +78,21 @@ def __option_parser(doc=True):
     # Set stats off
     parser.add_argument("--stats", help="Turn stats 'on' or 'off'.", default="on", choices=["on", "off"])
 
+    tuning_help = "Reuse the transfer sizes recorded in the output NeXus " \
+        "file of a previous run of the same process list."
+    parser.add_argument("--tuning_file", help=tuning_help, default=None)
+
+    workers_help = "The number of local worker processes sharing the " \
+        "frames of each plugin in local mode (--mode local), without MPI. " \
+        "Defaults to the number of available cores."
+    parser.add_argument("--workers", help=workers_help, type=int, default=0)
+
+    batch_help = "Treat in_file as a text file listing one input data file " \
+        "per line, and run the process list on each in turn in a single " \
+        "job, with an output folder for each inside out_folder."
+    parser.add_argument("--batch", help=batch_help, action="store_true",
+                        default=False)
+
     # Hidden arguments
     # process names
     parser.add_argument("-n", "--names", help=hide, default="CPU0")
@@ -83,7 +100,7 @@ def __option_parser(doc=True):
     parser.add_argument("--transport", help=hide, default="hdf5")
     # Set Savu mode
     parser.add_argument("-m", "--mode", help=hide, default="full",
-                        choices=['basic', 'full'])
+                        choices=['basic', 'full', 'local'])
     # Set logging to cluster mode
     parser.add_argument("-c", "--cluster", action="store_true", help=hide,
                         default=False)
@@ -132,6 +149,9 @@ def __check_conditions(parser, args):
               " contains the partially completed Savu job.  The out_folder"\
               " should be the path to this folder."
         parser.error(msg)
+    if args.batch and (args.checkpoint or args.folder or args.pre_run):
+        parser.error("--batch cannot be used with --checkpoint, -f or "
+                     "--pre_run.")
 
 
 def _set_options(args):
@@ -148,7 +168,11 @@ def _set_options(args):
     options['mode'] = args.mode
     options['template'] = args.template
     options['transport'] = 'basic' if args.mode == 'basic' else args.transport
-    options['process_names'] = args.names
+    # local mode runs a single framework process, with local workers
+    local = args.mode == 'local'
+    options['process_names'] = 'CPU0' if local else args.names
+    options['workers'] = (args.workers or len(os.sched_getaffinity(0))) \
+        if local else 0
     options['verbose'] = args.verbose
     options['quiet'] = args.quiet
     options['cluster'] = args.cluster
@@ -162,6 +186,7 @@ def _set_options(args):
     options['system_params'] = args.system_params
     options['stats'] = args.stats
     options['pre_run'] = args.pre_run
+    options['tuning_file'] = args.tuning_file
 
     if args.folder:
         out_folder_name = os.path.basename(args.folder)
@@ -223,10 +248,15 @@ def main(input_args=None):
     if input_args:
         args = input_args
 
+    if getattr(args, 'batch', False):
+        __run_batch(args)
+        return
+
     options = _set_options(args)
 
 
-    pRunner = PluginRunner if options['mode'] == 'full' else BasicPluginRunner
+    pRunner = BasicPluginRunner if options['mode'] == 'basic' else \
+        PluginRunner
     try:
         options["post_pre_run"] = False
         answer = "Y"
@@ -263,5 +293,70 @@ def main(input_args=None):
             MPI.COMM_WORLD.Abort(1)
 
 
+def _read_batch_file(filename):
+    """ The input data files listed in a batch file, one per line, ignoring
+    blank lines and comments (#). """
+    with open(filename, 'r') as batch_file:
+        lines = [line.split('#')[0].strip() for line in batch_file]
+    return [line for line in lines if line]
+
+
+def __run_batch(args):
+    """ Run the process list on each input file of a batch file in turn, in
+    the same job.  The processes and logging are set up once, and the
+    process list is read and checked once, by the first scan: later scans
+    reuse the checked plugin list, and its loaded plugin classes and tools,
+    and only set up the plugins for their own datasets.  Each scan has its
+    own output folder and log files.  A failed scan ends an MPI job, as the
+    processes can no longer be kept in step, otherwise the remaining scans
+    are run. """
+    scans = _read_batch_file(args.in_file)
+    pRunner = BasicPluginRunner if args.mode == 'basic' else PluginRunner
+    first = None
+    checked = None
+    failed = []
+    for n, scan in enumerate(scans):
+        if not os.path.exists(scan):
+            cu.user_message("Batch scan %s not found: skipping" % scan)
+            failed.append(scan)
+            continue
+        scan_args = copy.copy(args)
+        scan_args.in_file = scan
+        options = _set_options(scan_args)
+        options["post_pre_run"] = False
+        options['batch'] = True
+        if first:
+            options['batch_scan'] = n
+            for key in ['mpi', 'process', 'processes']:
+                options[key] = first[key]
+        if checked:
+            options['checked_plugin_list'] = checked._get_checked_copy()
+
+        t0 = time.time()
+        plugin_runner = None
+        try:
+            plugin_runner = pRunner(options)
+            plugin_runner._run_plugin_list()
+            if options['process'] == 0:
+                in_file = plugin_runner.exp.meta_data['nxs_filename']
+                citation_extractor.main(in_file=in_file, quiet=True)
+        except Exception:
+            cu.user_message(traceback.format_exc())
+            if options['nProcesses'] != 1:
+                MPI.COMM_WORLD.Abort(1)
+            failed.append(scan)
+        if first is None and 'process' in options:
+            first = options
+        if checked is None:
+            checked = getattr(plugin_runner, 'checked_plugin_list', None)
+        cu.user_message("Batch scan %i of %i (%s) finished in %.1f seconds"
+                        % (n + 1, len(scans), scan, time.time() - t0))
+
+    if failed:
+        cu.user_message("%i of %i batch scans failed: %s"
+                        % (len(failed), len(scans), ', '.join(failed)))
+        sys.exit(1)
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,183 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: savu_chunk_bench
+   :platform: Unix
+   :synopsis: A command line tool that replays the transfers of a Savu run on \
+   synthetic hdf5 files, to compare chunk shapes on the local storage.
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import h5py
+import numpy as np
+
+from savu.version import __version__
+from savu.data.chunk_planner import ChunkPlanner, get_transfer_shape
+
+
+def __option_parser(doc=True):
+    """ Option parser for command line arguments.
+    """
+    version = "%(prog)s " + __version__
+    parser = argparse.ArgumentParser(prog='savu_chunk_bench')
+    parser.add_argument('nxs_file', help="The output NeXus file of a Savu "
+                        "run with 'chunk_planner: cost' in the system "
+                        "parameters.")
+    parser.add_argument('out_folder', help="A folder on the storage to "
+                        "test, for the temporary hdf5 files.")
+    parser.add_argument('-n', '--n_best', type=int, default=3,
+                        help="The number of planner chunk shapes to time.")
+    parser.add_argument('-m', '--max_mb', type=float, default=2000,
+                        help="The maximum size of each synthetic file in MB. "
+                        "Larger datasets are cropped.")
+    parser.add_argument('-r', '--repeats', type=int, default=1,
+                        help="The number of times each replay is repeated.")
+    parser.add_argument('-d', '--dataset', default=None,
+                        help="Only replay the dataset with this file name.")
+    parser.add_argument('--version', action='version', version=version)
+    return parser if doc==True else parser.parse_args()
+
+
+def _load_plans(nxs_file):
+    """ Load the chunk plans recorded in a Savu output NeXus file. """
+    with h5py.File(nxs_file, 'r') as f:
+        if 'entry/chunk_plans' not in f:
+            return {}
+        group = f['entry/chunk_plans']
+        return {name: json.loads(group[name].attrs['plan'])
+                for name in group}
+
+
+def _crop_shape(plan, max_bytes):
+    """ Halve the largest dimensions, preferring those that are not core
+    dimensions of both patterns, until the dataset fits in max_bytes. """
+    shape = list(plan['shape'])
+    itemsize = np.dtype(plan['dtype']).itemsize
+    core = set(plan['current']['core_dims']) & set(plan['next']['core_dims'])
+    while np.prod(shape)*itemsize > max_bytes:
+        dims = [d for d in range(len(shape)) if d not in core and shape[d] > 1]
+        dims = dims if dims else [d for d in range(len(shape)) if shape[d] > 1]
+        if not dims:
+            break
+        dim = max(dims, key=lambda d: shape[d])
+        shape[dim] = -(-shape[dim] // 2)
+    return tuple(shape)
+
+
+def _get_slices(shape, transfer):
+    """ The slice lists of all transfers of the given shape, in order. """
+    starts = [range(0, n, t) for n, t in zip(shape, transfer)]
+    for start in itertools.product(*starts):
+        yield tuple(slice(s, min(s + t, n))
+                    for s, t, n in zip(start, transfer, shape))
+
+
+def _drop_cache(filename):
+    """ Ask the kernel to drop the cached pages of the file, so the reads
+    come from storage. """
+    if hasattr(os, 'posix_fadvise'):
+        fd = os.open(filename, os.O_RDONLY)
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        os.close(fd)
+
+
+def _replay(filename, shape, dtype, chunks, transfers):
+    """ Write a synthetic dataset with the current pattern transfers and
+    read it back with the next pattern transfers.
+
+    :returns: The time taken to write and to read the dataset.
+    :rtype: float, float
+    """
+    block = np.random.random(transfers[0]).astype(dtype)
+    with h5py.File(filename, 'w') as f:
+        dset = f.create_dataset('data', shape, dtype=dtype, chunks=chunks)
+        t0 = time.time()
+        for sl in _get_slices(shape, transfers[0]):
+            dset[sl] = block[tuple(slice(0, s.stop - s.start) for s in sl)]
+        f.flush()
+    _drop_cache(filename)
+    t1 = time.time()
+
+    with h5py.File(filename, 'r') as f:
+        dset = f['data']
+        for sl in _get_slices(shape, transfers[1]):
+            dset[sl]
+    t2 = time.time()
+    os.remove(filename)
+    return t1 - t0, t2 - t1
+
+
+def _bench_plan(name, plan, args):
+    shape = _crop_shape(plan, args.max_mb*1e6)
+    itemsize = np.dtype(plan['dtype']).itemsize
+    max_chunks = [min(m, n) for m, n in zip(plan['max_chunks'], shape)]
+    planner = ChunkPlanner(shape, itemsize, plan['current'], plan['next'],
+                           plan['chunk_max'], touch_bytes=plan['touch_bytes'],
+                           max_chunks=max_chunks)
+    clip = lambda c: tuple(int(min(a, n)) for a, n in zip(c, shape))
+    candidates = {'chosen': clip(plan['chunks']),
+                  'heuristic': clip(plan['heuristic_chunks'])}
+    for i, chunks in enumerate(planner.plan(n_best=args.n_best)):
+        candidates['planner_%s' % (i+1)] = chunks
+    transfers = [get_transfer_shape(plan[p], shape)
+                 for p in ['current', 'next']]
+
+    print("\n%s: shape %s (replayed as %s), write %s, read %s" %
+          (name, tuple(plan['shape']), shape, transfers[0], transfers[1]))
+    print("%-12s %-24s %14s %10s %10s %10s" % ('', 'chunks', 'model (MB)',
+                                              'write (s)', 'read (s)',
+                                              'total (s)'))
+    results = {}
+    filename = os.path.join(args.out_folder, 'savu_chunk_bench.h5')
+    for label, chunks in candidates.items():
+        if chunks in results:
+            continue
+        times = [_replay(filename, shape, plan['dtype'], chunks, transfers)
+                 for _ in range(args.repeats)]
+        write, read = np.median(times, axis=0)
+        results[chunks] = write + read
+        print("%-12s %-24s %14.1f %10.3f %10.3f %10.3f" %
+              (label, chunks, planner.score(chunks)/1e6, write, read,
+               write + read))
+    best = min(results, key=results.get)
+    print("fastest: %s" % (best,))
+
+
+def main():
+    args = __option_parser(doc=False)
+    plans = _load_plans(args.nxs_file)
+    if args.dataset:
+        plans = {k: v for k, v in plans.items() if k == args.dataset}
+    if not plans:
+        print("No chunk plans found in %s.  Run Savu with 'chunk_planner: "
+              "cost' in the system parameters." % args.nxs_file)
+        sys.exit(1)
+    if not os.path.exists(args.out_folder):
+        os.makedirs(args.out_folder)
+    for name, plan in plans.items():
+        _bench_plan(name, plan, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,9 +6,10 @@ It is currently very early in development and will be subject to massive refacto
 '''
 from savu.data.experiment_collection import Experiment
 from savu.data.meta_data import MetaData
-from savu.plugins.utils import get_plugin
+import savu.plugins.utils as pu
 import savu.plugins.loaders.utils.yaml_utils as yaml
 import os, sys
+import logging
 import numpy as np
 from copy import deepcopy as copy
 import time
@@ -52,7 +53,8 @@ def runSavu(path2plugin, params, metaOnly, inputs, persistence):
     aux = persistence['aux']
     sys_path_0_lock.acquire()
     try:
-        result = copy(inputs)
+        # the frame itself is not copied, as it is replaced in the result
+        result = copy({k: v for k, v in inputs.items() if k != 'data'})
 
         scriptDir = os.path.dirname(path2plugin)
         sys_path_0 = sys.path[0]
@@ -74,7 +76,7 @@ def runSavu(path2plugin, params, metaOnly, inputs, persistence):
                     val = val.replace('\n','').strip()
 #                 print val
                 parameters[key] = val
-                print(("val: {}".format(val)))
+                logging.debug("val: %s", val)
 #             print "initialising the object"
             plugin_object = _savu_setup(path2plugin, inputs, parameters)
             persistence['plugin_object'] = plugin_object
@@ -92,29 +94,37 @@ def runSavu(path2plugin, params, metaOnly, inputs, persistence):
 #                 print aux.keys()
             else:
                 string_key = axis_labels[0]# will it always be the first one?
+            axes = {}
             if not metaOnly:
                 if len(axis_labels) == 1:
-                    result['xaxis']=axis_values[axis_labels[0]]
-                    result['xaxis_title']=axis_labels[0]
+                    axes['xaxis']=axis_values[axis_labels[0]]
+                    axes['xaxis_title']=axis_labels[0]
                 if len(axis_labels) == 2:
 #                     print "set the output axes"
                     x = axis_labels[0]
-                    result['xaxis_title']=x
+                    axes['xaxis_title']=x
                     y = axis_labels[1]
-                    result['yaxis_title']=y
-                    result['yaxis']=axis_values[y]
-                    result['xaxis']=axis_values[x]
+                    axes['yaxis_title']=y
+                    axes['yaxis']=axis_values[y]
+                    axes['xaxis']=axis_values[x]
+            # kept for the later frames of a persistent plugin
+            persistence.update({'axis_labels': axis_labels,
+                                'axis_values': axis_values,
+                                'string_key': string_key, 'aux': aux,
+                                'parameters': parameters,
+                                'metaOnly': metaOnly, 'axes': axes})
         else:
-            pass
+            metaOnly = persistence.get('metaOnly', metaOnly)
+        result.update(persistence.get('axes', {}))
     finally:
         sys_path_0_lock.release()
 
-    if plugin_object.get_max_frames()>1: # we need to get round this since we are frame independant
+    if plugin_object.get_max_frames() not in ('single', 1): # we need to get round this since we are frame independant
         data = np.expand_dims(inputs['data'], 0)
     else:
         data = inputs['data']
 
-    print(("metaOnly: {}".format(metaOnly)))
+    logging.debug("metaOnly: %s", metaOnly)
 
     if not metaOnly: 
 
@@ -134,17 +144,17 @@ def runSavu(path2plugin, params, metaOnly, inputs, persistence):
 
         result['auxiliary'] = aux
     t2 = time.time()
-    print("time to runSavu = "+str((t2-t1)))
+    logging.debug("time to runSavu = %s", t2 - t1)
     return result
 
 
 def _savu_setup(path2plugin, inputs, parameters):
-    print("running _savu_setup")
+    logging.debug("running _savu_setup")
     parameters['in_datasets'] = [inputs['dataset_name']]
     parameters['out_datasets'] = [inputs['dataset_name']]
-    plugin = get_plugin(path2plugin.split('.py')[0]+'.py')
+    plugin = pu.load_class(path2plugin.split('.py')[0]+'.py')()
     plugin.exp = setup_exp_and_data(inputs, inputs['data'], plugin)
-    plugin.set_parameters(parameters)
+    plugin.get_plugin_tools().initialise(parameters)
     plugin._set_plugin_datasets()
     plugin.setup()
     return plugin
@@ -179,11 +189,11 @@ def setup_exp_and_data(inputs, data, plugin):
         data_obj.add_pattern('PROJECTION', core_dims=(1,), slice_dims=(0, ))
     if len(inputs['data'].shape)==2:
         if inputs['xaxis_title'] is None  or inputs['xaxis_title'].isspace():
-            print("set x")
+            logging.debug("set x")
             inputs['xaxis_title']='x'
             inputs['xaxis'] = np.arange(inputs['data'].shape[0])
         if inputs['yaxis_title'] is None or inputs['yaxis_title'].isspace():
-            print("set y")
+            logging.debug("set y")
             inputs['yaxis_title']='y'
             size_y_axis = inputs['data'].shape[1]
             inputs['yaxis'] = np.arange(size_y_axis)
@@ -205,6 +215,8 @@ class DawnExperiment(Experiment):
         self.index={"in_data": {}, "out_data": {}, "mapping": {}}
         self.meta_data = MetaData(get_options())
         self.nxs_file = None
+        # the in/out_datasets are set by _savu_setup
+        self._dataset_names_complete = True
 
 def get_options():
     options = {}
@@ -232,4 +244,4 @@ def _set_system_params():
     sys_folder = 'dls' if len(subdirs) > 1 else subdirs[0]
     fname = 'system_parameters.yml'
     sys_file = os.path.join(sys_files, sys_folder, fname)
-    return yaml.read_yaml(sys_file)
+    return yaml.read_system_params(sys_file)
@@ -0,0 +1,457 @@
+# Copyright 2014 Diamond Light Source Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. module:: savu_server
+   :platform: Unix
+   :synopsis: A long-lived local server that keeps chains of plugins set up \
+   and pre-processed between requests, for the interactive processing of \
+   single frames (e.g. from DAWN).
+
+.. moduleauthor:: Nicola Wadeson <scientificsoftware@diamond.ac.uk>
+
+"""
+
+import os
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+import traceback
+import numpy as np
+from collections import OrderedDict
+from multiprocessing import shared_memory, resource_tracker
+from multiprocessing.connection import Listener, Client
+
+# the authentication key of the server, required for a TCP port
+AUTHKEY_ENV = 'SAVU_SERVER_AUTHKEY'
+
+
+def default_address():
+    """ A Unix socket in the temporary folder, one per user. """
+    return os.path.join(tempfile.gettempdir(),
+                        'savu_server_%s.sock' % os.getuid())
+
+
+def get_authkey():
+    key = os.environ.get(AUTHKEY_ENV)
+    return key.encode() if key else None
+
+
+def chain_key(chain, inputs, shape, dtype):
+    """ The key of a set up plugin chain: the plugins and their parameters,
+    the input metadata (dataset name and axes) and the frame shape and type.
+
+    :param list chain: (path to plugin, parameters) of each plugin.
+    :param dict inputs: The input metadata, without the frame.
+    :param tuple shape: The frame shape.
+    :param dtype: The frame data type.
+    :rtype: str
+    """
+    sha = hashlib.sha1()
+    _hash_update(sha, [chain, inputs, tuple(shape), np.dtype(dtype).str])
+    return sha.hexdigest()
+
+
+# the names of the shared memory blocks created by this process
+_owned = set()
+
+
+def _hash_update(sha, obj):
+    if isinstance(obj, dict):
+        for key in sorted(obj, key=str):
+            _hash_update(sha, (key, obj[key]))
+    elif isinstance(obj, (list, tuple)):
+        sha.update(b'[')
+        for value in obj:
+            _hash_update(sha, value)
+        sha.update(b']')
+    elif isinstance(obj, np.ndarray):
+        sha.update(str((obj.shape, obj.dtype.str)).encode())
+        sha.update(np.ascontiguousarray(obj).tobytes())
+    else:
+        sha.update(repr(obj).encode())
+
+
+class SharedBlock(object):
+    """
+    A shared memory block, owned by this process, that holds one frame at a
+    time.  The block is kept between frames and only replaced if it is too
+    small.
+    """
+
+    def __init__(self):
+        self._block = None
+        self.spec = None
+
+    def get(self, shape, dtype):
+        """ An array of the given shape and type in the block. """
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape))*dtype.itemsize
+        if self._block is None or self._block.size < nbytes:
+            self.close()
+            self._block = shared_memory.SharedMemory(create=True,
+                                                     size=max(nbytes, 1))
+            _owned.add(self._block.name)
+        self.spec = (self._block.name, tuple(shape), dtype.str)
+        return np.ndarray(shape, dtype=dtype, buffer=self._block.buf)
+
+    def put(self, array):
+        """ Copy an array into the block.
+
+        :returns: The name, shape and data type of the array in the block.
+        """
+        self.get(array.shape, array.dtype)[...] = array
+        return self.spec
+
+    def close(self):
+        """ Free the block. """
+        if self._block is not None:
+            _owned.discard(self._block.name)
+            self._block.unlink()
+            try:
+                self._block.close()
+            except BufferError:
+                # arrays in the block are still held, and it is unmapped
+                # once they are freed
+                pass
+            self._block = None
+            self.spec = None
+
+
+class Attached(object):
+    """ The shared memory blocks of another process (or of this one, if it
+    runs both the client and the server), attached by name. """
+
+    def __init__(self):
+        self._blocks = {}
+
+    def view(self, spec):
+        """ An array in the block given by its name, shape and data type. """
+        name, shape, dtype = spec
+        if name not in self._blocks:
+            self._blocks[name] = shared_memory.SharedMemory(name=name)
+            if name not in _owned:
+                # the block is owned, and unlinked, by the other process
+                resource_tracker.unregister(self._blocks[name]._name,
+                                            'shared_memory')
+        return np.ndarray(shape, dtype=np.dtype(dtype),
+                          buffer=self._blocks[name].buf)
+
+    def detach(self, names=None):
+        """ Detach the named blocks, or all blocks.  Arrays in a block must
+        be released first. """
+        for name in list(self._blocks if names is None else names):
+            block = self._blocks.pop(name, None)
+            if block is not None:
+                block.close()
+
+
+class PluginChain(object):
+    """
+    Plugins set up, and pre-processed, on the first frame they are given
+    and then kept, with their persistent state, for each later frame.  The
+    output of each plugin is the input of the next.
+
+    :param list chain: (path to plugin, parameters) of each plugin, with the
+        parameters in the form passed to runSavu.
+    :param Lock sys_path_lock: The lock runSavu holds while setting up.
+    """
+
+    def __init__(self, chain, sys_path_lock):
+        self.chain = chain
+        self.persistence = [_new_persistence(sys_path_lock) for _ in chain]
+        self.block = SharedBlock()
+
+    def process(self, inputs, data):
+        """ Process a frame through each plugin in turn.
+
+        :returns: The result of the last plugin, with the auxiliary output of
+            every plugin, the name and time taken by each plugin and True if
+            every plugin had already been set up.
+        :rtype: tuple(dict, list, bool)
+        """
+        # imported here, so clients do not need the framework
+        from scripts.dawn_runner.run_savu import runSavu
+        warm = all(p['plugin_object'] for p in self.persistence)
+        latency = []
+        auxiliary = OrderedDict()
+        for (path2plugin, params), persistence in \
+                zip(self.chain, self.persistence):
+            start = time.time()
+            result = runSavu(path2plugin, params, False,
+                             dict(inputs, data=data), persistence)
+            latency.append((persistence['plugin_object'].name,
+                            time.time() - start))
+            auxiliary.update(result.pop('auxiliary', None) or {})
+            data = np.asarray(result.pop('data'))
+            inputs = result
+        if auxiliary:
+            result['auxiliary'] = auxiliary
+        result['data'] = data
+        return result, latency, warm
+
+    def close(self):
+        self.block.close()
+
+
+def _new_persistence(sys_path_lock):
+    return {'sys_path_0_lock': sys_path_lock, 'sys_path_0_set': False,
+            'plugin_object': None, 'axis_labels': None, 'axis_values': None,
+            'string_key': None, 'parameters': None, 'aux': None}
+
+
+class PluginServer(object):
+    """
+    A local server that keeps the plugin chains it is asked to run, set up
+    and pre-processed (dark and flat field means, filters, masks and so on),
+    so each later frame only pays for process_frames.  Frames are passed in
+    shared memory: the server reads the client's frame in place and writes
+    the result to a block of its own for the client to read.  The most
+    recently used chains are kept, up to max_chains.  Frames are processed
+    one at a time.
+
+    :param address: A Unix socket path, or a (host, port) tuple.
+    :keyword int max_chains: The number of plugin chains to keep.
+    :keyword bytes authkey: The key clients must give to connect.
+    """
+
+    def __init__(self, address, max_chains=8, authkey=None):
+        self.address = address
+        self.max_chains = max_chains
+        self.authkey = authkey
+        self._chains = OrderedDict()
+        self._attached = Attached()
+        self._lock = threading.Lock()
+        self._sys_path_lock = threading.Lock()
+        self._stopped = False
+
+    def serve_forever(self):
+        """ Accept clients, each on its own thread, until stopped. """
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+        umask = os.umask(0o077)
+        try:
+            listener = Listener(self.address, authkey=self.authkey)
+        finally:
+            os.umask(umask)
+        logging.info("Savu server listening on %s", self.address)
+        with listener:
+            while not self._stopped:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError) as e:
+                    logging.warning("Savu server: connection refused: %s", e)
+                    continue
+                threading.Thread(target=self.__serve, args=(conn,),
+                                 daemon=True).start()
+        self.close()
+
+    def __serve(self, conn):
+        with conn:
+            while not self._stopped:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+                try:
+                    reply = self._handle(request)
+                except Exception:
+                    reply = {'error': traceback.format_exc()}
+                    logging.error(reply['error'])
+                conn.send(reply)
+                if self._stopped:
+                    # wake the listener, so it sees the server has stopped
+                    Client(self.address, authkey=self.authkey).close()
+
+    def _handle(self, request):
+        command = request['command']
+        if command == 'process':
+            return self.__process(request)
+        if command == 'release':
+            with self._lock:
+                self.__drop(chain_key(*request['key']))
+            return {}
+        if command == 'detach':
+            with self._lock:
+                self._attached.detach(request['names'])
+            return {}
+        if command == 'stop':
+            self._stopped = True
+            return {}
+        raise Exception("Unknown savu server command %s" % command)
+
+    def __process(self, request):
+        inputs = request['inputs']
+        name, shape, dtype = request['frame']
+        with self._lock:
+            key = chain_key(request['chain'], inputs, shape, dtype)
+            chain = self._chains.pop(key, None)
+            if chain is None:
+                chain = PluginChain(request['chain'], self._sys_path_lock)
+            self._chains[key] = chain
+            while len(self._chains) > self.max_chains:
+                self.__drop(next(iter(self._chains)))
+
+            start = time.time()
+            frame = self._attached.view(request['frame'])
+            try:
+                result, latency, warm = chain.process(dict(inputs), frame)
+            except Exception:
+                # the plugins may have been left part way through a frame
+                self.__drop(key)
+                raise
+            del frame
+            data = result.pop('data')
+            spec = chain.block.put(data)
+            total = time.time() - start
+
+        logging.info("%s frame %s in %.4fs (%s)",
+                     'Warm' if warm else 'Cold', shape, total,
+                     ', '.join('%s %.4fs' % t for t in latency))
+        return {'result': result, 'frame': spec, 'latency': latency,
+                'total': total, 'warm': warm}
+
+    def __drop(self, key):
+        chain = self._chains.pop(key, None)
+        if chain is not None:
+            chain.close()
+
+    def close(self):
+        """ Free the plugin chains and their shared memory. """
+        with self._lock:
+            for key in list(self._chains):
+                self.__drop(key)
+            self._attached.detach()
+
+
+class SavuClient(object):
+    """
+    A client of a PluginServer.  Frames are copied into a shared memory
+    block of the client, unless they were created in it with get_frame, and
+    results are read in place from the server's block.
+
+    :keyword address: The address of the server.
+    :keyword bytes authkey: The key of the server (or from the
+        SAVU_SERVER_AUTHKEY environment variable).
+    """
+
+    def __init__(self, address=None, authkey=None):
+        self.address = address or default_address()
+        self._conn = Client(self.address, authkey=authkey or get_authkey())
+        self._block = SharedBlock()
+        self._frame = None
+        self._attached = Attached()
+
+    def get_frame(self, shape, dtype=np.float32):
+        """ An array in shared memory to fill with the next frame, which the
+        server reads without a copy. """
+        self._frame = None
+        self._frame = self._block.get(shape, dtype)
+        return self._frame
+
+    def process(self, chain, data, dataset_name='data', **axes):
+        """ Process a frame with a chain of plugins.
+
+        :param list chain: (path to plugin, parameters) of each plugin, with
+            the parameters in the form passed to runSavu.
+        :param ndarray data: The frame.
+        :keyword str dataset_name: The name of the input dataset.
+        :keyword axes: xaxis, xaxis_title, yaxis and yaxis_title.
+        :returns: The result, with the output frame in 'data', which is only
+            valid until the next frame is processed with the same chain, and
+            the time taken by each plugin in 'latency'.
+        :rtype: dict
+        """
+        inputs = {'dataset_name': dataset_name, 'xaxis': None,
+                  'xaxis_title': None, 'yaxis': None, 'yaxis_title': None}
+        inputs.update(axes)
+        spec = self._block.spec if data is self._frame else \
+            self._block.put(np.asarray(data))
+        reply = self.__request({'command': 'process', 'chain': chain,
+                                'inputs': inputs, 'frame': spec})
+        result = reply['result']
+        result['data'] = self._attached.view(reply['frame'])
+        result['latency'] = reply['latency']
+        return result
+
+    def release(self, chain, data_shape, dtype=np.float32, dataset_name='data',
+                **axes):
+        """ Free a chain of plugins kept by the server. """
+        inputs = {'dataset_name': dataset_name, 'xaxis': None,
+                  'xaxis_title': None, 'yaxis': None, 'yaxis_title': None}
+        inputs.update(axes)
+        self.__request({'command': 'release',
+                        'key': (chain, inputs, data_shape, dtype)})
+
+    def stop(self):
+        """ Stop the server. """
+        self.__request({'command': 'stop'})
+
+    def __request(self, request):
+        self._conn.send(request)
+        reply = self._conn.recv()
+        if 'error' in reply:
+            raise Exception("Savu server error:\n%s" % reply['error'])
+        return reply
+
+    def close(self):
+        """ Close the connection and free the shared memory.  Results
+        returned by process must be released first. """
+        if self._block.spec is not None:
+            try:
+                self.__request({'command': 'detach',
+                                'names': [self._block.spec[0]]})
+            except (EOFError, OSError):
+                pass  # the server has stopped
+        self._frame = None
+        self._attached.detach()
+        self._block.close()
+        self._conn.close()
+
+
+def __option_parser(doc=True):
+    """ Option parser for command line arguments.
+    """
+    parser = argparse.ArgumentParser(prog='savu_server')
+    parser.add_argument('-s', '--socket', default=None,
+                        help="The Unix socket to listen on (default %s)."
+                        % default_address())
+    parser.add_argument('-p', '--port', type=int, default=None,
+                        help="Listen on this localhost TCP port instead of a "
+                        "Unix socket.  The %s environment variable must be "
+                        "set." % AUTHKEY_ENV)
+    parser.add_argument('-n', '--max_chains', type=int, default=8,
+                        help="The number of plugin chains to keep set up.")
+    return parser if doc==True else parser.parse_args()
+
+
+def main():
+    args = __option_parser(doc=False)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    authkey = get_authkey()
+    if args.port is not None:
+        if not authkey:
+            raise Exception("Set %s to serve on a TCP port." % AUTHKEY_ENV)
+        address = ('localhost', args.port)
+    else:
+        address = args.socket or default_address()
+    PluginServer(address, max_chains=args.max_chains,
+                 authkey=authkey).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -113,6 +113,8 @@ setup(name='savu',
           'savu_param_extractor=scripts.savu_config.parameter_extractor:main',
           'savu_template_extractor=scripts.savu_config.hdf5_template_extractor:main',
           'savu_pre_run=savu.pre_run:main',
+          'savu_chunk_bench=scripts.chunk_bench.savu_chunk_bench:main',
+          'savu_server=scripts.dawn_runner.savu_server:main',
       ], },
 
       package_data={